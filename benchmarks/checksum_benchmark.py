@@ -0,0 +1,88 @@
+'''
+Benchmarks checksum.generate_module_checksum() against the previous implementation (one file after the other, in 8 KiB chunks)
+on a generated module tree of 10,000 files: headers of a few KiB spread over 100 folders, plus a few large prebuilt static libraries.
+
+Usage (from the repository root):
+    python benchmarks/checksum_benchmark.py [--files 10000] [--large-files 10] [--large-size-mb 16] [--jobs 8] [--runs 3]
+'''
+import os
+import sys
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checksum import generate_module_checksum # noqa: E402
+
+def legacy_generate_module_checksum(folder_path: str) -> str:
+    '''
+    The implementation generate_module_checksum() replaced, kept here as the baseline.
+    '''
+    sha256_hash = hashlib.sha256()
+    for root, dirs, files in sorted(os.walk(folder_path)):
+        dirs.sort()
+        files.sort()
+        for filename in files:
+            file_path = os.path.join(root, filename)
+            if filename == "checksum.txt":
+                continue
+            sha256_hash.update(os.path.relpath(file_path, folder_path).encode())
+            with open(file_path, "rb") as f:
+                while chunk := f.read(8192):
+                    sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+def generate_tree(folder_path: str, file_count: int, large_files: int, large_size: int):
+    rng = random.Random(0)
+    folders = [os.path.join(folder_path, "include", f"group_{index:03d}") for index in range(100)]
+    for folder in folders:
+        os.makedirs(folder)
+    for index in range(file_count - large_files):
+        with open(os.path.join(folders[index % len(folders)], f"header_{index:05d}.h"), "wb") as f:
+            f.write(rng.randbytes(rng.randint(1024, 8192)))
+
+    os.makedirs(os.path.join(folder_path, "lib"))
+    for index in range(large_files):
+        with open(os.path.join(folder_path, "lib", f"libprebuilt_{index}.a"), "wb") as f:
+            f.write(rng.randbytes(large_size))
+
+def time_runs(func, runs: int) -> tuple[float, str]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        digest = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), digest
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--large-files", type=int, default=10)
+    parser.add_argument("--large-size-mb", type=int, default=16)
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    folder_path = tempfile.mkdtemp(prefix="cul-checksum-benchmark-")
+    try:
+        generate_tree(folder_path, args.files, args.large_files, args.large_size_mb * 1024 * 1024)
+        total_size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(folder_path) for f in files)
+        print(f"Tree: {args.files} files, {total_size / 1024 / 1024:.1f} MiB, {os.cpu_count()} CPU(s), best of {args.runs} warm-cache runs")
+
+        legacy_time, legacy_digest = time_runs(lambda: legacy_generate_module_checksum(folder_path), args.runs)
+        print(f"  previous implementation:     {legacy_time:7.3f} s")
+        for jobs in sorted({1, args.jobs}):
+            new_time, new_digest = time_runs(lambda: generate_module_checksum(folder_path, jobs), args.runs)
+            print(f"  generate_module_checksum({jobs:>2}): {new_time:7.3f} s  ({legacy_time / new_time:.2f}x)")
+            if new_digest != legacy_digest:
+                print("  ERROR: the checksums differ")
+                sys.exit(1)
+        print("  Checksums are identical.")
+    finally:
+        shutil.rmtree(folder_path, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
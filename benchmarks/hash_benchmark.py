@@ -0,0 +1,54 @@
+'''
+Benchmarks the throughput of every checksum algorithm (see checksum.CHECKSUM_ALGORITHMS): hashing a buffer in memory, which shows the raw speed
+of the algorithm on this CPU, and checksum.generate_module_checksum() on a generated module tree (see checksum_benchmark.py), which shows
+what a module author or registry gains by switching.
+
+Usage (from the repository root):
+    python benchmarks/hash_benchmark.py [--buffer-size-mb 256] [--files 10000] [--large-files 10] [--large-size-mb 16] [--runs 3]
+'''
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checksum import generate_module_checksum, new_hash, CHECKSUM_ALGORITHMS, EXTRACT_CHUNK_SIZE # noqa: E402
+from checksum_benchmark import generate_tree, time_runs # noqa: E402
+
+def hash_buffer(buffer: bytes, algorithm: str) -> str:
+    file_hash = new_hash(algorithm)
+    view = memoryview(buffer)
+    for offset in range(0, len(view), EXTRACT_CHUNK_SIZE):
+        file_hash.update(view[offset:offset + EXTRACT_CHUNK_SIZE])
+    return file_hash.hexdigest()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buffer-size-mb", type=int, default=256)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--large-files", type=int, default=10)
+    parser.add_argument("--large-size-mb", type=int, default=16)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    buffer = os.urandom(args.buffer_size_mb * 1024 * 1024)
+    print(f"In memory: {args.buffer_size_mb} MiB buffer, best of {args.runs} runs")
+    for algorithm in CHECKSUM_ALGORITHMS:
+        elapsed, _ = time_runs(lambda: hash_buffer(buffer, algorithm), args.runs)
+        print(f"  {algorithm:<8} {args.buffer_size_mb / elapsed:9.1f} MiB/s")
+    del buffer
+
+    folder_path = tempfile.mkdtemp(prefix="cul-hash-benchmark-")
+    try:
+        generate_tree(folder_path, args.files, args.large_files, args.large_size_mb * 1024 * 1024)
+        total_size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(folder_path) for f in files) / 1024 / 1024
+        print(f"Module tree: {args.files} files, {total_size:.1f} MiB, {os.cpu_count()} CPU(s), best of {args.runs} warm-cache runs")
+        for algorithm in CHECKSUM_ALGORITHMS:
+            elapsed, _ = time_runs(lambda: generate_module_checksum(folder_path, algorithm=algorithm), args.runs)
+            print(f"  {algorithm:<8} {elapsed:7.3f} s  {total_size / elapsed:9.1f} MiB/s")
+    finally:
+        shutil.rmtree(folder_path, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
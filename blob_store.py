@@ -0,0 +1,252 @@
+'''
+This file contains the content-addressed store that deduplicates the files of the cached module versions.
+Every distinct file content is stored once, as CACHE_DIR/.blobs/<first 2 hex digits>/<sha256 of the content>, and the files of the cached
+module versions are hardlinks to these blobs. Consecutive versions of a module share most of their files, so caching a new version mostly
+links blobs that are already there, and installing it into a project links the same blobs again (see link_ops.materialize_tree()).
+The blobs used by every cached version are recorded in the cache index (see cache_index.py), so unreferenced blobs can be swept.
+'''
+import os
+import time
+import uuid
+import hashlib
+from common_variables import BLOBS_DIR
+from checksum import EXTRACT_CHUNK_SIZE
+
+BLOB_TEMP_DIR = os.path.join(BLOBS_DIR, "tmp")
+STALE_TEMP_AGE = 24 * 60 * 60 # Seconds after which a leftover temporary file (e.g., from a killed process) is removed by sweep_blobs()
+
+def blob_path(digest: str) -> str:
+    '''
+    Returns the path of the blob with the specified SHA-256 digest.
+
+    Args:
+        digest (str): The hex digest of the blob contents
+
+    Returns:
+        str: The path of the blob in the store
+
+    Raises:
+        None
+    '''
+    return os.path.join(BLOBS_DIR, digest[:2], digest)
+
+def _new_temp_path() -> str:
+    return os.path.join(BLOB_TEMP_DIR, uuid.uuid4().hex)
+
+class BlobFile:
+    '''
+    A file-like object, opened by BlobStore.open(), that writes a file into the blob store and hardlinks it at its destination path once closed.
+    Small files are kept in memory, so no data is written at all when their content is already in the store.
+    '''
+    def __init__(self, store, file_path: str):
+        self._store = store
+        self._file_path = file_path
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self._buffer = bytearray()
+        self._temp_path = None
+        self._temp_file = None
+
+    def write(self, chunk: bytes) -> int:
+        self._hash.update(chunk)
+        self._size += len(chunk)
+        if self._temp_file is None and len(self._buffer) + len(chunk) <= EXTRACT_CHUNK_SIZE:
+            self._buffer += chunk
+            return len(chunk)
+        if self._temp_file is None:
+            self._spill()
+        self._temp_file.write(chunk)
+        return len(chunk)
+
+    def _spill(self):
+        self._temp_path = _new_temp_path()
+        self._temp_file = open(self._temp_path, "wb")
+        self._temp_file.write(self._buffer)
+        self._buffer = bytearray()
+
+    def _publish(self, path: str):
+        if self._temp_file is None:
+            self._spill()
+        self._temp_file.close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(self._temp_path, path)
+        except FileExistsError:
+            pass # another process stored the same content meanwhile
+
+    def close(self):
+        if self._hash is None:
+            return
+        digest = self._hash.hexdigest()
+        self._hash = None
+        path = blob_path(digest)
+
+        try:
+            if os.path.lexists(self._file_path):
+                os.remove(self._file_path)
+            for attempt in range(2):
+                if not os.path.exists(path):
+                    self._publish(path)
+                try:
+                    os.link(path, self._file_path)
+                    break
+                except FileNotFoundError:
+                    if attempt == 1:
+                        raise # the blob keeps being swept by another process
+        finally:
+            if self._temp_file is not None:
+                self._temp_file.close()
+                os.remove(self._temp_path)
+
+        self._store.manifest.append((os.path.relpath(self._file_path, self._store.root_dir), digest, self._size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is not None:
+            self._hash = None # do not store a partially written file
+            if self._temp_file is not None:
+                self._temp_file.close()
+                os.remove(self._temp_path)
+            return
+        self.close()
+
+class BlobStore:
+    '''
+    Places the files extracted into a cached module version folder into the blob store, see checksum.extract_zip_with_checksum().
+    The files placed are recorded in `manifest` as (path relative to the folder, blob digest, size) tuples.
+    '''
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self.manifest = []
+
+    def open(self, file_path: str) -> BlobFile:
+        return BlobFile(self, file_path)
+
+def hardlinks_supported() -> bool:
+    '''
+    Checks whether the filesystem of the cache directory supports hardlinks, which the blob store relies on.
+
+    Args:
+        None
+
+    Returns:
+        bool: True if files can be hardlinked in the blob store
+
+    Raises:
+        None
+    '''
+    try:
+        os.makedirs(BLOB_TEMP_DIR, exist_ok=True)
+        probe = _new_temp_path()
+        with open(probe, "wb"):
+            pass
+        try:
+            os.link(probe, f"{probe}.link")
+            os.remove(f"{probe}.link")
+            return True
+        finally:
+            os.remove(probe)
+    except OSError:
+        return False
+
+def remove_blobs(digests: list[str]) -> int:
+    '''
+    Removes the specified blobs from the store. Files already linked into cached versions or projects keep their contents.
+
+    Args:
+        digests (list): The digests of the blobs to remove
+
+    Returns:
+        int: The total size of the removed blobs, by which the size of the store decreased
+
+    Raises:
+        None
+    '''
+    freed = 0
+    for digest in digests:
+        path = blob_path(digest)
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+        except OSError:
+            continue
+        freed += size
+    return freed
+
+def sweep_blobs(referenced: set[str]) -> int:
+    '''
+    Removes every blob that is not referenced by a cached module version (and was not written recently), along with stale temporary files.
+
+    Args:
+        referenced (set): The digests of the blobs still in use
+
+    Returns:
+        int: The total size of the removed blobs
+
+    Raises:
+        None
+    '''
+    if not os.path.isdir(BLOBS_DIR):
+        return 0
+
+    unreferenced = []
+    prefix_dirs = []
+    for prefix in os.listdir(BLOBS_DIR):
+        prefix_dir = os.path.join(BLOBS_DIR, prefix)
+        if prefix_dir == BLOB_TEMP_DIR or not os.path.isdir(prefix_dir):
+            continue
+        prefix_dirs.append(prefix_dir)
+        for digest in os.listdir(prefix_dir):
+            try:
+                # recent blobs may belong to a version another process is caching and has not recorded in the index yet
+                if digest not in referenced and time.time() - os.stat(os.path.join(prefix_dir, digest)).st_mtime > STALE_TEMP_AGE:
+                    unreferenced.append(digest)
+            except OSError:
+                pass
+    freed = remove_blobs(unreferenced)
+
+    for prefix_dir in prefix_dirs:
+        try:
+            os.rmdir(prefix_dir)
+        except OSError:
+            pass # still holds blobs
+
+    if os.path.isdir(BLOB_TEMP_DIR):
+        for filename in os.listdir(BLOB_TEMP_DIR):
+            temp_path = os.path.join(BLOB_TEMP_DIR, filename)
+            try:
+                if time.time() - os.stat(temp_path).st_mtime > STALE_TEMP_AGE:
+                    os.remove(temp_path)
+            except OSError:
+                pass
+    return freed
+
+def find_blob(file_path: str) -> tuple[str, int]:
+    '''
+    Finds the blob a file of a cached module version is linked to, e.g., to rebuild the manifest of the version.
+
+    Args:
+        file_path (str): The path of the file
+
+    Returns:
+        tuple: The digest and size of the blob, or None if the file is not linked to a blob of the store
+
+    Raises:
+        None
+    '''
+    try:
+        stat = os.stat(file_path)
+        if stat.st_nlink < 2:
+            return None
+        sha256_hash = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while chunk := f.read(EXTRACT_CHUNK_SIZE):
+                sha256_hash.update(chunk)
+        digest = sha256_hash.hexdigest()
+        if os.path.samefile(file_path, blob_path(digest)):
+            return digest, stat.st_size
+    except OSError:
+        pass
+    return None
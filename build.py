@@ -0,0 +1,352 @@
+'''
+This file contains the incremental build engine of `cul compile`. Every file listed under "files" in module_info.json is compiled
+into its own object file under .cul/build/obj, and the object files are then linked into the program.
+Translation units whose source, headers and compile command did not change since the previous build are not compiled again (see build_db.py),
+and the program is not linked again if no object file or library changed, so building an unchanged project only takes a stat() per source file and header.
+The headers of every translation unit are taken from the depfile the compiler writes while compiling it, so they include the headers of the project
+and of the installed modules, whichever way they are included.
+Translation units are compiled concurrently, up to `jobs` compilers at a time, and the program is linked once all of them are compiled.
+The output of every compiler is printed in one piece once it finishes, so the diagnostics of concurrent compilers are never interleaved.
+C files are compiled with the C compiler and C++ files with the C++ compiler, see toolchain.py; the C++ compiler links the program if it has any C++ file.
+With the compiler cache enabled, the object files of the units to compile are restored from it when possible, see compiler_cache.py.
+'''
+import os
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from build_db import read_build_db, write_build_db, object_path, file_state, depfile_path, read_depfile
+from colorful_outputs import print_in_green, print_in_red, print_in_yellow
+from common_variables import DEFAULT_BUILD_JOBS, COMPILER_CACHE
+from compiler_cache import cache_key, lookup, store, record_build
+from compile import VALID_SOURCE_EXTS, find_included_modules, resolve_module_dirs
+from toolchain import get_toolchain, source_language
+
+LANGUAGE_NAMES = {"cc": "C", "cxx": "C++"}
+
+def run_compiler(argv: list[str]) -> subprocess.CompletedProcess:
+    '''
+    Runs a compiler command directly, without a shell.
+
+    Args:
+        argv (list): The command and its arguments
+
+    Returns:
+        CompletedProcess: The finished process, with its output captured
+
+    Raises:
+        OSError: If the compiler cannot be started
+    '''
+    return subprocess.run(argv, capture_output=True, text=True, cwd=os.getcwd())
+
+def compile_command(source_path: str, module_dirs: dict[str, str], compiler: list[str]) -> list[str]:
+    '''
+    Returns the command compiling a source file into its object file.
+
+    Args:
+        source_path (str): The source file
+        module_dirs (dict): Module name -> module directory of the modules it includes, see compile.resolve_module_dirs()
+        compiler (list): The compiler and the arguments it was given with, see toolchain.find_compiler()
+
+    Returns:
+        list: The command and its arguments
+
+    Raises:
+        None
+    '''
+    argv = [*compiler, "-c", source_path.replace(os.sep, "/"), "-o", object_path(source_path), "-MMD", "-MF", depfile_path(source_path)]
+    argv += [f"-I{module_dir}/include/" for module_dir in module_dirs.values()]
+    return argv
+
+def link_command(object_paths: list[str], output: str, module_dirs: dict[str, str], linker: list[str]) -> list[str]:
+    '''
+    Returns the command linking the object files into the program.
+
+    Args:
+        object_paths (list): The object files, in the order of the source files
+        output (str): The program to write
+        module_dirs (dict): Module name -> module directory of all the modules included by the project
+        linker (list): The compiler linking the program and the arguments it was given with
+
+    Returns:
+        list: The command and its arguments
+
+    Raises:
+        None
+    '''
+    argv = [*linker, *object_paths, "-o", output]
+    for module_name, module_dir in module_dirs.items():
+        argv += [f"-L{module_dir}/bin/", f"-l{module_name}"]
+    return argv
+
+def _output_exists(output: str) -> bool:
+    return os.path.exists(output) or (os.name == "nt" and os.path.exists(f"{output}.exe"))
+
+def _file_states(paths: list[str], records: dict, states: dict) -> dict:
+    '''
+    Returns the states of the specified files, see build_db.file_state(). Headers are shared by many translation units,
+    so the states are computed once per build in `states`; None for the files that no longer exist.
+    '''
+    result = {}
+    for path in paths:
+        if path not in states:
+            try:
+                states[path] = file_state(path, records.get(path))
+            except OSError:
+                states[path] = None
+        result[path] = states[path]
+    return result
+
+def _plan_unit(source_path: str, record: dict, states: dict, toolchain: dict) -> dict:
+    language = source_language(source_path)
+    if toolchain[language] is None:
+        raise ValueError(f"No {LANGUAGE_NAMES[language]} compiler was found, install one or set the {'CXX' if language == 'cxx' else 'CC'} environment variable")
+    state = file_state(source_path, record)
+    if record and record.get("hash") == state["hash"]:
+        modules = record.get("modules", {}) # the include lines are only parsed again when the source changed
+    else:
+        modules = find_included_modules(source_path)
+    module_dirs = resolve_module_dirs(modules)
+    command = compile_command(source_path, module_dirs, toolchain[language])
+
+    dependencies = record.get("dependencies", {}) if record else {}
+    dependency_states = _file_states(list(dependencies), dependencies, states)
+    headers_changed = any(dependency_states[path] is None or dependency_states[path]["hash"] != dependencies[path].get("hash") for path in dependencies)
+
+    dirty = (not record or record.get("hash") != state["hash"] or record.get("command") != command or headers_changed
+             or not os.path.exists(object_path(source_path)))
+    return {"source": source_path, "language": language, "state": state, "modules": modules, "module_dirs": module_dirs, "command": command,
+            "dependencies": dependency_states, "dirty": dirty}
+
+def _library_paths(module_dirs: dict[str, str]) -> list[str]:
+    library_paths = []
+    for module_dir in module_dirs.values():
+        bin_dir = os.path.join(module_dir, "bin")
+        if os.path.isdir(bin_dir):
+            library_paths += sorted(f"{module_dir}/bin/{filename}" for filename in os.listdir(bin_dir) if os.path.isfile(os.path.join(bin_dir, filename)))
+    return library_paths
+
+def _compile_unit(unit: dict, use_cache: bool):
+    os.makedirs(os.path.dirname(object_path(unit["source"])), exist_ok=True)
+    key = cache_key(unit["command"]) if use_cache else None
+    if key is not None:
+        cached = lookup(key, object_path(unit["source"]), depfile_path(unit["source"]))
+        unit["cache"] = "miss" if cached is None else "hit"
+        if cached is not None:
+            return subprocess.CompletedProcess(unit["command"], 0, cached.get("stdout", ""), cached.get("stderr", ""))
+
+    try:
+        result = run_compiler(unit["command"])
+    except OSError as e:
+        return e
+    if key is not None and result.returncode == 0:
+        try:
+            store(key, object_path(unit["source"]), depfile_path(unit["source"]), result)
+        except OSError:
+            pass # the unit is simply compiled again next time
+    return result
+
+def compile_units(units: list[dict], jobs: int = DEFAULT_BUILD_JOBS, keep_going: bool = False, use_cache: bool = False):
+    '''
+    Compiles translation units concurrently, each compiler running in its own process, up to `jobs` at a time.
+    Once a unit fails to compile, the units that have not started yet are skipped unless `keep_going` is True.
+
+    Args:
+        units (list): The translation units to compile, with their "command"
+        jobs (int): The maximum number of compilers running at the same time
+        keep_going (bool): If True, compiles all the units even after a failure
+        use_cache (bool): If True, restores the object files from the compiler cache when possible and stores the others in it.
+                          The units get a "cache" of "hit" or "miss".
+
+    Returns:
+        generator: (unit, result) tuples in the order the compilers finish, result being the CompletedProcess of the compiler,
+                   or the OSError raised if it could not be started. Skipped units are not yielded.
+
+    Raises:
+        None
+    '''
+    if not units:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(units)))) as executor:
+        futures = {executor.submit(_compile_unit, unit, use_cache): unit for unit in units}
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            result = future.result()
+            yield futures[future], result
+            if not keep_going and (isinstance(result, OSError) or result.returncode != 0):
+                for pending in futures:
+                    pending.cancel()
+
+def _print_diagnostics(result: subprocess.CompletedProcess):
+    output = "\n".join(text.strip() for text in (result.stdout, result.stderr) if text and text.strip())
+    if output:
+        print(output)
+
+def build_project(files: list[str], output: str, jobs: int = DEFAULT_BUILD_JOBS, keep_going: bool = False, toolchain: dict = None,
+                  use_cache: bool = COMPILER_CACHE) -> bool:
+    '''
+    Builds the program from the specified source files, only compiling the translation units that changed since the previous build
+    or whose headers changed, and only linking if an object file, a library of the modules or the link command changed.
+
+    Args:
+        files (list): The source files
+        output (str): The program to write
+        jobs (int): The maximum number of files compiled at the same time. Defaults to the number of CPUs.
+        keep_going (bool): If True, compiles all the files even after one fails to compile, to report all the errors at once
+        toolchain (dict): The compilers to use, see toolchain.get_toolchain(). Found on PATH if not specified.
+        use_cache (bool): If True, uses the compiler cache. Defaults to COMPILER_CACHE (CUL_COMPILER_CACHE).
+
+    Returns:
+        bool: True if the program is up-to-date, False if a file could not be compiled or linked
+
+    Raises:
+        None
+    '''
+    if toolchain is None:
+        try:
+            toolchain = get_toolchain()
+        except ValueError as e:
+            print_in_red(f"Error: {e}")
+            return False
+
+    build_db = read_build_db()
+    previous_sources = build_db["sources"]
+    sources = {}
+    units = []
+    states = {}
+    for source_path in files:
+        if source_language(source_path) is None:
+            print_in_yellow(f"Warning: Skipping '{source_path}', only {', '.join(VALID_SOURCE_EXTS)} files are compiled.")
+            continue
+        try:
+            units.append(_plan_unit(source_path, previous_sources.get(source_path), states, toolchain))
+        except (OSError, ValueError) as e:
+            print_in_red(f"Error: Cannot compile '{source_path}': {e}")
+            return False
+
+    changed = False
+    for unit in units:
+        if not unit["dirty"]:
+            # files touched without being changed get their new modification time recorded, so they are not read again next time
+            record = {**previous_sources[unit["source"]], **unit["state"], "dependencies": unit["dependencies"]}
+            changed = changed or record != previous_sources[unit["source"]]
+            sources[unit["source"]] = record
+
+    success = True
+    dirty_units = [unit for unit in units if unit["dirty"]]
+    finished = 0
+    for unit, result in compile_units(dirty_units, jobs, keep_going, use_cache):
+        finished += 1
+        if isinstance(result, OSError):
+            print_in_red(f"Error: Cannot run the compiler '{unit['command'][0]}': {result}")
+            success = False
+            continue
+        _print_diagnostics(result)
+        if result.returncode != 0:
+            print_in_red(f"Error compiling {unit['source']}.")
+            success = False
+            continue
+
+        print(f"Compiled {unit['source']}{' (from the compiler cache)' if unit.get('cache') == 'hit' else ''}")
+        try:
+            dependencies = read_depfile(depfile_path(unit["source"]), unit["source"])
+        except (OSError, ValueError) as e:
+            print_in_yellow(f"Warning: Could not read the dependencies of {unit['source']} ({e}), it will be compiled again next time.")
+            continue
+        dependency_states = _file_states(dependencies, {}, states)
+        sources[unit["source"]] = {**unit["state"], "modules": unit["modules"], "command": unit["command"], "object": object_path(unit["source"]),
+                                   "dependencies": {path: state for path, state in dependency_states.items() if state is not None}}
+        changed = True
+
+    if use_cache and dirty_units:
+        hits = sum(unit.get("cache") == "hit" for unit in dirty_units)
+        misses = sum(unit.get("cache") == "miss" for unit in dirty_units)
+        print(f"Compiler cache: {hits} hit(s), {misses} miss(es).")
+        try:
+            record_build(hits, misses)
+        except (OSError, ValueError) as e:
+            print_in_yellow(f"Warning: Could not update the compiler cache: {e}")
+
+    if finished < len(dirty_units):
+        print_in_yellow(f"Stopped at the first error, {len(dirty_units) - finished} file(s) were not compiled. Use --keep-going to compile them anyway.")
+
+    if success and units:
+        all_module_dirs = {}
+        for unit in units:
+            for module_name, module_dir in unit["module_dirs"].items():
+                all_module_dirs.setdefault(module_name, module_dir)
+        linker = toolchain["cxx"] if any(unit["language"] == "cxx" for unit in units) else toolchain["cc"]
+        command = link_command([object_path(unit["source"]) for unit in units], output, all_module_dirs, linker)
+        previous_libraries = build_db["link"].get("libraries", {})
+        libraries = _file_states(_library_paths(all_module_dirs), previous_libraries, states)
+        compiled = any(unit["dirty"] for unit in units)
+
+        if compiled or build_db["link"].get("command") != command or libraries != previous_libraries or not _output_exists(output):
+            try:
+                result = run_compiler(command)
+            except OSError as e:
+                print_in_red(f"Error: Cannot run the compiler '{linker[0]}': {e}")
+                result = None
+            if result is not None:
+                _print_diagnostics(result)
+            if result is None or result.returncode != 0:
+                print_in_red(f"Error linking {output}.")
+                build_db["link"] = {}
+                success = False
+            else:
+                build_db["link"] = {"command": command, "output": output, "libraries": libraries}
+                print_in_green(f"Built {output} ({sum(unit['dirty'] for unit in units)} of {len(units)} file(s) compiled).")
+                changed = True
+        else:
+            print_in_green(f"{output} is up-to-date.")
+
+    if changed or not success or sources.keys() != previous_sources.keys():
+        build_db["sources"] = sources
+        try:
+            write_build_db(build_db)
+        except OSError as e:
+            print_in_yellow(f"Warning: Could not store the build database: {e}")
+    return success
+
+def compile_files(jobs: int = DEFAULT_BUILD_JOBS, keep_going: bool = False, use_cache: bool = COMPILER_CACHE):
+    '''
+    Builds the program of the project from the files listed in module_info.json, see build_project().
+    The program is named after the "main" file of the project, and the compilers are found as described in toolchain.py.
+
+    Args:
+        jobs (int): The maximum number of files compiled at the same time. Defaults to the number of CPUs.
+        keep_going (bool): If True, compiles all the files even after one fails to compile
+        use_cache (bool): If True, uses the compiler cache, see compiler_cache.py. Defaults to COMPILER_CACHE (CUL_COMPILER_CACHE).
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    try:
+        with open("module_info.json", "r") as f:
+            data = json.load(f)
+            files = data.get("files", [])
+    except FileNotFoundError:
+        print("module_info.json file not found.")
+        return
+    except json.JSONDecodeError:
+        print("Error decoding JSON from module_info.json.")
+        return
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return
+
+    if not files:
+        print("No files to compile.")
+        return
+
+    try:
+        toolchain = get_toolchain(data.get("toolchain"))
+    except ValueError as e:
+        print_in_red(f"Error: {e}")
+        return
+
+    output = os.path.splitext(os.path.basename(data.get("main") or files[0]))[0]
+    build_project(files, output, jobs, keep_going, toolchain, use_cache)
@@ -0,0 +1,149 @@
+'''
+This file contains the build database of `cul compile`, kept in .cul/build/build_db.json.
+For every translation unit it records the hash, size and modification time of the source file and of every header it includes
+(as listed by the depfile the compiler writes along with the object file), the modules it includes, the exact command its object file
+was compiled with and the object file, and for the program the command it was linked with and the libraries of the modules.
+A translation unit is only compiled again when its source, one of its headers or its command changed, and the program is only linked again
+when an object file, a library or the link command changed.
+'''
+import os
+import re
+import json
+from common_variables import BUILD_DIR
+from manifest import hash_file
+
+BUILD_DB_VERSION = 2
+BUILD_DB_PATH = os.path.join(BUILD_DIR, "build_db.json")
+OBJECTS_DIR = os.path.join(BUILD_DIR, "obj")
+
+_DEPFILE_TOKEN_PATTERN = re.compile(r"(?:\\.|[^\s\\])+")
+
+def read_build_db() -> dict:
+    '''
+    Reads the build database of the project.
+
+    Args:
+        None
+
+    Returns:
+        dict: {"format_version", "sources", "link"}, sources mapping source paths to their records. Empty if the project was never built
+              or the database is invalid, so everything is built again.
+
+    Raises:
+        None
+    '''
+    try:
+        with open(BUILD_DB_PATH, "r") as f:
+            build_db = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        build_db = None
+    if not isinstance(build_db, dict) or build_db.get("format_version") != BUILD_DB_VERSION:
+        build_db = {"format_version": BUILD_DB_VERSION}
+    build_db.setdefault("sources", {})
+    build_db.setdefault("link", {})
+    return build_db
+
+def write_build_db(build_db: dict):
+    '''
+    Stores the build database of the project. The file is replaced atomically, so an interrupted build never leaves a partial database.
+
+    Args:
+        build_db (dict): The build database, see read_build_db()
+
+    Returns:
+        None
+
+    Raises:
+        OSError: If the database cannot be written
+    '''
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    temp_path = f"{BUILD_DB_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(build_db, f)
+    os.replace(temp_path, BUILD_DB_PATH)
+
+def object_path(source_path: str) -> str:
+    '''
+    Returns the path of the object file of a source file, mirroring the layout of the project under .cul/build/obj.
+
+    Args:
+        source_path (str): The source file, relative to the project
+
+    Returns:
+        str: The object file path (with "/" separators)
+
+    Raises:
+        None
+    '''
+    relative_path = os.path.normpath(source_path).replace(os.sep, "/").replace("../", "__/").lstrip("/")
+    return f"{OBJECTS_DIR.replace(os.sep, '/')}/{relative_path}.o"
+
+def file_state(file_path: str, record: dict = None) -> dict:
+    '''
+    Returns the hash, size and modification time of a file. The hash recorded in `record` is reused if the size and modification time
+    did not change, so unchanged files are not read again.
+
+    Args:
+        file_path (str): The file
+        record (dict): The previous state of the file, if any
+
+    Returns:
+        dict: {"hash", "size", "mtime_ns"}
+
+    Raises:
+        OSError: If the file cannot be read
+    '''
+    stat = os.stat(file_path)
+    if record and record.get("size") == stat.st_size and record.get("mtime_ns") == stat.st_mtime_ns and record.get("hash"):
+        return {"hash": record["hash"], "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return {"hash": hash_file(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def depfile_path(source_path: str) -> str:
+    '''
+    Returns the path of the depfile the compiler writes along with the object file of a source file.
+
+    Args:
+        source_path (str): The source file, relative to the project
+
+    Returns:
+        str: The depfile path (with "/" separators)
+
+    Raises:
+        None
+    '''
+    return f"{object_path(source_path)[:-len('.o')]}.d"
+
+def read_depfile(path: str, source_path: str) -> list[str]:
+    '''
+    Reads the headers a translation unit depends on from the depfile written by the compiler (-MMD -MF), in the Makefile syntax:
+    "target: source header header \\" with continued lines, spaces in paths escaped as "\\ " and "$" as "$$".
+
+    Args:
+        path (str): The depfile
+        source_path (str): The source file of the translation unit, left out of the dependencies
+
+    Returns:
+        list: The header paths (with "/" separators), in the order of the depfile
+
+    Raises:
+        OSError: If the depfile cannot be read
+        ValueError: If the depfile has no target
+    '''
+    with open(path, "r") as f:
+        text = f.read().replace("\\\r\n", " ").replace("\\\n", " ")
+
+    # the target ends at the first colon followed by whitespace, which leaves the drive letters of Windows paths alone
+    separator = re.search(r":(\s|$)", text)
+    if separator is None:
+        raise ValueError(f"Invalid depfile '{path}'")
+
+    source = os.path.normpath(source_path)
+    dependencies = []
+    for token in _DEPFILE_TOKEN_PATTERN.findall(text[separator.end():].split("\n")[0]):
+        dependency = re.sub(r"\\([ #\\])", r"\1", token).replace("$$", "$")
+        if dependency == ":" or os.path.normpath(dependency) == source:
+            continue
+        dependency = os.path.normpath(dependency).replace(os.sep, "/")
+        if dependency not in dependencies:
+            dependencies.append(dependency)
+    return dependencies
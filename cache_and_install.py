@@ -1,99 +1,72 @@
 import shutil
 import os
-from common_variables import C_CPP_MODULES_DLD_DIR, CACHE_DIR
+from common_variables import C_CPP_MODULES_DLD_DIR, CACHE_DIR, CACHE_LOCKS_DIR, CACHE_MAX_SIZE, CACHE_MAX_AGE_DAYS
 from colorful_outputs import print_in_green, print_in_red, print_in_yellow
+from checksum import extract_zip_with_checksum, DEFAULT_CHECKSUM_ALGORITHM
+from link_ops import materialize_tree
+from helper_functions import parse_size
+from blob_store import BlobStore, hardlinks_supported, remove_blobs, sweep_blobs, STALE_TEMP_AGE
+from file_lock import FileLock
+from manifest import build_manifest, write_manifest, read_manifest, refresh_manifest, verify_manifest, ensure_manifest
+import cache_index
 import json
+import time
+import uuid
+import sqlite3
 import zipfile
+import threading
 
-def manage_versions_json(module_name: str):
-    '''
-    Manages the versions.json file for the specified module in the cache directory
-
-    Args:
-        module_name (str): The name of the module to manage/modify the versions.json file for
-
-    Returns:
-        None
-
-    Raises:
-        Exception: If any unexpected error occurs during dumping the versions data to the versions.json file
-    '''
-    module_dir = os.path.join(CACHE_DIR, module_name)
-    versions_file = os.path.join(module_dir, "versions.json")
-
-    if not os.path.exists(module_dir):
-        print(f"Module '{module_name}' does not exist in the cache.")
-        return
-
-    versions = [folder for folder in os.listdir(module_dir) if os.path.isdir(os.path.join(module_dir, folder))]
+# Guards the detection below, done by the first worker thread that writes to the cache
+_cache_write_lock = threading.Lock()
 
-    if not versions and os.path.exists(versions_file):
-        os.remove(versions_file)
-        print(f"Deleted empty versions.json for module '{module_name}'.")
-        return
+# Whether the cache directory supports the hardlinks the blob store relies on, checked on the first cache write
+_use_blob_store = None
 
-    versions.sort(key=lambda v: list(map(int, v.split("."))))
-    
-    versions_data = {
-        "versions": versions,
-        "latest_version": versions[-1]
-    }
-
-    try:
-        with open(versions_file, "w") as f:
-            json.dump(versions_data, f, indent=4)
-    except Exception as e:
-        print_in_red(f"Error updating versions.json for module '{module_name}': {e}")
+STAGING_PREFIX = ".staging-" # Cached versions are extracted into "<module>/.staging-<version>-<random>" and then renamed into place
 
-def manage_cached_json(module_name: str, version: str):
+def entry_lock(module_name: str, version: str, shared: bool = False) -> FileLock:
     '''
-    Manages the cached.json file in the cache directory to reflect the cached modules and versions.
+    Returns the lock of a cached module version, which serializes the cul processes sharing the cache.
+    Fetching, caching and removing a version take the lock exclusively, installing a version from the cache takes it shared.
 
     Args:
-        module_name (str): The name of the module to manage/modify the cached.json file for
-        version (str): The version of the module to manage/modify the cached.json file for
+        module_name (str): The name of the module
+        version (str): The version of the module
+        shared (bool): If True, returns a shared lock. Defaults to an exclusive lock.
 
     Returns:
-        None
+        FileLock: The lock, not acquired yet
 
     Raises:
-        Exception: If any unexpected error occurs during updating the cached.json file
-        JSONDecodeError: If the JSON decoding fails while reading the cached.json file
+        None
     '''
-    cached_file = os.path.join(CACHE_DIR, "cached.json")
-    cached_data = {}
-        
-    if os.path.exists(cached_file):
-        with open(cached_file, "r") as f:
-            try:
-                cached_data = json.load(f)
-            except json.JSONDecodeError:
-                print_in_red("Error reading cached.json file. It may be corrupted.")
-
-    if module_name not in cached_data:
-        cached_data[module_name] = []
-    if version not in cached_data[module_name]:
-        cached_data[module_name].append(version)
-        cached_data[module_name].sort(key=lambda v: list(map(int, v.split("."))))
-    
-    try:
-        with open(cached_file, "w") as f:
-            json.dump(cached_data, f, indent=4)
-    except Exception as e:
-        print_in_red(f"Error updating cached.json: {e}")
+    return FileLock(os.path.join(CACHE_LOCKS_DIR, f"{module_name}@{version}.lock"), shared)
 
+def _use_blobs() -> bool:
+    global _use_blob_store
+    with _cache_write_lock:
+        if _use_blob_store is None:
+            _use_blob_store = hardlinks_supported()
+        return _use_blob_store
 
-def cache_module(zip_ref: zipfile.ZipFile, module_name: str, version: str = '1.0.0'):
+def cache_module(zip_ref: zipfile.ZipFile, module_name: str, version: str = '1.0.0', archive_checksum: str = '', registry: str = '', checksum_algorithm: str = DEFAULT_CHECKSUM_ALGORITHM):
     '''
-    Cache the module along with its version in the cache directory
+    Cache the module along with its version in the cache directory.
+    The files are deduplicated through the blob store where the cache directory supports hardlinks, see blob_store.py.
+    The archive is extracted into a staging folder, which is renamed into place once complete and only then recorded in the cache index,
+    all while holding the lock of the version, so other processes never see a partially extracted version.
+    The manifest of the version (see manifest.py) is built from the hashes computed during the extraction, so the version is verified cheaply afterwards.
 
     Args:
         zip_ref (ZipFile): The ZipFile object of the module to cache
         module_name (str): The name of the module to cache
         version (str): The version of the module to cache
+        archive_checksum (str): The checksum of the downloaded archive, in the "algorithm:hex" format
+        registry (str): The registry URL the module was fetched from
+        checksum_algorithm (str): The algorithm of the checksum of the extracted module files, usually the one its checksum.txt declares. Defaults to SHA-256.
 
     Returns:
-        None
+        str: The checksum of the extracted module files (see checksum.extract_zip_with_checksum()), or an empty string if the module could not be cached
 
     Raises:
         Exception: If any unexpected error occurs
@@ -103,16 +76,36 @@ def cache_module(zip_ref: zipfile.ZipFile, module_name: str, version: str = '1.0
         # cache_filepath = os.path.join(CACHE_DIR, f"{module_name}_v{version}")
         cached_module_dir = os.path.join(CACHE_DIR, module_name)
         cached_version_dir = os.path.join(cached_module_dir, version)
-        os.makedirs(cached_module_dir, exist_ok=True)
-        os.makedirs(cached_version_dir, exist_ok=True)
-        zip_ref.extractall(cached_version_dir)
-        
-        manage_versions_json(module_name)
-        manage_cached_json(module_name, version)
+        staging_dir = os.path.join(cached_module_dir, f"{STAGING_PREFIX}{version}-{uuid.uuid4().hex}")
+        replaced_dir = f"{staging_dir}.old"
+        with entry_lock(module_name, version):
+            try:
+                blob_store = BlobStore(staging_dir) if _use_blobs() else None
+                file_hashes = {}
+                os.makedirs(staging_dir)
+                module_checksum = extract_zip_with_checksum(
+                    zip_ref, staging_dir, blob_store.open if blob_store else None, None if blob_store else file_hashes, checksum_algorithm
+                )
+                size = sum(info.file_size for info in zip_ref.infolist() if not info.is_dir())
+                if blob_store:
+                    file_hashes = {path.replace(os.sep, "/"): digest for path, digest, _ in blob_store.manifest}
+                write_manifest(staging_dir, build_manifest(staging_dir, file_hashes, module_checksum))
+
+                if os.path.isdir(cached_version_dir):
+                    os.replace(cached_version_dir, replaced_dir) # a directory cannot be renamed over a non-empty one
+                os.replace(staging_dir, cached_version_dir)
+                cache_index.record_entry(
+                    module_name, version, size, module_checksum, archive_checksum, registry, blob_store.manifest if blob_store else None
+                )
+            finally:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                shutil.rmtree(replaced_dir, ignore_errors=True)
         
         # print_in_green(f"Module '{module_name} version {version}' has been successfully cached.")
+        return module_checksum
     except Exception as e:
         print_in_red(f"Error caching module: {e}")
+        return ""
 
 def check_cache_and_install(module_name: str, version: str = '', save_dir: str = C_CPP_MODULES_DLD_DIR):
     '''
@@ -128,6 +121,7 @@ def check_cache_and_install(module_name: str, version: str = '', save_dir: str =
 
     Raises:
         FileNotFoundError: If the cache directory does not exist
+        sqlite3.Error: If the cache index cannot be read
         Exception: If any unexpected error occurs
     '''
 
@@ -135,24 +129,183 @@ def check_cache_and_install(module_name: str, version: str = '', save_dir: str =
     try:
         # installed_version = None
         if version == '':
-            with open(os.path.join(cache_module_dir, "versions.json"), 'r') as f:
-                versions_data = json.load(f)
-                version = versions_data.get("latest_version")
+            version = cache_index.get_latest_version(module_name)
+        if not version:
+            return False
         cache_version_dir = os.path.join(cache_module_dir, version)
         # if os.path.isdir(os.path.join(C_CPP_MODULES_DLD_DIR, module_name)):
             # shutil.rmtree(os.path.join(C_CPP_MODULES_DLD_DIR, module_name))
-        if os.path.isdir(cache_version_dir):
-            shutil.copytree(cache_version_dir, save_dir, dirs_exist_ok=True)
-            print_in_green(f"Module '{module_name}' Version '{version}' has been successfully installed from cache.")
-            return version
-        return False
+        with entry_lock(module_name, version, shared=True):
+            # Checked under the lock, as another process may be caching or evicting the version
+            if cache_index.get_entry(module_name, version) is None or not os.path.isdir(cache_version_dir):
+                return False
+            materialize_tree(cache_version_dir, save_dir)
+            cache_manifest = read_manifest(cache_version_dir)
+            if cache_manifest is not None:
+                refresh_manifest(save_dir, cache_manifest)
+            cache_index.touch_entry(module_name, version)
+        print_in_green(f"Module '{module_name}' Version '{version}' has been successfully installed from cache.")
+        return version
     except FileNotFoundError:
         # print_in_red(f"Error: Module '{module_name}' not found in cache.")
         return False
+    except sqlite3.Error as e:
+        print_in_red(f"Error reading the cache index: {e}")
+        return False
     except Exception as e:
         print_in_red(f"Unexpected Error: {e}")
         return False
 
+def verify_cached_version(module_name: str, version: str) -> dict:
+    '''
+    Verifies the files of a cached module version against its manifest (see manifest.verify_manifest()), which only takes a stat() per file
+    unless files were modified. Versions cached by older releases get a manifest of their current files on their first verification.
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version of the module
+
+    Returns:
+        dict: The verification result, see manifest.verify_manifest(), or None if the version is not cached
+
+    Raises:
+        OSError: If the manifest of a version cached by an older release cannot be written
+    '''
+    cache_version_dir = os.path.join(CACHE_DIR, module_name, version)
+    with entry_lock(module_name, version):
+        if not os.path.isdir(cache_version_dir):
+            return None
+        ensure_manifest(cache_version_dir)
+        return verify_manifest(cache_version_dir)
+
+def repair_cached_version(module_name: str, version: str) -> bool:
+    '''
+    Verifies a cached module version and removes it from the cache if its files were modified, so that it is fetched again.
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version of the module
+
+    Returns:
+        bool: True if the version is cached and intact, False if it is not cached or was removed
+
+    Raises:
+        None
+    '''
+    try:
+        result = verify_cached_version(module_name, version)
+        if result is None or result["ok"]:
+            return result is not None
+
+        print_in_red(f"Cached module '{module_name}' version '{version}' has been modified, it will be fetched again.")
+        print_verification_details(result)
+        with entry_lock(module_name, version):
+            # the changed files were modified in place, so their blobs no longer match their digests and must not be linked again
+            changed = set(result["changed"])
+            damaged_blobs = [blob for path, blob, _ in cache_index.get_manifest(module_name, version) if path.replace(os.sep, "/") in changed]
+            remove_version_from_cache(module_name, version)
+            remove_blobs(damaged_blobs)
+        return False
+    except Exception as e:
+        print_in_red(f"Error verifying cached module '{module_name}' version '{version}': {e}")
+        return False
+
+def print_verification_details(result: dict):
+    '''
+    Prints the files reported by a manifest verification (see manifest.verify_manifest()).
+
+    Args:
+        result (dict): The verification result
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    for label in ("changed", "missing", "added"):
+        for relative_path in result[label]:
+            print(f"    {label}: {relative_path}")
+
+def get_cached_versions(module_name: str) -> list[str]:
+    '''
+    Returns the versions of the specified module available in the cache
+
+    Args:
+        module_name (str): The name of the module
+
+    Returns:
+        list: The cached versions of the module sorted from oldest to latest, or an empty list if the module is not cached
+
+    Raises:
+        sqlite3.Error: If the cache index cannot be read
+    '''
+    try:
+        return cache_index.get_versions(module_name)
+    except sqlite3.Error as e:
+        print_in_red(f"Error reading the cache index: {e}")
+        return []
+
+def get_cached_archive_info(module_name: str, version: str) -> dict:
+    '''
+    Returns the checksum of the archive the specified cached module version was extracted from, along with the registry it was fetched from
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version of the module
+
+    Returns:
+        dict: {"checksum": ..., "registry": ...}, or an empty dict if the information is not available
+
+    Raises:
+        sqlite3.Error: If the cache index cannot be read
+    '''
+    try:
+        entry = cache_index.get_entry(module_name, version)
+    except sqlite3.Error as e:
+        print_in_red(f"Error reading the cache index: {e}")
+        return {}
+    return {"checksum": entry["archive_checksum"], "registry": entry["registry"]} if entry else {}
+
+def get_cached_module_info(module_name: str, version: str) -> dict:
+    '''
+    Returns the contents of the module_info.json file of the specified cached module version
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version of the module
+
+    Returns:
+        dict: The contents of the module_info.json file, or None if the version is not cached or the file cannot be read
+
+    Raises:
+        FileNotFoundError: If the module version is not found in the cache directory
+        JSONDecodeError: If the JSON decoding fails
+    '''
+    try:
+        with open(os.path.join(CACHE_DIR, module_name, version, "module_info.json"), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def format_size(size: int) -> str:
+    '''
+    Formats a size in bytes for display
+
+    Args:
+        size (int): The size in bytes
+
+    Returns:
+        str: The size with a human readable unit (e.g., "1.5 MiB")
+
+    Raises:
+        None
+    '''
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
 def clear_cache():
     '''
     Clears the cache directory
@@ -168,6 +321,7 @@ def clear_cache():
         Exception: If any unexpected error occurs
     '''
     try:
+        cache_index.close_connection()
         shutil.rmtree(CACHE_DIR)
         print_in_green("Cache cleared successfully.")
     except FileNotFoundError:
@@ -190,18 +344,21 @@ def show_cache():
         Exception: If any unexpected error occurs
     '''
     try:
-        cache_file_path = os.path.join(CACHE_DIR, "cached.json")
-        cached_data = {}
-        with open(cache_file_path, "r") as f:
-            cached_data = json.load(f)
+        if not os.path.isdir(CACHE_DIR):
+            print("Cache is empty.")
+            return
+        cached_data = cache_index.list_entries()
+        if not cached_data:
+            print("Cache is empty.")
+            return
         print("Cache contents:")
-        for module, versions in cached_data.items():
+        for module, entries in cached_data.items():
             print(f"  {module}:")
-            for version in versions:
-                print(f"    - v{version}")
+            for entry in entries:
+                print(f"    - v{entry['version']} ({format_size(entry['size'])})")
             print()
-    except FileNotFoundError:
-        print("Cache is empty.")
+        disk_usage, logical_size = cache_index.get_disk_usage()
+        print(f"Total: {format_size(disk_usage)} on disk ({format_size(logical_size)} before deduplication)")
     except Exception as e:
         print_in_red(f"Error showing cache: {e}")
 
@@ -220,17 +377,120 @@ def remove_module_from_cache(module_name: str) -> None:
         Exception: If any unexpected error occurs
     '''
     try:
-        shutil.rmtree(os.path.join(CACHE_DIR, module_name))
+        if not os.path.isdir(os.path.join(CACHE_DIR, module_name)):
+            raise FileNotFoundError(module_name)
+        for version in cache_index.get_versions(module_name):
+            with entry_lock(module_name, version):
+                remove_version_from_cache(module_name, version)
         # print_in_green(f"Module '{module_name}' removed from cache.")
-
-        with open(os.path.join(CACHE_DIR, "cached.json"), "r") as f:
-            cached_data = json.load(f)
-
-        if module_name in cached_data:
-            del cached_data[module_name]
-            with open(os.path.join(CACHE_DIR, "cached.json"), "w") as f:
-                json.dump(cached_data, f, indent=4)
     except FileNotFoundError:
         print_in_yellow(f"Module '{module_name}' not found in cache.")
     except Exception as e:
-        print_in_red(f"Error removing module from cache: {e}")
\ No newline at end of file
+        print_in_red(f"Error removing module from cache: {e}")
+
+def remove_version_from_cache(module_name: str, version: str) -> int:
+    '''
+    Removes a single version of the specified module from the cache directory, along with the module folder once it is empty
+    and the blobs no other cached version uses. The caller must hold the lock of the version, see entry_lock().
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version of the module to remove
+
+    Returns:
+        int: The number of bytes by which the cache shrank
+
+    Raises:
+        sqlite3.Error: If the cache index cannot be updated
+    '''
+    entry = cache_index.get_entry(module_name, version)
+    in_blob_store = bool(cache_index.get_manifest(module_name, version))
+    unused_blobs = cache_index.remove_entries(module_name, version)
+    module_dir = os.path.join(CACHE_DIR, module_name)
+    shutil.rmtree(os.path.join(module_dir, version), ignore_errors=True)
+    try:
+        os.rmdir(module_dir)
+    except OSError:
+        pass # other versions are still cached or being cached
+
+    freed = remove_blobs(unused_blobs)
+    if entry is not None and not in_blob_store:
+        freed += entry["size"]
+    return freed
+
+def _remove_stale_staging_dirs():
+    for module_name in os.listdir(CACHE_DIR):
+        module_dir = os.path.join(CACHE_DIR, module_name)
+        if module_name.startswith(".") or not os.path.isdir(module_dir):
+            continue
+        for folder in os.listdir(module_dir):
+            staging_dir = os.path.join(module_dir, folder)
+            try:
+                if folder.startswith(STAGING_PREFIX) and time.time() - os.stat(staging_dir).st_mtime > STALE_TEMP_AGE:
+                    shutil.rmtree(staging_dir, ignore_errors=True) # left over by a process that was killed while caching
+            except OSError:
+                pass
+
+def gc_cache(max_size: str = CACHE_MAX_SIZE, max_age_days: str = CACHE_MAX_AGE_DAYS, keep: set = None, verbose: bool = True, sweep: bool = True) -> tuple[int, int]:
+    '''
+    Trims the cache to the configured limits. Module versions not used for longer than the age limit are removed first,
+    then the least recently used versions are removed until the cache fits into the size limit.
+    The size of the cache is its disk usage, counting the files shared by several versions once.
+
+    Args:
+        max_size (str): The maximum size of the cache (e.g., "500M", "10G"), "0" disables the limit. Defaults to CACHE_MAX_SIZE (CUL_CACHE_MAX_SIZE).
+        max_age_days (str): The number of days after which an unused version is removed, "0" disables the limit. Defaults to CACHE_MAX_AGE_DAYS (CUL_CACHE_MAX_AGE_DAYS).
+        keep (set): The (module name, version) pairs that must not be removed, e.g., the ones that were just installed
+        verbose (bool): If True, reports the result even when nothing was removed
+        sweep (bool): If True, also removes the blobs no cached version uses anymore and the staging folders left over by interrupted processes
+
+    Returns:
+        tuple: The number of versions removed and the number of bytes freed
+
+    Raises:
+        ValueError: If a limit is not in a valid format
+        sqlite3.Error: If the cache index cannot be read or updated
+    '''
+    size_limit = parse_size(str(max_size))
+    try:
+        age_limit = float(max_age_days) * 24 * 60 * 60
+    except ValueError:
+        raise ValueError(f"Invalid age '{max_age_days}'. Expected a number of days.")
+    keep = keep or set()
+
+    if not os.path.isdir(CACHE_DIR):
+        if verbose:
+            print("Cache is empty.")
+        return 0, 0
+
+    entries = cache_index.list_entries_by_last_use()
+    total_size = cache_index.get_disk_usage()[0]
+    now = time.time()
+    removed, freed = 0, 0
+
+    for entry in entries:
+        if (entry["module"], entry["version"]) in keep:
+            continue
+        expired = age_limit > 0 and now - entry["last_used_at"] > age_limit
+        too_big = size_limit > 0 and total_size > size_limit
+        if not expired and not too_big:
+            continue
+
+        lock = entry_lock(entry["module"], entry["version"])
+        if not lock.acquire(blocking=False):
+            continue # being installed or cached by another process right now
+        try:
+            version_freed = remove_version_from_cache(entry["module"], entry["version"])
+        finally:
+            lock.release()
+        total_size -= version_freed
+        removed += 1
+        freed += version_freed
+
+    if sweep:
+        freed += sweep_blobs(cache_index.get_referenced_blobs())
+        _remove_stale_staging_dirs()
+
+    if removed or verbose:
+        print_in_green(f"Removed {removed} cached module version(s), freed {format_size(freed)}. The cache now holds {format_size(total_size)}.")
+    return removed, freed
@@ -0,0 +1,420 @@
+'''
+This file contains the index of the module cache.
+Every cached module version is recorded in a single SQLite database in the cache directory (module, version, size, checksum,
+insertion time and last use), so looking up or adding a cached version is one indexed query instead of a read-modify-write of JSON files.
+SQLite transactions keep the index consistent when several cul processes use the same cache at the same time.
+The cached.json and versions.json files used by earlier releases are imported the first time the index is opened.
+The index also holds the manifest of every cached version stored in the blob store (see blob_store.py): the blob each of its files is linked to.
+'''
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from colorful_outputs import print_in_yellow
+from common_variables import CACHE_DIR, BLOBS_DIR
+from blob_store import find_blob
+
+CACHE_INDEX_PATH = os.path.join(CACHE_DIR, "cache_index.db")
+CACHE_INDEX_SCHEMA_VERSION = 2
+BUSY_TIMEOUT = 30 # Seconds to wait for another process holding the index before giving up
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache_entries (
+    module TEXT NOT NULL,
+    version TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    checksum TEXT NOT NULL DEFAULT '',
+    archive_checksum TEXT NOT NULL DEFAULT '',
+    registry TEXT NOT NULL DEFAULT '',
+    inserted_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    PRIMARY KEY (module, version)
+);
+CREATE TABLE IF NOT EXISTS cache_files (
+    module TEXT NOT NULL,
+    version TEXT NOT NULL,
+    path TEXT NOT NULL,
+    blob TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (module, version, path)
+);
+CREATE INDEX IF NOT EXISTS cache_files_blob ON cache_files (blob);
+'''
+
+_ENTRY_COLUMNS = ["module", "version", "size", "checksum", "archive_checksum", "registry", "inserted_at", "last_used_at"]
+
+# One connection per thread, as sqlite3 connections must not be shared between the worker threads of parallel installs
+_local = threading.local()
+
+def _version_key(version: str) -> tuple:
+    try:
+        return (1, tuple(map(int, version.split("."))))
+    except ValueError:
+        return (0, version) # folders that are not "X.Y.Z" versions sort first, so they are never picked as the latest version
+
+def _directory_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                size += os.lstat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+    return size
+
+def _scan_cache_dir(conn: sqlite3.Connection):
+    '''
+    Records every module version found in the cache directory, along with the archive information kept in the legacy versions.json files
+    and the blobs the files of the version are linked to.
+    '''
+    now = time.time()
+    has_blobs = os.path.isdir(BLOBS_DIR)
+    for module_name in sorted(os.listdir(CACHE_DIR)):
+        module_dir = os.path.join(CACHE_DIR, module_name)
+        if module_name.startswith(".") or not os.path.isdir(module_dir):
+            continue
+
+        archives = {}
+        versions_file = os.path.join(module_dir, "versions.json")
+        if os.path.isfile(versions_file):
+            try:
+                with open(versions_file, "r") as f:
+                    archives = json.load(f).get("archives", {})
+            except (OSError, json.JSONDecodeError):
+                pass
+
+        for version in os.listdir(module_dir):
+            version_dir = os.path.join(module_dir, version)
+            if version.startswith(".") or not os.path.isdir(version_dir):
+                continue
+
+            checksum = ""
+            try:
+                with open(os.path.join(version_dir, "checksum.txt"), "r") as f:
+                    checksum = f.read().strip()
+            except OSError:
+                pass
+
+            archive_info = archives.get(version, {})
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (module_name, version, _directory_size(version_dir), checksum,
+                 archive_info.get("checksum", ""), archive_info.get("registry", ""), now, now),
+            )
+            if has_blobs:
+                for root, _, files in os.walk(version_dir):
+                    for filename in files:
+                        file_path = os.path.join(root, filename)
+                        blob = find_blob(file_path)
+                        if blob:
+                            conn.execute(
+                                "INSERT OR IGNORE INTO cache_files VALUES (?, ?, ?, ?, ?)",
+                                (module_name, version, os.path.relpath(file_path, version_dir), *blob),
+                            )
+
+def _remove_legacy_metadata():
+    for path in [os.path.join(CACHE_DIR, "cached.json")] + [
+        os.path.join(CACHE_DIR, module_name, "versions.json") for module_name in os.listdir(CACHE_DIR)
+    ]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _open_index() -> sqlite3.Connection:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(CACHE_INDEX_PATH, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}")
+    conn.execute("PRAGMA journal_mode = WAL") # readers do not block the writer, falls back silently where WAL is unavailable
+    conn.execute("PRAGMA synchronous = NORMAL")
+
+    if conn.execute("PRAGMA user_version").fetchone()[0] != CACHE_INDEX_SCHEMA_VERSION:
+        with _transaction(conn):
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version != CACHE_INDEX_SCHEMA_VERSION:
+                for statement in _SCHEMA.split(";"): # executescript() would commit the transaction
+                    if statement.strip():
+                        conn.execute(statement)
+                if schema_version == 0:
+                    _scan_cache_dir(conn)
+                conn.execute(f"PRAGMA user_version = {CACHE_INDEX_SCHEMA_VERSION}")
+        if schema_version == 0:
+            _remove_legacy_metadata()
+    return conn
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    conn.execute("BEGIN IMMEDIATE") # takes the write lock up front, so concurrent writers wait instead of failing on upgrade
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+def get_connection() -> sqlite3.Connection:
+    '''
+    Returns the connection of the current thread to the cache index, creating the index (and importing the legacy cache metadata) if needed.
+    A corrupted index is moved aside and rebuilt from the contents of the cache directory.
+
+    Args:
+        None
+
+    Returns:
+        Connection: The SQLite connection, in autocommit mode
+
+    Raises:
+        sqlite3.Error: If the index cannot be opened or rebuilt
+    '''
+    conn = getattr(_local, "conn", None)
+    if conn is not None and os.path.exists(CACHE_INDEX_PATH):
+        return conn
+    close_connection()
+
+    try:
+        conn = _open_index()
+    except sqlite3.DatabaseError as e:
+        if isinstance(e, sqlite3.OperationalError):
+            raise # locked or unreachable, not corrupted
+        print_in_yellow(f"Warning: The cache index is corrupted ({e}), rebuilding it from the cache directory.")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(CACHE_INDEX_PATH + suffix):
+                os.replace(CACHE_INDEX_PATH + suffix, f"{CACHE_INDEX_PATH}.corrupt{suffix}")
+        conn = _open_index()
+
+    _local.conn = conn
+    return conn
+
+def close_connection():
+    '''
+    Closes the connection of the current thread to the cache index, e.g., before the cache directory is removed.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+def record_entry(module_name: str, version: str, size: int, checksum: str = '', archive_checksum: str = '', registry: str = '', files: list = None):
+    '''
+    Records a module version that has just been added to the cache, replacing any previous record of it.
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version of the module
+        size (int): The size of the extracted files, in bytes
+        checksum (str): The checksum of the extracted module files
+        archive_checksum (str): The checksum of the archive the version was extracted from, in the "algorithm:hex" format
+        registry (str): The registry URL the version was fetched from
+        files (list): The manifest of the version, as (relative path, blob digest, size) tuples, if it is stored in the blob store
+
+    Returns:
+        None
+
+    Raises:
+        sqlite3.Error: If the index cannot be updated
+    '''
+    now = time.time()
+    with _transaction(get_connection()) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (module_name, version, size, checksum, archive_checksum, registry, now, now),
+        )
+        conn.execute("DELETE FROM cache_files WHERE module = ? AND version = ?", (module_name, version))
+        conn.executemany(
+            "INSERT INTO cache_files VALUES (?, ?, ?, ?, ?)",
+            [(module_name, version, path, blob, file_size) for path, blob, file_size in files or []],
+        )
+
+def remove_entries(module_name: str, version: str = '') -> list[str]:
+    '''
+    Removes the records of a module from the index.
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version to remove. Defaults to all the versions of the module.
+
+    Returns:
+        list: The digests of the blobs that were used by the removed versions and are not used by any other cached version anymore
+
+    Raises:
+        sqlite3.Error: If the index cannot be updated
+    '''
+    condition, params = ("module = ? AND version = ?", (module_name, version)) if version else ("module = ?", (module_name,))
+    with _transaction(get_connection()) as conn:
+        blobs = [row[0] for row in conn.execute(f"SELECT DISTINCT blob FROM cache_files WHERE {condition}", params)]
+        conn.execute(f"DELETE FROM cache_entries WHERE {condition}", params)
+        conn.execute(f"DELETE FROM cache_files WHERE {condition}", params)
+        return [blob for blob in blobs if conn.execute("SELECT 1 FROM cache_files WHERE blob = ? LIMIT 1", (blob,)).fetchone() is None]
+
+def touch_entry(module_name: str, version: str):
+    '''
+    Updates the last use time of a cached module version.
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version of the module
+
+    Returns:
+        None
+
+    Raises:
+        sqlite3.Error: If the index cannot be updated
+    '''
+    get_connection().execute(
+        "UPDATE cache_entries SET last_used_at = ? WHERE module = ? AND version = ?", (time.time(), module_name, version)
+    )
+
+def get_entry(module_name: str, version: str) -> dict:
+    '''
+    Returns the record of a cached module version.
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version of the module
+
+    Returns:
+        dict: The record, with the keys "module", "version", "size", "checksum", "archive_checksum", "registry", "inserted_at" and "last_used_at",
+              or None if the version is not cached
+
+    Raises:
+        sqlite3.Error: If the index cannot be read
+    '''
+    row = get_connection().execute(
+        "SELECT * FROM cache_entries WHERE module = ? AND version = ?", (module_name, version)
+    ).fetchone()
+    return dict(zip(_ENTRY_COLUMNS, row)) if row else None
+
+def get_versions(module_name: str) -> list[str]:
+    '''
+    Returns the cached versions of a module.
+
+    Args:
+        module_name (str): The name of the module
+
+    Returns:
+        list: The cached versions sorted from oldest to latest, or an empty list if the module is not cached
+
+    Raises:
+        sqlite3.Error: If the index cannot be read
+    '''
+    rows = get_connection().execute("SELECT version FROM cache_entries WHERE module = ?", (module_name,)).fetchall()
+    return sorted((row[0] for row in rows), key=_version_key)
+
+def get_latest_version(module_name: str) -> str:
+    '''
+    Returns the latest cached version of a module.
+
+    Args:
+        module_name (str): The name of the module
+
+    Returns:
+        str: The latest cached version, or an empty string if the module is not cached
+
+    Raises:
+        sqlite3.Error: If the index cannot be read
+    '''
+    versions = get_versions(module_name)
+    return versions[-1] if versions else ""
+
+def list_entries() -> dict:
+    '''
+    Returns the records of all the cached module versions.
+
+    Args:
+        None
+
+    Returns:
+        dict: Module name -> list of records (see get_entry()) sorted from oldest to latest version, with the modules sorted by name
+
+    Raises:
+        sqlite3.Error: If the index cannot be read
+    '''
+    entries = {}
+    for row in get_connection().execute("SELECT * FROM cache_entries ORDER BY module").fetchall():
+        entry = dict(zip(_ENTRY_COLUMNS, row))
+        entries.setdefault(entry["module"], []).append(entry)
+    for module_entries in entries.values():
+        module_entries.sort(key=lambda entry: _version_key(entry["version"]))
+    return entries
+
+def list_entries_by_last_use() -> list[dict]:
+    '''
+    Returns the records of all the cached module versions, least recently used first.
+
+    Args:
+        None
+
+    Returns:
+        list: The records (see get_entry()) ordered by last use time
+
+    Raises:
+        sqlite3.Error: If the index cannot be read
+    '''
+    rows = get_connection().execute("SELECT * FROM cache_entries ORDER BY last_used_at, inserted_at").fetchall()
+    return [dict(zip(_ENTRY_COLUMNS, row)) for row in rows]
+
+def get_manifest(module_name: str, version: str) -> list[tuple[str, str, int]]:
+    '''
+    Returns the manifest of a cached module version stored in the blob store.
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version of the module
+
+    Returns:
+        list: (relative path, blob digest, size) tuples sorted by path, or an empty list if the version is not stored in the blob store
+
+    Raises:
+        sqlite3.Error: If the index cannot be read
+    '''
+    return get_connection().execute(
+        "SELECT path, blob, size FROM cache_files WHERE module = ? AND version = ? ORDER BY path", (module_name, version)
+    ).fetchall()
+
+def get_referenced_blobs() -> set[str]:
+    '''
+    Returns the digests of all the blobs used by the cached module versions.
+
+    Args:
+        None
+
+    Returns:
+        set: The blob digests
+
+    Raises:
+        sqlite3.Error: If the index cannot be read
+    '''
+    return {row[0] for row in get_connection().execute("SELECT DISTINCT blob FROM cache_files")}
+
+def get_disk_usage() -> tuple[int, int]:
+    '''
+    Returns the disk space used by the cached module versions, counting every blob once.
+
+    Args:
+        None
+
+    Returns:
+        tuple: The bytes used on disk and the bytes the cached versions would use without deduplication
+
+    Raises:
+        sqlite3.Error: If the index cannot be read
+    '''
+    conn = get_connection()
+    unshared = conn.execute('''
+        SELECT COALESCE(SUM(size), 0) FROM cache_entries AS entry
+        WHERE NOT EXISTS (SELECT 1 FROM cache_files AS file WHERE file.module = entry.module AND file.version = entry.version)
+    ''').fetchone()[0]
+    blobs = conn.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM cache_files GROUP BY blob)").fetchone()[0]
+    logical = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+    return unshared + blobs, logical
@@ -0,0 +1,250 @@
+'''
+This file contains the local catalog of the modules available on a registry, kept in the cache directory (one file per registry).
+Searches run against the catalog instead of asking the registry every time, so they are instant and keep working offline.
+The catalog is refreshed once it is older than CATALOG_TTL, or on demand (`cul search --refresh`); if the registry cannot be reached,
+the catalog already stored is used.
+Registries that support it are synced incrementally: GET /get_modules/changes?since=<timestamp> answers
+{"timestamp": ..., "changed": [...], "removed": [...]}, the module names added or updated and removed since the timestamp of the previous sync
+(0 for all of them), the timestamp being the registry's own clock. Other registries are synced with a conditional GET /get_modules.
+The description and keywords of the modules, needed by the full-text search only (see search_index.py), are fetched on demand and kept
+in the catalog until the module changes: a delta sync may carry them ({"details": {module: {"description", "keywords"}}} for the changed modules),
+and the others are fetched at once from GET /get_modules/details, answering the same object for every module of the registry.
+Registries without that endpoint are asked /get_versions/<module> for each module whose details are missing.
+'''
+import os
+import json
+import time
+import hashlib
+import urllib.error
+import urllib.parse
+from common_variables import BASE_URL, CATALOG_DIR, CATALOG_TTL
+from registry_client import get_registry_client
+from metadata_cache import read_cached_response
+from colorful_outputs import print_in_yellow
+
+CATALOG_FORMAT_VERSION = 1
+UNSUPPORTED_ENDPOINT_STATUSES = (400, 404, 405, 501) # Answers of registries without the changes or details endpoints
+
+def catalog_path(registry: str) -> str:
+    '''
+    Returns the path of the catalog file of the specified registry.
+
+    Args:
+        registry (str): The registry URL
+
+    Returns:
+        str: The path of the catalog file
+
+    Raises:
+        None
+    '''
+    return os.path.join(CATALOG_DIR, f"{hashlib.sha256(registry.rstrip('/').encode()).hexdigest()[:16]}.json")
+
+def read_catalog(registry: str) -> dict:
+    '''
+    Reads the catalog stored for the specified registry.
+
+    Args:
+        registry (str): The registry URL
+
+    Returns:
+        dict: {"format_version", "registry", "fetched_at", "modules", "details"}, the details mapping module names to their
+              {"description", "keywords"} when fetched, or None if no valid catalog is stored
+
+    Raises:
+        None
+    '''
+    try:
+        with open(catalog_path(registry), "r") as f:
+            catalog = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if catalog.get("format_version") != CATALOG_FORMAT_VERSION or not isinstance(catalog.get("modules"), list):
+        return None
+    return catalog
+
+def write_catalog(registry: str, catalog: dict):
+    '''
+    Stores the catalog of the specified registry. The file is replaced atomically, so concurrent searches never read a partial catalog.
+
+    Args:
+        registry (str): The registry URL
+        catalog (dict): The catalog to store
+
+    Returns:
+        None
+
+    Raises:
+        OSError: If the catalog cannot be written
+    '''
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    path = catalog_path(registry)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(catalog, f)
+    os.replace(temp_path, path)
+
+def _parse_details(module_info: dict) -> dict:
+    keywords = module_info.get("keywords") or []
+    return {
+        "description": module_info.get("description") or "",
+        "keywords": [keywords] if isinstance(keywords, str) else list(keywords),
+    }
+
+def _list_validator(url: str) -> list:
+    cached = read_cached_response(url)
+    return [cached["etag"], cached["last_modified"]] if cached else None
+
+def _fetch_changes(registry: str, catalog: dict) -> dict:
+    since = catalog.get("synced_until", 0) if catalog else 0
+    try:
+        changes = get_registry_client().get_json(f"{registry}/get_modules/changes?since={since}", conditional=False)
+    except urllib.error.HTTPError as e:
+        if e.code in UNSUPPORTED_ENDPOINT_STATUSES:
+            return None
+        raise
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(changes, dict) or "timestamp" not in changes:
+        return None
+    return changes
+
+def fetch_catalog(registry: str, catalog: dict = None, probe_delta_sync: bool = False) -> dict:
+    '''
+    Syncs the catalog of the specified registry and stores it. Only the changes since the previous sync are downloaded if the registry supports it,
+    otherwise the whole list of modules is requested (conditionally, so an unchanged list is not downloaded again).
+
+    Args:
+        registry (str): The registry URL
+        catalog (dict): The catalog stored, if any, see read_catalog()
+        probe_delta_sync (bool): If True, tries the incremental sync even if the registry did not support it at the previous sync
+
+    Returns:
+        dict: The new catalog
+
+    Raises:
+        HTTPError: If the server returns an unsuccessful status code
+        URLError: If the server cannot be reached
+        JSONDecodeError: If the JSON decoding fails
+    '''
+    changes = None
+    if catalog is None or catalog.get("delta_sync", True) or probe_delta_sync:
+        changes = _fetch_changes(registry, catalog)
+
+    new_catalog = {
+        "format_version": CATALOG_FORMAT_VERSION,
+        "registry": registry,
+        "fetched_at": time.time(),
+        "delta_sync": changes is not None,
+    }
+    details = dict(catalog.get("details", {})) if catalog else {}
+    if changes is not None:
+        module_names = set(catalog["modules"]) if catalog and "synced_until" in catalog else set()
+        module_names = (module_names | set(changes.get("changed", []))) - set(changes.get("removed", []))
+        new_catalog["synced_until"] = changes["timestamp"]
+        for module_name in [*changes.get("changed", []), *changes.get("removed", [])]:
+            details.pop(module_name, None)
+        for module_name, module_info in (changes.get("details") or {}).items():
+            if isinstance(module_info, dict):
+                details[module_name] = _parse_details(module_info)
+    else:
+        url = f"{registry}/get_modules"
+        module_names = set(get_registry_client().get_json(url))
+        new_catalog["list_validator"] = _list_validator(url)
+        if not catalog or not new_catalog["list_validator"] or catalog.get("list_validator") != new_catalog["list_validator"]:
+            details = {} # any module may have changed, their details are requested again (at once) when needed
+    new_catalog["modules"] = sorted(module_names)
+    new_catalog["details"] = {module_name: details[module_name] for module_name in new_catalog["modules"] if module_name in details}
+    try:
+        write_catalog(registry, new_catalog)
+    except OSError as e:
+        print_in_yellow(f"Warning: Could not store the module catalog: {e}")
+    return new_catalog
+
+def fetch_details(catalog: dict) -> bool:
+    '''
+    Fetches the description and keywords of the modules of the catalog whose details are not known yet, and stores the catalog.
+    They are all fetched with one request to /get_modules/details, or with one request per module from registries without that endpoint.
+    Modules whose details cannot be fetched are left without them.
+
+    Args:
+        catalog (dict): The catalog, updated in place
+
+    Returns:
+        bool: True if the details of all the modules are known
+
+    Raises:
+        None
+    '''
+    missing = [module_name for module_name in catalog["modules"] if module_name not in catalog["details"]]
+    if not missing:
+        return True
+
+    registry = catalog["registry"]
+    client = get_registry_client()
+    try:
+        all_details = client.get_json(f"{registry}/get_modules/details")
+    except urllib.error.HTTPError as e:
+        if e.code not in UNSUPPORTED_ENDPOINT_STATUSES:
+            return False
+        all_details = None
+    except (urllib.error.URLError, json.JSONDecodeError, OSError):
+        return False
+
+    if isinstance(all_details, dict):
+        for module_name in missing:
+            if isinstance(all_details.get(module_name), dict):
+                catalog["details"][module_name] = _parse_details(all_details[module_name])
+    else:
+        urls = [f"{registry}/get_versions/{urllib.parse.quote(module_name)}" for module_name in missing]
+        for module_name, module_info in zip(missing, client.get_json_many(urls)):
+            if isinstance(module_info, dict):
+                catalog["details"][module_name] = _parse_details(module_info)
+
+    try:
+        write_catalog(registry, catalog)
+    except OSError as e:
+        print_in_yellow(f"Warning: Could not store the module catalog: {e}")
+    return len(catalog["details"]) == len(catalog["modules"])
+
+def _catalog_ttl() -> float:
+    try:
+        return float(CATALOG_TTL)
+    except ValueError:
+        print_in_yellow(f"Warning: Invalid CUL_CATALOG_TTL '{CATALOG_TTL}', refreshing the module catalog.")
+        return 0
+
+def get_catalog(registry: str = BASE_URL, refresh: bool = False, details: bool = False) -> dict:
+    '''
+    Returns the catalog of the specified registry, refreshing it if it is missing, older than CATALOG_TTL seconds, or `refresh` is True.
+    If the registry cannot be reached, the catalog already stored is returned, however old it is.
+
+    Args:
+        registry (str): The registry URL. Defaults to BASE_URL.
+        refresh (bool): If True, refreshes the catalog whatever its age
+        details (bool): If True, also fetches the description and keywords of the modules whose details are not known yet, see fetch_details()
+
+    Returns:
+        dict: The catalog, see read_catalog()
+
+    Raises:
+        HTTPError: If the registry returns an unsuccessful status code and no catalog is stored
+        URLError: If the registry cannot be reached and no catalog is stored
+        JSONDecodeError: If the JSON decoding fails and no catalog is stored
+    '''
+    registry = registry or BASE_URL
+    catalog = read_catalog(registry)
+    if catalog is None or refresh or time.time() - catalog.get("fetched_at", 0) >= _catalog_ttl():
+        try:
+            catalog = fetch_catalog(registry, catalog, probe_delta_sync=refresh)
+        except (urllib.error.URLError, json.JSONDecodeError, OSError) as e:
+            if catalog is None:
+                raise
+            age_hours = (time.time() - catalog.get("fetched_at", 0)) / 3600
+            reason = getattr(e, "reason", e)
+            print_in_yellow(f"Warning: Could not refresh the module catalog ({reason}), using the one from {age_hours:.1f} hour(s) ago.")
+
+    catalog.setdefault("details", {})
+    if details:
+        fetch_details(catalog)
+    return catalog
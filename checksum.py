@@ -1,57 +1,240 @@
 import hashlib
+import mmap
 import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from common_variables import DEFAULT_JOBS, CHECKSUM_ALGORITHM
 
-def generate_module_checksum(folder_path: str) -> str:
+EXTRACT_CHUNK_SIZE = 1024 * 1024 # Size of the chunks written while extracting module archives
+CHECKSUM_JOBS = min(DEFAULT_JOBS, os.cpu_count() or 1) # Number of threads reading files ahead while a module checksum is generated, reading ahead needs a spare core
+MANIFEST_FILENAME = ".cul_manifest.json" # Per-file manifest written by cul into module folders (see manifest.py), not part of the module checksum
+CHECKSUM_BATCH_SIZE = 64 # Files read by a thread at a time, so the small headers do not each pay for a task
+CHECKSUM_MMAP_THRESHOLD = 1024 * 1024 # Files from this size on are memory-mapped instead of read into memory
+CHECKSUM_ALGORITHMS = ("sha256", "sha512", "blake2b", "blake2s") # blake2b and sha512 are usually faster than sha256 on 64-bit CPUs without SHA extensions
+DEFAULT_CHECKSUM_ALGORITHM = "sha256" # Checksums without an "algorithm:" prefix, as written by older releases, use this algorithm
+
+def parse_checksum(checksum: str) -> tuple[str, str]:
     '''
-    Generates a SHA-256 checksum for all files in the specified folder and its subfolders.
-    The checksum is generated based on the relative paths and contents of the files, excluding any file named "checksum.txt".
+    Splits a checksum into its algorithm and hex digest. Checksums are written as "algorithm:hex", except SHA-256 checksums which are written
+    as bare hex digests, as they always were.
 
     Args:
-        folder_path (str): The path to the folder for which the checksum is to be generated.
+        checksum (str): The checksum, e.g., "blake2b:9f86d0..." or "9f86d0..."
 
     Returns:
-        str: The SHA-256 checksum of the folder.
+        tuple: The algorithm and the hex digest
 
     Raises:
         None
     '''
-    sha256_hash = hashlib.sha256()
-    file_count = 0
+    algorithm, separator, digest = checksum.strip().partition(":")
+    if not separator:
+        return DEFAULT_CHECKSUM_ALGORITHM, algorithm.lower()
+    return algorithm.lower(), digest.lower()
 
-    for root, dirs, files in sorted(os.walk(folder_path)):
-        dirs.sort()
-        files.sort()
+def format_checksum(algorithm: str, digest: str) -> str:
+    '''
+    Formats a hex digest as a checksum, see parse_checksum().
 
-        for filename in files:
-            file_path = os.path.join(root, filename)
+    Args:
+        algorithm (str): The algorithm of the digest
+        digest (str): The hex digest
+
+    Returns:
+        str: The checksum
+
+    Raises:
+        None
+    '''
+    return digest if algorithm == DEFAULT_CHECKSUM_ALGORITHM else f"{algorithm}:{digest}"
+
+def checksums_match(checksum: str, other_checksum: str) -> bool:
+    '''
+    Compares two checksums, whether or not they spell out the default algorithm.
+
+    Args:
+        checksum (str): The first checksum
+        other_checksum (str): The second checksum
 
-            if filename == "checksum.txt":
+    Returns:
+        bool: True if both checksums use the same algorithm and have the same digest
+
+    Raises:
+        None
+    '''
+    return parse_checksum(checksum) == parse_checksum(other_checksum)
+
+def new_hash(algorithm: str = DEFAULT_CHECKSUM_ALGORITHM):
+    '''
+    Creates a hash object of one of the supported checksum algorithms.
+
+    Args:
+        algorithm (str): The algorithm, one of CHECKSUM_ALGORITHMS
+
+    Returns:
+        The hashlib hash object
+
+    Raises:
+        ValueError: If the algorithm is not supported
+    '''
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise ValueError(f"Unsupported checksum algorithm '{algorithm}', expected one of: {', '.join(CHECKSUM_ALGORITHMS)}")
+    return hashlib.new(algorithm)
+
+def _list_module_files(folder_path: str) -> list[tuple[str, str]]:
+    # generate_module_checksum() hashes the files folder by folder in sorted folder path order, and the files of each folder in sorted name order
+    module_files = []
+    for root, dirs, files in sorted(os.walk(folder_path)):
+        for filename in sorted(files):
+            if filename == "checksum.txt" or (filename == MANIFEST_FILENAME and root == folder_path):
                 continue
+            file_path = os.path.join(root, filename)
+            module_files.append((os.path.relpath(file_path, folder_path), file_path))
+    return module_files
 
-            relative_path = os.path.relpath(file_path, folder_path)
-            # print(f"Hashing file: {relative_path}")
-            sha256_hash.update(relative_path.encode())
+def _read_file(file_path: str):
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < CHECKSUM_MMAP_THRESHOLD:
+            return f.read()
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mapped, "madvise"):
+            mapped.madvise(mmap.MADV_WILLNEED) # starts reading the file in the background, while the previous files are hashed
+        return mapped
 
-            try:
-                with open(file_path, "rb") as f:
-                    while chunk := f.read(8192):
-                        sha256_hash.update(chunk)
-                file_count += 1
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
+def _read_batch(file_paths: list[str]) -> list:
+    contents = []
+    for file_path in file_paths:
+        try:
+            contents.append(_read_file(file_path))
+        except Exception as e:
+            contents.append(e)
+    return contents
+
+def generate_module_checksum(folder_path: str, jobs: int = CHECKSUM_JOBS, algorithm: str = DEFAULT_CHECKSUM_ALGORITHM) -> str:
+    '''
+    Generates a checksum for all files in the specified folder and its subfolders.
+    The checksum is generated based on the relative paths and contents of the files, excluding any file named "checksum.txt" and the manifest written by cul.
+    Files are read whole (or memory-mapped if large) instead of in small chunks, and with several jobs they are read ahead in batches
+    by a pool of threads while the previous ones are hashed, so the reads overlap with the hashing.
+    The result is the same as hashing the files one after the other.
+
+    Args:
+        folder_path (str): The path to the folder for which the checksum is to be generated.
+        jobs (int): The number of threads reading files ahead, 1 reads them in the calling thread. Defaults to CHECKSUM_JOBS.
+        algorithm (str): The hash algorithm, one of CHECKSUM_ALGORITHMS. Defaults to SHA-256.
+
+    Returns:
+        str: The checksum of the folder, see format_checksum().
+
+    Raises:
+        ValueError: If the algorithm is not supported
+    '''
+    module_hash = new_hash(algorithm)
+    file_count = 0
+    module_files = _list_module_files(folder_path)
+    batches = [module_files[index:index + CHECKSUM_BATCH_SIZE] for index in range(0, len(module_files), CHECKSUM_BATCH_SIZE)]
+
+    def hash_batch(batch: list[tuple[str, str]], contents: list):
+        nonlocal file_count
+        for (relative_path, file_path), file_contents in zip(batch, contents):
+            module_hash.update(relative_path.encode())
+            if isinstance(file_contents, Exception):
+                print(f"Error reading {file_path}: {file_contents}")
+                continue
+            module_hash.update(file_contents)
+            if isinstance(file_contents, mmap.mmap):
+                file_contents.close()
+            file_count += 1
+
+    if jobs <= 1 or len(batches) <= 1:
+        for batch in batches:
+            hash_batch(batch, _read_batch([file_path for _, file_path in batch]))
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = deque()
+            next_batch = 0
+            while pending or next_batch < len(batches):
+                # at most 2 batches per thread are read ahead, large files are only mapped
+                while next_batch < len(batches) and len(pending) < 2 * jobs:
+                    batch = batches[next_batch]
+                    pending.append((batch, executor.submit(_read_batch, [file_path for _, file_path in batch])))
+                    next_batch += 1
+                batch, contents = pending.popleft()
+                hash_batch(batch, contents.result())
 
     if file_count == 0:
         print("No files found to hash.")
 
-    return sha256_hash.hexdigest()
+    return format_checksum(algorithm, module_hash.hexdigest())
     # return "abcd1234"  # Placeholder for the checksum
 
-def store_checksum(folder_path: str) -> None:
+def extract_zip_with_checksum(zip_ref: zipfile.ZipFile, target_dir: str, open_file: callable = None, file_hashes: dict = None, algorithm: str = DEFAULT_CHECKSUM_ALGORITHM) -> str:
+    '''
+    Extracts all the files of the archive into the specified folder and computes, while the files are being written,
+    the same checksum generate_module_checksum() would compute for the extracted folder. This saves re-reading the extracted files to verify them.
+    Files are streamed in chunks, so the memory use does not depend on the size of the archive.
+
+    Args:
+        zip_ref (ZipFile): The archive to extract
+        target_dir (str): The folder to extract the archive into
+        open_file (callable): Opens the destination of a file for writing, given its path (e.g., blob_store.BlobStore.open). Defaults to a plain open().
+        file_hashes (dict): If specified, filled with the SHA-256 digest of every extracted file, keyed by relative path with "/" separators (see manifest.py)
+        algorithm (str): The algorithm of the checksum, one of CHECKSUM_ALGORITHMS. Defaults to SHA-256.
+
+    Returns:
+        str: The checksum of the extracted files, see format_checksum().
+
+    Raises:
+        ValueError: If the archive contains a path pointing outside of the target folder, or the algorithm is not supported
+    '''
+    module_hash = new_hash(algorithm)
+    open_file = open_file or (lambda file_path: open(file_path, "wb"))
+    members = []
+
+    for member in zip_ref.infolist():
+        if member.is_dir():
+            continue
+
+        parts = [part for part in member.filename.replace("\\", "/").split("/") if part not in ("", ".")]
+        if not parts or ".." in parts or os.path.isabs(member.filename) or ":" in parts[0]:
+            raise ValueError(f"Unsafe path in archive: {member.filename}")
+
+        # generate_module_checksum() walks the folders in sorted path order and the files of each folder in sorted name order
+        relative_dir = os.sep.join(parts[:-1])
+        members.append(("" if not relative_dir else os.sep + relative_dir, parts[-1], os.path.join(*parts), member))
+
+    members.sort(key=lambda entry: (entry[0], entry[1]))
+
+    for _, filename, relative_path, member in members:
+        file_path = os.path.join(target_dir, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        hash_file = filename != "checksum.txt" and relative_path != MANIFEST_FILENAME
+        if hash_file:
+            module_hash.update(relative_path.encode())
+        file_hash = hashlib.sha256() if file_hashes is not None else None
+
+        with zip_ref.open(member) as source, open_file(file_path) as target:
+            while chunk := source.read(EXTRACT_CHUNK_SIZE):
+                if hash_file:
+                    module_hash.update(chunk)
+                if file_hash is not None:
+                    file_hash.update(chunk)
+                target.write(chunk)
+        if file_hash is not None:
+            file_hashes[relative_path.replace(os.sep, "/")] = file_hash.hexdigest()
+
+    return format_checksum(algorithm, module_hash.hexdigest())
+
+def store_checksum(folder_path: str, algorithm: str = CHECKSUM_ALGORITHM) -> None:
     '''
     Stores the generated checksum in a file named "checksum.txt" in the specified folder.
+    Checksums of algorithms other than SHA-256 are prefixed with the name of the algorithm (e.g., "blake2b:<hex>"), older releases can only verify SHA-256 ones.
 
     Args:
         folder_path (str): The path to the folder where the checksum will be stored.
+        algorithm (str): The hash algorithm, one of CHECKSUM_ALGORITHMS. Defaults to CHECKSUM_ALGORITHM (CUL_CHECKSUM_ALGORITHM environment variable).
 
     Returns:
         None
@@ -64,7 +247,11 @@ def store_checksum(folder_path: str) -> None:
         print(f"Error: The folder {folder_path} does not exist.")
         return
 
-    checksum = generate_module_checksum(folder_path)
+    try:
+        checksum = generate_module_checksum(folder_path, algorithm=algorithm)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
     
     if not checksum:
         print("No checksum generated.")
@@ -76,6 +263,7 @@ def store_checksum(folder_path: str) -> None:
 def verify_checksum(module_path: str) -> bool:
     '''
     Verifies the checksum of the specified module by comparing it with the stored checksum in "checksum.txt".
+    The checksum is generated with the algorithm the stored checksum declares, see parse_checksum().
 
     Args:
         module_path (str): The path to the module folder.
@@ -95,9 +283,14 @@ def verify_checksum(module_path: str) -> bool:
     with open(checksum_file, "r") as f:
         stored_checksum = f.read().strip()
 
-    current_checksum = generate_module_checksum(module_path)
+    algorithm, _ = parse_checksum(stored_checksum)
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        print(f"Unsupported checksum algorithm '{algorithm}' for {module_path}.")
+        return False
+
+    current_checksum = generate_module_checksum(module_path, algorithm=algorithm)
 
-    return stored_checksum == current_checksum
+    return checksums_match(stored_checksum, current_checksum)
 
 if __name__ == "__main__":
     folder_to_hash = "./c_cpp_modules_dld/test_module_4"
@@ -2,6 +2,7 @@
 This file contains the common variables used in the project.
 The purpose of this file is to make it easier to manage the variables that are used in multiple files.
 '''
+import os
 import appdirs
 
 DEFAULT_URL = "https://cul-backend-fastapi-mongodb.onrender.com" # Default URL for the CUL backend, change to your local server address if needed
@@ -22,5 +23,28 @@ except Exception as e:
     print(f"An unexpected error has occurred: {e}")
 
 C_CPP_MODULES_DLD_DIR = "./c_cpp_modules_dld"
+C_CPP_MODULES_STORE_DIR = "./c_cpp_modules_dld/.store" # Holds one copy of every name==version when the flat install layout is used
 CACHE_DIR = appdirs.user_cache_dir("CUL", "CUL_CLI")
-CUL_DIR = ".cul"
\ No newline at end of file
+CACHE_MAX_SIZE = os.environ.get("CUL_CACHE_MAX_SIZE", "10G") # Least recently used module versions are evicted beyond this cache size (e.g., 500M, 10G), 0 disables the limit
+CACHE_MAX_AGE_DAYS = os.environ.get("CUL_CACHE_MAX_AGE_DAYS", "0") # Module versions not used for this many days are evicted, 0 disables the limit
+BLOBS_DIR = os.path.join(CACHE_DIR, ".blobs") # Content-addressed store holding every distinct cached file once
+CACHE_LOCKS_DIR = os.path.join(CACHE_DIR, ".locks") # Lock files coordinating the cul processes that share the cache
+DOWNLOADS_DIR = os.path.join(CACHE_DIR, ".downloads") # Module archives are streamed here while they are being downloaded
+METADATA_CACHE_DIR = os.path.join(CACHE_DIR, ".metadata") # Registry metadata responses along with their ETag/Last-Modified, for conditional requests
+CATALOG_DIR = os.path.join(CACHE_DIR, ".catalog") # Local copies of the module lists of the registries, searched instead of the registry
+CATALOG_TTL = os.environ.get("CUL_CATALOG_TTL", "3600") # Seconds after which a search refreshes the catalog of the registry
+COMPILER_CACHE_DIR = os.path.join(CACHE_DIR, ".compiler") # Object files of `cul compile` keyed on the preprocessed source, compiler and flags
+COMPILER_CACHE = os.environ.get("CUL_COMPILER_CACHE", "0") == "1" # Restores unchanged translation units from the compiler cache instead of compiling them
+COMPILER_CACHE_MAX_SIZE = os.environ.get("CUL_COMPILER_CACHE_MAX_SIZE", "5G") # Least recently used object files are evicted beyond this size, 0 disables the limit
+LINK_MODE = os.environ.get("CUL_LINK_MODE", "auto") # How cached files are placed into projects: auto, reflink, hardlink, symlink or copy
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024 # Size of the chunks read from the network while downloading module archives
+DELTA_DOWNLOADS = os.environ.get("CUL_DELTA_DOWNLOADS", "1") == "1" # Fetches new versions as deltas from the older versions in the cache when the registry supports it
+CUL_DIR = ".cul"
+BUILD_DIR = os.path.join(CUL_DIR, "build") # Object files and the build database of `cul compile`
+LOCKFILE_PATH = "cul.lock" # Records the fully resolved dependency graph of the project
+HTTP_TIMEOUT = 60 # Seconds to wait for the registry before giving up on a request
+HTTP_PIPELINING = os.environ.get("CUL_HTTP_PIPELINING", "0") == "1" # Sends batches of metadata requests pipelined on one connection (HTTP/1.1)
+HTTP_STATS = os.environ.get("CUL_HTTP_STATS", "0") == "1" # Prints the registry connection counters when a command finishes
+CHECKSUM_ALGORITHM = os.environ.get("CUL_CHECKSUM_ALGORITHM", "sha256") # Algorithm of the checksums written by checksum.store_checksum(): sha256, sha512, blake2b or blake2s
+DEFAULT_JOBS = 8 # Default number of modules fetched at the same time by `cul install`
+DEFAULT_BUILD_JOBS = os.cpu_count() or 1 # Default number of files compiled at the same time by `cul compile`
\ No newline at end of file
@@ -1,21 +1,24 @@
 import os
-import json
 import re
-import subprocess
+from toolchain import C_SOURCE_EXTS, CXX_SOURCE_EXTS, HEADER_EXTS
 
 '''
 Currently focussing on:
-- header files with .h file extension only.
-- gcc compiler.
-- c files with .c file extension only.
-- Windows OS only.
-- Using MSYS2 shell for compilation. (Highly recommended if you are on Windows)
+- header files with .h and .hpp file extensions (see toolchain.HEADER_EXTS).
+- gcc or clang compilers, or any compiler set with CC/CXX (see toolchain.py).
+- C and C++ source files (see toolchain.C_SOURCE_EXTS and toolchain.CXX_SOURCE_EXTS).
+- The build itself is done by build.py, this file finds the modules included by the source files.
 
 - will expand later once this stabilizes.
 
 currently in development, code will be cleaned soon and will be made more readable and documented.
 '''
 
+VALID_SOURCE_EXTS = C_SOURCE_EXTS + CXX_SOURCE_EXTS
+VALID_HEADER_EXTS = HEADER_EXTS
+PATTERN_COMPILE = re.compile(r'//\s*@cul\.compile')
+PATTERN_MAIN_START = re.compile(r'//\s*@cul\.mainStart')
+
 def parse_include_line(line: str, valid_header_exts: list[str]) -> tuple[str, str]:
     start = line.find('"')
     end = line.rfind('"')
@@ -45,98 +48,69 @@ def parse_include_line(line: str, valid_header_exts: list[str]) -> tuple[str, st
 
     return module_name, include_path
 
-def compile(file_path: str):
+def resolve_module_dirs(modules: dict[str, str]) -> dict[str, str]:
+    '''
+    Resolves the directories of the included modules and adds the modules they depend on, so that their libraries are linked as well.
+    Works with both install layouts: nested dependencies and links into c_cpp_modules_dld/.store are resolved to their real location,
+    so every module version is only passed to the compiler once.
 
-    if not os.path.exists(file_path):
-        print(f"The file {file_path} does not exist.")
-        return
-    
-    valid_file_exts = ['.c'] # will add more later
-    valid_header_exts = ['.h'] # will add more later
-    file_name = os.path.basename(file_path)
-    file_ext = os.path.splitext(file_name)[1]
-
-    pattern_compile = re.compile(r'//\s*@cul\.compile')
-    pattern_main_start = re.compile(r'//\s*@cul\.mainStart')
-
-    if file_ext not in valid_file_exts:
-        print(f"The file must be a C source file with one of the following extensions: {', '.join(valid_file_exts)}")
-        return
-
-    compile_command = f"gcc {file_name} -o {os.path.splitext(file_name)[0]} "
-
-    try:
-        modules = {}
-        with open(file_path, 'r') as file:
-            for line in file:
-        
-                if pattern_main_start.search(line):
-                    # print("Main start found, breaking out of the loop because no imports are allowed after this point.")
-                    break
-                
-                if not pattern_compile.search(line):
-                    continue
-
-                line2 = file.readline().strip()
-                module_name, include_path = parse_include_line(line2, valid_header_exts)
-
-                modules[module_name] = include_path
-
-        for module, include_path in modules.items():
-            compile_command += f"-I{include_path}/include/ "
-            compile_command += f"-L{include_path}/bin/ "
-            compile_command += f"-l{module} "
-        
-        return compile_command
-    
-    except FileNotFoundError as e:
-        print(f"Error: {e}")
-    except ValueError as e:
-        print(f"Error: {e}")
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-
-def compile_files():
-    try:
-        with open("module_info.json", "r") as f:
-            data = json.load(f)
-            files = data.get("files", [])
-    except FileNotFoundError:
-        print("module_info.json file not found.")
-        return
-    except json.JSONDecodeError:
-        print("Error decoding JSON from module_info.json.")
-        return
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        return
-
-    if not files:
-        print("No files to compile.")
-        return
-    
-    for file in files:
-        command = f"C:\\msys64\\msys2_shell.cmd -defterm -no-start -mingw64 -here -c \"{compile("example.c")}\""
+    Args:
+        modules (dict): Module name -> module directory, as found in the include lines
+
+    Returns:
+        dict: Module name -> module directory (relative to the current directory), including the transitive dependencies
 
-        result = subprocess.run(command, check=True, capture_output=True, text=True, cwd=os.getcwd())
+    Raises:
+        None
+    '''
+    resolved = {}
+    pending = list(modules.items())
 
-        if result.returncode != 0 or result.stderr:
-            print(f"Error compiling {file}: {result.stderr}")
+    while pending:
+        module_name, module_dir = pending.pop(0)
+        if module_name in resolved:
             continue
 
-        if result.stdout:
-            print(result.stdout)
+        if os.path.isdir(module_dir):
+            module_dir = os.path.relpath(os.path.realpath(module_dir)).replace(os.sep, '/')
+        resolved[module_name] = module_dir
+
+        nested_dep_dir = os.path.join(module_dir, "c_cpp_modules_dld")
+        if os.path.isdir(nested_dep_dir):
+            for dep_name in sorted(os.listdir(nested_dep_dir)):
+                pending.append((dep_name, os.path.join(nested_dep_dir, dep_name)))
+
+    return resolved
+
+def find_included_modules(file_path: str, valid_header_exts: list[str] = VALID_HEADER_EXTS) -> dict[str, str]:
+    '''
+    Finds the modules included by a source file, from the include lines following the `// @cul.compile` comments before `// @cul.mainStart`.
+
+    Args:
+        file_path (str): The source file
+        valid_header_exts (list): The accepted header file extensions
+
+    Returns:
+        dict: Module name -> module directory, as found in the include lines
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If an include line following a `// @cul.compile` comment is invalid
+    '''
+    modules = {}
+    with open(file_path, 'r') as file:
+        for line in file:
+
+            if PATTERN_MAIN_START.search(line):
+                # no imports are allowed after this point
+                break
 
-        print(f"Compiled {file} successfully.")        
+            if not PATTERN_COMPILE.search(line):
+                continue
 
-        
-if __name__ == '__main__':
-    # print(compile("C:/work_of_atri/test/example.c")) 
-    # compile_files() 
-    command = f"C:\\msys64\\msys2_shell.cmd -defterm -no-start -mingw64 -here -c \"{compile("example.c")}\""
-    print(command)
-    result = subprocess.run(command, check=True, capture_output=True, text=True, cwd=os.getcwd())
+            line2 = file.readline().strip()
+            module_name, include_path = parse_include_line(line2, valid_header_exts)
 
-    print(result.stdout)
-    print(result.stderr)         
+            modules[module_name] = include_path
 
+    return modules
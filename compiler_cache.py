@@ -0,0 +1,238 @@
+'''
+This file contains the compiler cache of `cul compile` (opt-in, CUL_COMPILER_CACHE=1 or `cul compile --cache`), kept in the .compiler folder
+of the cache directory and shared by all the projects and checkouts of the machine, like ccache.
+The object file of a translation unit is stored under a key made of the identity of the compiler (its path, size and modification time),
+the compile flags and the hash of the preprocessed source, so a translation unit compiled before with the same compiler, flags, source
+and headers is restored from the cache instead of being compiled, whatever project or branch it was compiled in.
+Every entry holds the object file, the depfile and the output of the compiler, replayed on a hit. The least recently used entries
+are removed once the cache grows beyond COMPILER_CACHE_MAX_SIZE, and the hits and misses are counted in stats.json.
+'''
+import os
+import json
+import shutil
+import hashlib
+import subprocess
+from colorful_outputs import print_in_red
+from common_variables import COMPILER_CACHE_DIR, COMPILER_CACHE_MAX_SIZE
+from file_lock import FileLock
+from helper_functions import parse_size
+from cache_and_install import format_size
+
+COMPILER_CACHE_VERSION = 1
+STATS_PATH = os.path.join(COMPILER_CACHE_DIR, "stats.json")
+LOCK_PATH = os.path.join(COMPILER_CACHE_DIR, ".lock")
+ENTRY_EXTENSIONS = (".json", ".o", ".d")
+
+# The identities of the compilers used by this process, computed once per compiler
+_compiler_identities = {}
+
+def _compiler_identity(compiler: str) -> str:
+    if compiler not in _compiler_identities:
+        path = os.path.realpath(compiler)
+        stat = os.stat(path)
+        _compiler_identities[compiler] = f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}"
+    return _compiler_identities[compiler]
+
+def preprocess_command(command: list[str]) -> list[str]:
+    '''
+    Turns the command compiling a translation unit into the command preprocessing it to stdout.
+
+    Args:
+        command (list): The compile command, see build.compile_command()
+
+    Returns:
+        list: The preprocessing command
+
+    Raises:
+        None
+    '''
+    argv = []
+    skip_value = False
+    for arg in command:
+        if skip_value:
+            skip_value = False
+        elif arg in ("-o", "-MF"):
+            skip_value = True
+        elif arg == "-c":
+            argv.append("-E")
+        elif arg != "-MMD":
+            argv.append(arg)
+    return argv
+
+def cache_key(command: list[str]) -> str:
+    '''
+    Computes the key of a translation unit, preprocessing it with the compiler.
+
+    Args:
+        command (list): The compile command, see build.compile_command()
+
+    Returns:
+        str: The hex key, or None if the unit cannot be preprocessed (it is then compiled, which reports the errors)
+
+    Raises:
+        None
+    '''
+    argv = preprocess_command(command)
+    try:
+        identity = _compiler_identity(argv[0])
+        result = subprocess.run(argv, capture_output=True, cwd=os.getcwd())
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+
+    key = hashlib.sha256()
+    key.update(f"{COMPILER_CACHE_VERSION}\0{identity}\0".encode())
+    key.update(json.dumps(argv[1:]).encode())
+    key.update(b"\0")
+    key.update(result.stdout)
+    return key.hexdigest()
+
+def _entry_path(key: str, extension: str) -> str:
+    return os.path.join(COMPILER_CACHE_DIR, key[:2], f"{key}{extension}")
+
+def _copy_atomically(source: str, target: str):
+    temp_path = f"{target}.{os.getpid()}.tmp"
+    shutil.copyfile(source, temp_path)
+    os.replace(temp_path, target)
+
+def lookup(key: str, object_path: str, depfile_path: str) -> dict:
+    '''
+    Restores the object file and depfile of a translation unit from the cache.
+
+    Args:
+        key (str): The key of the unit, see cache_key()
+        object_path (str): Where to write the object file
+        depfile_path (str): Where to write the depfile
+
+    Returns:
+        dict: {"stdout", "stderr"}, the output of the compiler when the unit was compiled, or None if the unit is not cached
+
+    Raises:
+        None
+    '''
+    try:
+        with open(_entry_path(key, ".json"), "r") as f:
+            entry = json.load(f)
+        _copy_atomically(_entry_path(key, ".o"), object_path)
+        _copy_atomically(_entry_path(key, ".d"), depfile_path)
+        os.utime(_entry_path(key, ".json")) # marks the entry as used, for the eviction
+        return entry
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def store(key: str, object_path: str, depfile_path: str, result: subprocess.CompletedProcess):
+    '''
+    Stores the object file and depfile of a translation unit that was just compiled. The entry is only visible once complete,
+    so concurrent builds never restore a partial entry.
+
+    Args:
+        key (str): The key of the unit, see cache_key()
+        object_path (str): The object file
+        depfile_path (str): The depfile
+        result (CompletedProcess): The finished compiler, whose output is replayed on hits
+
+    Returns:
+        None
+
+    Raises:
+        OSError: If the entry cannot be written
+    '''
+    os.makedirs(os.path.dirname(_entry_path(key, ".json")), exist_ok=True)
+    _copy_atomically(object_path, _entry_path(key, ".o"))
+    _copy_atomically(depfile_path, _entry_path(key, ".d"))
+    temp_path = f"{_entry_path(key, '.json')}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"stdout": result.stdout, "stderr": result.stderr}, f)
+    os.replace(temp_path, _entry_path(key, ".json")) # written last, it commits the entry
+
+def _read_stats() -> dict:
+    try:
+        with open(STATS_PATH, "r") as f:
+            stats = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        stats = {}
+    return {"hits": stats.get("hits", 0), "misses": stats.get("misses", 0)}
+
+def _list_entries() -> list[tuple[float, int, str]]:
+    entries = []
+    for root, dirs, files in os.walk(COMPILER_CACHE_DIR):
+        for filename in files:
+            if not filename.endswith(".json") or root == COMPILER_CACHE_DIR:
+                continue
+            key = filename[:-len(".json")]
+            try:
+                last_used = os.stat(os.path.join(root, filename)).st_mtime
+                size = sum(os.path.getsize(_entry_path(key, extension)) for extension in ENTRY_EXTENSIONS if os.path.exists(_entry_path(key, extension)))
+            except OSError:
+                continue
+            entries.append((last_used, size, key))
+    return entries
+
+def record_build(hits: int, misses: int, max_size: str = COMPILER_CACHE_MAX_SIZE):
+    '''
+    Adds the hits and misses of a build to the statistics of the cache, and removes the least recently used entries
+    if the cache grew beyond its size limit.
+
+    Args:
+        hits (int): The number of units restored from the cache
+        misses (int): The number of units compiled and stored
+        max_size (str): The maximum size of the cache (e.g., "500M", "5G"), "0" disables the limit. Defaults to COMPILER_CACHE_MAX_SIZE (CUL_COMPILER_CACHE_MAX_SIZE).
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the size limit is not in a valid format
+        OSError: If the statistics cannot be written
+    '''
+    size_limit = parse_size(str(max_size))
+    os.makedirs(COMPILER_CACHE_DIR, exist_ok=True)
+    with FileLock(LOCK_PATH):
+        stats = _read_stats()
+        stats["hits"] += hits
+        stats["misses"] += misses
+        temp_path = f"{STATS_PATH}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(stats, f)
+        os.replace(temp_path, STATS_PATH)
+
+        if not misses or size_limit <= 0:
+            return
+        entries = _list_entries()
+        total_size = sum(size for last_used, size, key in entries)
+        for last_used, size, key in sorted(entries):
+            if total_size <= size_limit:
+                break
+            for extension in ENTRY_EXTENSIONS:
+                try:
+                    os.remove(_entry_path(key, extension))
+                except FileNotFoundError:
+                    pass
+            total_size -= size
+
+def show_compiler_cache():
+    '''
+    Shows the statistics of the compiler cache: the number of entries, its size and the hits and misses so far.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    try:
+        entries = _list_entries()
+        stats = _read_stats()
+        lookups = stats["hits"] + stats["misses"]
+        print(f"Compiler cache: {COMPILER_CACHE_DIR}")
+        print(f"  Entries: {len(entries)} ({format_size(sum(size for last_used, size, key in entries))} of {COMPILER_CACHE_MAX_SIZE})")
+        print(f"  Hits:    {stats['hits']}")
+        print(f"  Misses:  {stats['misses']}")
+        if lookups:
+            print(f"  Hit rate: {100 * stats['hits'] / lookups:.1f}%")
+    except Exception as e:
+        print_in_red(f"Error showing the compiler cache: {e}")
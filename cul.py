@@ -1,17 +1,21 @@
 import sys
 from colorful_outputs import print_in_red
-from cache_and_install import show_cache, clear_cache
-from install_module_2 import install
+from cache_and_install import show_cache, clear_cache, gc_cache
+from install_module_2 import install_modules, install_frozen
 from uninstall_module import uninstall
-from update_module import update
+from update_module import update, update_all, outdated
 from freeze_requirements import freeze, list_modules
-from search_module import search_module, fuzzy_search_module
+from search_module import search, fuzzy_search_module
 from init import init
-from helper_functions import handle_req_file_ops
+from verify_module import verify, verify_cache
+from helper_functions import handle_req_file_ops, read_req_file, extract_option
+from common_variables import DEFAULT_JOBS, DEFAULT_BUILD_JOBS, COMPILER_CACHE, CACHE_MAX_SIZE, CACHE_MAX_AGE_DAYS
+from registry_client import report_registry_stats
 from cul_help import help_message
 from change_registry import change_reg
 from file_ops import add_file, remove_file
-from compile import compile_files
+from build import compile_files
+from compiler_cache import show_compiler_cache
 from version_handling import increment_major, increment_minor, increment_patch
 
 def main():
@@ -29,28 +33,48 @@ def main():
                 help_message("install")
                 return
 
-            registry = None
-            module_end = len(sys.argv)
+            try:
+                args, registry = extract_option(sys.argv[2:], '--use-reg')
+            except ValueError:
+                print_in_red("Error: No registry link was provided")
+                help_message("install")
+                return
 
-            if '--use-reg' in sys.argv:
-                reg_index = sys.argv.index('--use-reg')
-                if reg_index + 1 >= len(sys.argv):
-                    print_in_red("Error: No registry link was provided")
+            try:
+                args, jobs = extract_option(args, '--jobs')
+                jobs = int(jobs) if jobs is not None else DEFAULT_JOBS
+                if jobs < 1:
+                    raise ValueError
+            except ValueError:
+                print_in_red("Error: --jobs expects a positive number")
+                help_message("install")
+                return
+
+            flat = '--flat' in args
+            frozen = '--frozen' in args
+            args = [arg for arg in args if arg not in ('--flat', '--frozen')]
+
+            if frozen:
+                if args:
+                    print_in_red("Error: --frozen installs the modules recorded in cul.lock and does not accept module names.")
                     help_message("install")
                     return
-                
-                registry = sys.argv[reg_index + 1]
-                module_end = reg_index
+                install_frozen(registry, jobs, flat)
+                return
 
-            if sys.argv[2] == '-r':
-                if len(sys.argv) < 4:
+            if args and args[0] == '-r':
+                if len(args) < 2:
                     print_in_red("Error: No requirements file specified for installation.")
                     help_message("install")
                     return
-                handle_req_file_ops(sys.argv[3], install, registry)
+                try:
+                    modules = read_req_file(args[1])
+                except FileNotFoundError:
+                    print_in_red(f"Error: {args[1]} not found.")
+                    return
+                install_modules(modules, registry, jobs, flat)
             else:
-                for i in range(2, module_end):
-                    install(sys.argv[i], registry)
+                install_modules(args, registry, jobs, flat)
 
         case 'uninstall':
             if len(sys.argv) < 3:
@@ -73,6 +97,20 @@ def main():
                 help_message("update")
                 return
 
+            if sys.argv[2] == '--all':
+                try:
+                    args, registry = extract_option(sys.argv[3:], '--use-reg')
+                    args, jobs = extract_option(args, '--jobs')
+                    jobs = int(jobs) if jobs is not None else DEFAULT_JOBS
+                    if jobs < 1:
+                        raise ValueError("--jobs expects a positive number")
+                except ValueError as e:
+                    print_in_red(f"Error: {e}")
+                    help_message("update")
+                    return
+                update_all(registry, jobs)
+                return
+
             registry = None
             module_end = len(sys.argv)
 
@@ -96,6 +134,19 @@ def main():
                 for i in range(2, module_end):
                     update(sys.argv[i], registry)
 
+        case 'outdated':
+            try:
+                args, registry = extract_option(sys.argv[2:], '--use-reg')
+                args, jobs = extract_option(args, '--jobs')
+                jobs = int(jobs) if jobs is not None else DEFAULT_JOBS
+                if jobs < 1:
+                    raise ValueError("--jobs expects a positive number")
+            except ValueError as e:
+                print_in_red(f"Error: {e}")
+                help_message("outdated")
+                return
+            outdated(registry, jobs)
+
         case 'help':
             if len(sys.argv) < 3:
                 help_message()
@@ -110,28 +161,28 @@ def main():
             list_modules()
 
         case 'search':
-            if sys.argv[-1] == "--use-reg":
+            try:
+                args, registry = extract_option(sys.argv[2:], '--use-reg')
+            except ValueError:
                 print_in_red("Error: No registry link was provided")
                 help_message("search")
                 return
 
-            registry = ''
-            if sys.argv[-2] == '--use-reg':
-                registry = sys.argv[-1]
-
-            if sys.argv[2] == '--fuzzy':
-                if len(sys.argv) < 4:
-                    print_in_red("Error: No library specified for searching.")
-                    help_message("search")
-                    return
-                fuzzy_search_module(query=sys.argv[3], called_by_user=True, registry=registry)
-                return
-            
-            if len(sys.argv) < 3:
+            fuzzy = '--fuzzy' in args
+            refresh = '--refresh' in args
+            queries = [arg.strip(',') for arg in args if arg not in ('--fuzzy', '--refresh') and arg.strip(',')]
+            if not queries:
                 print_in_red("Error: No library specified for searching.")
                 help_message("search")
                 return
-            search_module(sys.argv[2], registry)
+
+            if fuzzy:
+                for index, query in enumerate(queries):
+                    # the catalog is refreshed at most once, the other queries reuse it
+                    fuzzy_search_module(query=query, called_by_user=True, registry=registry, refresh=refresh and index == 0)
+                return
+            for index, query in enumerate(queries):
+                search(query, registry, refresh=refresh and index == 0)
 
         case 'cache':
             if len(sys.argv) < 3:
@@ -143,10 +194,28 @@ def main():
                     clear_cache()
                 case 'show':
                     show_cache()
+                case 'gc':
+                    try:
+                        args, max_size = extract_option(sys.argv[3:], "--max-size")
+                        args, max_age = extract_option(args, "--max-age")
+                        gc_cache(
+                            max_size if max_size is not None else CACHE_MAX_SIZE,
+                            max_age if max_age is not None else CACHE_MAX_AGE_DAYS,
+                        )
+                    except ValueError as e:
+                        print_in_red(f"Error: {e}")
+                        help_message("cache")
+                case 'verify':
+                    verify_cache()
+                case 'compiler':
+                    show_compiler_cache()
                 case _:
                     print_in_red(f"Unknown cache command: {sys.argv[2]}")
                     help_message("cache")
 
+        case 'verify':
+            verify([module.strip(',') for module in sys.argv[2:] if module.strip(',')])
+
         case 'init':
             init(True if len(sys.argv) > 2 and sys.argv[2] == '-y' else False)
 
@@ -177,7 +246,18 @@ def main():
             remove_file(sys.argv[2], delete_file)
 
         case 'compile':
-            compile_files()
+            try:
+                args, jobs = extract_option(sys.argv[2:], '-j')
+                if jobs is None:
+                    args, jobs = extract_option(args, '--jobs')
+                jobs = int(jobs) if jobs is not None else DEFAULT_BUILD_JOBS
+                if jobs < 1:
+                    raise ValueError
+            except ValueError:
+                print_in_red("Error: -j/--jobs expects a positive number")
+                help_message("compile")
+                return
+            compile_files(jobs, '--keep-going' in args, '--cache' in args or COMPILER_CACHE)
 
         case 'version':
             if len(sys.argv) < 3:
@@ -202,3 +282,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    report_registry_stats()
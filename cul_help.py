@@ -8,6 +8,10 @@ HELP_MESSAGES = {
     install -r requirements.txt                                   - Installs the modules specified in the requirements.txt file.
     install module1, module2, module3 --use-reg "registry_url"    - Installs the specified module from the specified registry.
     install -r requirements.txt --use-reg "registry_url"          - Installs the modules specified in the requirements.txt file from the specified registry.
+    install module1, module2, module3 --jobs N                    - Installs the specified modules, fetching up to N modules at the same time. (Default: 8)
+    install -r requirements.txt --jobs N                          - Installs the modules specified in the requirements.txt file, fetching up to N modules at the same time.
+    install --frozen                                              - Installs exactly the module versions recorded in cul.lock, without asking the registry for any metadata.
+    install module1, module2, module3 --flat                      - Installs the modules using the flat layout, where every module version is stored once in c_cpp_modules_dld/.store and linked where needed.
     """,
 
     "uninstall": """
@@ -22,13 +26,23 @@ HELP_MESSAGES = {
     update module1, module2, module3 ... --use-reg "registry_url"    - Updates multiple modules from the specified registry.
     update -r requirements.txt                                       - Updates the modules specified in the requirements.txt file, will ignore the versions specified in the file.
     update -r requirements.txt --use-reg "registry_url"              - Updates the modules specified in the requirements.txt file from the specified registry.
+    update --all                                                     - Updates all the outdated modules of the project at once, fetching the new versions in parallel.
+    update --all --use-reg "registry_url" --jobs N                   - Updates all the outdated modules from the specified registry, fetching up to N modules at the same time.
+    """,
+
+    "outdated": """
+    outdated                                     - Lists the modules of the project that have newer versions, with their current, latest cached and latest versions.
+    outdated --use-reg "registry_url" --jobs N   - Checks the modules against the specified registry, making up to N requests at the same time.
     """,
 
     "search": """
     search module                                     - Searches for the specified module and displays available versions.
+    search "json parser"                              - Searches the names, keywords and descriptions of the modules and lists the best matches, when no module has the exact name.
     search module --use-reg "registry_url"            - Searches for the specified module from the specified registry and displays available versions.
     search --fuzzy module                             - Searches for the specified module using fuzzy search and displays the modules with similar names.
     search --fuzzy module --use-reg "registry_url"    - Searches for the specified module using fuzzy search from the specified registry and displays the modules with similar names.
+    search --fuzzy module1, module2 ...               - Runs a fuzzy search for each of the specified names.
+    search --fuzzy module --refresh                   - Refreshes the local module catalog from the registry before searching.
     """,
 
     "list": """
@@ -43,7 +57,16 @@ HELP_MESSAGES = {
 
     "cache": """
     cache clear    - Removes the stored cache data for the installed modules.
-    cache show     - Shows the cached modules along with their versions.
+    cache show     - Shows the cached modules along with their versions and sizes.
+    cache gc       - Removes the least recently used module versions until the cache fits into its size and age limits.
+    cache gc --max-size 5G --max-age 30    - Trims the cache to the specified size and removes the versions not used for the specified number of days.
+    cache verify   - Verifies the files of every cached module version against its manifest.
+    cache compiler - Shows the size and the hits and misses of the compiler cache used by `cul compile --cache`.
+    """,
+
+    "verify": """
+    verify                                  - Verifies the files of the installed modules and their dependencies against their manifests, and names the files that were changed, removed or added.
+    verify module1, module2, module3 ...    - Verifies the specified installed modules and their dependencies.
     """,
 
     "init": """
@@ -72,6 +95,12 @@ HELP_MESSAGES = {
 
     "compile": """
     compile - Compiles the files specified in the module_info.json file while automatically detecting the modules to be included based on the `@cul.compile` comments in the files and handles the compiler flags accordingly.
+              Only the files changed since the previous build are compiled again (see .cul/build).
+              C and C++ files are compiled with the compilers set by CC/CXX or "toolchain" in module_info.json, or found on PATH (gcc, clang, cc).
+    compile -j N        - Compiles up to N files at the same time (default: the number of CPUs). `--jobs N` works too.
+    compile --keep-going - Keeps compiling the other files after a file fails to compile, instead of stopping at the first error.
+    compile --cache     - Restores the files compiled before with the same compiler, flags and preprocessed source from the compiler cache
+                          in the cache directory instead of compiling them (CUL_COMPILER_CACHE=1 enables it for every build).
     """,
 
     "version" : """
@@ -0,0 +1,172 @@
+'''
+This file contains the delta downloads between module versions. When the cache holds an older version of a module, the client asks the registry
+for the difference between the two versions instead of the whole archive of the new one:
+
+    GET {registry}/delta/{module}/{from_version}/{to_version}
+
+answers a zip archive holding the files added or changed in the new version, at their paths, along with a .cul_delta.json file:
+{"format_version": 1, "module": ..., "from": ..., "to": ..., "removed": [paths removed in the new version], "archive_checksum": optional,
+the "algorithm:hex" checksum of the full archive of the new version}.
+The full archive of the new version is then rebuilt locally from the cached older version and cached as usual, and it is only kept if it
+matches the checksum.txt of the new version. Registries without the endpoint, or any failure, fall back to downloading the full archive.
+'''
+import os
+import json
+import shutil
+import zipfile
+import tempfile
+import urllib.error
+from cache_and_install import cache_module, remove_version_from_cache, entry_lock
+from checksum import MANIFEST_FILENAME, CHECKSUM_ALGORITHMS, parse_checksum, checksums_match
+from colorful_outputs import print_in_green, print_in_yellow
+from common_variables import CACHE_DIR, DOWNLOADS_DIR, DOWNLOAD_CHUNK_SIZE
+from helper_functions import compare_versions
+from registry_client import get_registry_client
+import cache_index
+
+DELTA_FORMAT_VERSION = 1
+DELTA_METADATA_FILENAME = ".cul_delta.json"
+DELTA_UNSUPPORTED_STATUSES = (400, 404, 405, 501) # Answers of registries without the delta endpoint
+
+# The registries that answered they do not support deltas, not asked again by this process
+_unsupported_registries = set()
+
+def pick_base_version(module_name: str, version: str) -> str:
+    '''
+    Picks the cached version of the module the delta to the specified version is requested from: the newest cached version older than it.
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version to fetch
+
+    Returns:
+        str: The base version, or an empty string if no older version is cached
+
+    Raises:
+        sqlite3.Error: If the cache index cannot be read
+    '''
+    base_version = ''
+    for cached_version in cache_index.get_versions(module_name):
+        try:
+            if compare_versions(cached_version, version) == -1 and (not base_version or compare_versions(cached_version, base_version) == 1):
+                base_version = cached_version
+        except ValueError:
+            continue # not an X.Y.Z version
+    return base_version
+
+def _download(url: str, prefix: str) -> str:
+    os.makedirs(DOWNLOADS_DIR, exist_ok=True)
+    with get_registry_client().request(url) as response:
+        with tempfile.NamedTemporaryFile(dir=DOWNLOADS_DIR, prefix=prefix, suffix=".delta.part", delete=False) as delta_file:
+            while chunk := response.read(DOWNLOAD_CHUNK_SIZE):
+                delta_file.write(chunk)
+            return delta_file.name
+
+def rebuild_archive(delta_ref: zipfile.ZipFile, removed: set[str], base_dir: str, archive_path: str):
+    '''
+    Writes the full archive of a module version from the files of an older version and the delta between them.
+
+    Args:
+        delta_ref (ZipFile): The delta archive
+        removed (set): The paths (with "/" separators) of the files of the older version removed in the new one
+        base_dir (str): The folder of the older version
+        archive_path (str): The path of the archive to write
+
+    Returns:
+        None
+
+    Raises:
+        OSError: If a file cannot be read or written
+    '''
+    delta_members = [member for member in delta_ref.infolist() if not member.is_dir() and member.filename != DELTA_METADATA_FILENAME]
+    replaced = {member.filename.replace("\\", "/") for member in delta_members}
+
+    # the files are only stored, the archive is extracted right away
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as archive:
+        for root, dirs, files in os.walk(base_dir):
+            for filename in files:
+                file_path = os.path.join(root, filename)
+                relative_path = os.path.relpath(file_path, base_dir).replace(os.sep, "/")
+                if relative_path == MANIFEST_FILENAME or relative_path in removed or relative_path in replaced:
+                    continue
+                archive.write(file_path, relative_path)
+
+        for member in delta_members:
+            with delta_ref.open(member) as source, archive.open(member.filename.replace("\\", "/"), "w") as target:
+                shutil.copyfileobj(source, target, DOWNLOAD_CHUNK_SIZE)
+
+def fetch_module_delta(module_name: str, version: str, registry: str) -> bool:
+    '''
+    Fetches a module version as a delta from the newest older version in the cache, rebuilds it and stores it in the cache.
+    The caller must hold the lock of the version, see cache_and_install.entry_lock().
+
+    Args:
+        module_name (str): The name of the module
+        version (str): The version to fetch
+        registry (str): The registry URL
+
+    Returns:
+        bool: True if the version has been rebuilt, verified and cached, False if the full archive must be downloaded instead
+
+    Raises:
+        None
+    '''
+    if registry in _unsupported_registries:
+        return False
+
+    delta_path = archive_path = None
+    try:
+        base_version = pick_base_version(module_name, version)
+        if not base_version:
+            return False
+
+        try:
+            delta_path = _download(f"{registry}/delta/{module_name}/{base_version}/{version}", f"{module_name}-")
+        except urllib.error.HTTPError as e:
+            if e.code in DELTA_UNSUPPORTED_STATUSES:
+                _unsupported_registries.add(registry)
+                return False
+            raise
+        delta_size = os.path.getsize(delta_path)
+
+        with zipfile.ZipFile(delta_path, "r") as delta_ref:
+            metadata = json.loads(delta_ref.read(DELTA_METADATA_FILENAME).decode())
+            if metadata.get("format_version") != DELTA_FORMAT_VERSION or metadata.get("from") != base_version or metadata.get("to") != version:
+                print_in_yellow(f"Warning: The registry sent an unexpected delta for module '{module_name}', downloading the full archive.")
+                return False
+
+            archive_path = f"{delta_path}.zip"
+            with entry_lock(module_name, base_version, shared=True):
+                base_dir = os.path.join(CACHE_DIR, module_name, base_version)
+                if cache_index.get_entry(module_name, base_version) is None or not os.path.isdir(base_dir):
+                    return False # evicted meanwhile
+                rebuild_archive(delta_ref, set(metadata.get("removed", [])), base_dir, archive_path)
+
+        with zipfile.ZipFile(archive_path, "r") as zip_ref:
+            if "checksum.txt" not in zip_ref.namelist():
+                print_in_yellow(f"Warning: Module '{module_name}' version '{version}' has no checksum to verify a delta against, downloading the full archive.")
+                return False
+            stored_checksum = zip_ref.read("checksum.txt").decode().strip()
+            checksum_algorithm = parse_checksum(stored_checksum)[0]
+            if checksum_algorithm not in CHECKSUM_ALGORITHMS:
+                return False
+            module_checksum = cache_module(zip_ref, module_name, version, metadata.get("archive_checksum", ""), registry, checksum_algorithm)
+
+        if not module_checksum or not checksums_match(stored_checksum, module_checksum):
+            if module_checksum:
+                print_in_yellow(f"Warning: Module '{module_name}' version '{version}' rebuilt from a delta does not match its checksum, downloading the full archive.")
+                remove_version_from_cache(module_name, version)
+            return False
+
+        print_in_green(f"Module '{module_name}' version '{version}' rebuilt from cached version '{base_version}' with a {delta_size / 1024:.1f} KiB delta and saved to the cache.")
+        return True
+    except (urllib.error.URLError, zipfile.BadZipFile, KeyError, json.JSONDecodeError, OSError, ValueError) as e:
+        print_in_yellow(f"Warning: Unable to fetch a delta for module '{module_name}' ({getattr(e, 'reason', e)}), downloading the full archive.")
+        return False
+    except Exception as e:
+        print_in_yellow(f"Warning: Unable to fetch a delta for module '{module_name}' ({e}), downloading the full archive.")
+        return False
+    finally:
+        for path in (delta_path, archive_path):
+            if path and os.path.exists(path):
+                os.remove(path)
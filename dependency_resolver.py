@@ -0,0 +1,258 @@
+'''
+This file contains the dependency resolver used by `cul install`.
+The resolver builds the whole dependency graph before anything is downloaded, using the module_info.json files of the cached
+module versions and the `requires` metadata returned by the registry's /get_versions endpoint.
+It picks exactly one version per module, reports conflicting version requirements and dependency cycles,
+and returns the graph so that every module can be downloaded only once.
+'''
+import urllib.error
+from cache_and_install import get_cached_versions, get_cached_module_info
+from colorful_outputs import print_in_red
+from common_variables import BASE_URL, DEFAULT_JOBS
+from helper_functions import parse_module
+from registry_client import get_registry_client
+
+MAX_RESOLUTION_ROUNDS = 10 # Upper bound on the re-resolution rounds caused by version pins discovered deeper in the graph
+
+class ResolutionError(Exception):
+    '''
+    Raised when the requirements cannot be resolved to exactly one version per module.
+    '''
+
+def versions_from_response(module_name: str, response) -> dict:
+    '''
+    Extracts the versions of a module from a /get_versions response, reporting the errors other than "not found".
+
+    Args:
+        module_name (str): The name of the module
+        response: The decoded JSON response, or the exception raised while requesting it
+
+    Returns:
+        dict: The "all_versions" object returned by the registry, or None if the module is not available
+
+    Raises:
+        None
+    '''
+    if isinstance(response, urllib.error.HTTPError):
+        if response.code != 404:
+            print_in_red(f"HTTP Error {response.code} while fetching the versions of module '{module_name}': {response.reason}")
+        return None
+    if isinstance(response, urllib.error.URLError):
+        print_in_red(f"URL Error while fetching the versions of module '{module_name}': {response.reason}")
+        return None
+    if isinstance(response, Exception):
+        print_in_red(f"Error: Failed to decode the versions of module '{module_name}'. Please check the server response.")
+        return None
+    return response.get("all_versions", {})
+
+class DependencyResolver:
+    '''
+    Resolves a set of requirements into a dependency graph with one version per module.
+
+    Cached module versions are preferred, exactly like the installer does: an unpinned requirement resolves to the latest cached version
+    and the registry is only asked about modules (or pinned versions) that are not cached.
+    Registry lookups are made one graph level at a time, concurrently, and each module is looked up at most once.
+    '''
+    def __init__(self, registry: str = BASE_URL, jobs: int = DEFAULT_JOBS):
+        self.registry = BASE_URL if not registry else registry
+        self.jobs = jobs
+        self.registry_lookups = 0
+        self._registry_versions = {}
+
+    def _needs_registry(self, module_name: str, version: str) -> bool:
+        if module_name in self._registry_versions:
+            return False
+        cached_versions = get_cached_versions(module_name)
+        return version not in cached_versions if version else not cached_versions
+
+    def _prefetch(self, requirements: list[tuple[str, str]]):
+        missing = sorted({module_name for module_name, version in requirements if self._needs_registry(module_name, version)})
+        if not missing:
+            return
+
+        self.registry_lookups += len(missing)
+        responses = get_registry_client().get_json_many([f"{self.registry}/get_versions/{module_name}" for module_name in missing], self.jobs)
+        for module_name, response in zip(missing, responses):
+            self._registry_versions[module_name] = versions_from_response(module_name, response)
+
+    def _lookup(self, module_name: str, version: str) -> tuple[str, list[str], str]:
+        cached_versions = get_cached_versions(module_name)
+        if not version and cached_versions:
+            version = cached_versions[-1]
+
+        if version in cached_versions:
+            module_info = get_cached_module_info(module_name, version)
+            if module_info is not None:
+                return version, module_info.get("requires", []), "cache"
+
+        self._prefetch([(module_name, version)])
+        versions = self._registry_versions.get(module_name)
+        if not versions:
+            raise ResolutionError(f"Module '{module_name}' was not found in the cache or on the registry.")
+
+        version = version if version else versions.get("latest", "")
+        available = [entry.get("version") for entry in versions.get("versions", [])]
+        if version not in available:
+            raise ResolutionError(f"Version '{version}' of module '{module_name}' is not available on the registry.")
+
+        return version, versions.get("requires", {}).get(version, []), "registry"
+
+    def _walk(self, roots: list[tuple[str, str]], pins: dict) -> tuple[dict, dict]:
+        modules = {}
+        found_pins = {}
+        frontier = [(module_name, version, "the project") for module_name, version in roots]
+
+        while frontier:
+            for module_name, version, requester in frontier:
+                if not version:
+                    continue
+                if module_name in found_pins and found_pins[module_name][0] != version:
+                    pinned_version, pinned_by = found_pins[module_name]
+                    raise ResolutionError(
+                        f"Conflicting versions for module '{module_name}': "
+                        f"'{module_name}=={pinned_version}' is required by {pinned_by} and '{module_name}=={version}' is required by {requester}."
+                    )
+                found_pins.setdefault(module_name, (version, requester))
+
+            pending = []
+            for module_name, _, _ in frontier:
+                if module_name not in modules and module_name not in pending:
+                    pending.append(module_name)
+
+            def pinned_version(module_name: str) -> str:
+                if module_name in found_pins:
+                    return found_pins[module_name][0]
+                return pins.get(module_name, "")
+
+            self._prefetch([(module_name, pinned_version(module_name)) for module_name in pending])
+
+            next_frontier = []
+            for module_name in pending:
+                version, requires, source = self._lookup(module_name, pinned_version(module_name))
+                dependencies = [parse_module(requirement) for requirement in requires]
+                modules[module_name] = {
+                    "version": version,
+                    "requires": [dep_name for dep_name, _ in dependencies],
+                    "source": source,
+                }
+                next_frontier += [(dep_name, dep_version, f"{module_name}=={version}") for dep_name, dep_version in dependencies]
+
+            frontier = next_frontier
+
+        return modules, {module_name: version for module_name, (version, _) in found_pins.items()}
+
+    def resolve(self, roots: list[tuple[str, str]]) -> dict:
+        '''
+        Resolves the specified requirements and their transitive dependencies.
+
+        Args:
+            roots (list): The (module name, version) pairs requested by the user. An empty version means the latest version.
+
+        Returns:
+            dict: The resolved graph, with the keys
+                "roots" (the names of the requested modules),
+                "modules" (module name -> {"version", "requires", "source"}) and
+                "order" (the module names ordered so that every module comes after its dependencies)
+
+        Raises:
+            ResolutionError: If a module cannot be found, two different versions of a module are required, or the dependencies form a cycle
+        '''
+        pins = {}
+        for _ in range(MAX_RESOLUTION_ROUNDS):
+            modules, found_pins = self._walk(roots, pins)
+            if found_pins == pins:
+                break
+            pins = found_pins
+        else:
+            raise ResolutionError("Unable to settle on one version per module, the version requirements keep changing.")
+
+        root_names = []
+        for module_name, _ in roots:
+            if module_name not in root_names:
+                root_names.append(module_name)
+
+        return {
+            "roots": root_names,
+            "modules": modules,
+            "order": topological_order(root_names, modules),
+        }
+
+def topological_order(roots: list[str], modules: dict) -> list[str]:
+    '''
+    Orders the modules of a resolved graph so that every module comes after its dependencies.
+
+    Args:
+        roots (list): The names of the modules to start from
+        modules (dict): Module name -> {"requires": [...], ...}
+
+    Returns:
+        list: The module names, dependencies first
+
+    Raises:
+        ResolutionError: If the dependencies form a cycle
+    '''
+    order = []
+    state = {}
+
+    def visit(module_name: str, path: list[str]):
+        if state.get(module_name) == "done":
+            return
+        if state.get(module_name) == "visiting":
+            cycle = path[path.index(module_name):] + [module_name]
+            raise ResolutionError(f"Dependency cycle detected: {' -> '.join(cycle)}")
+
+        state[module_name] = "visiting"
+        for dep_name in modules[module_name]["requires"]:
+            visit(dep_name, path + [module_name])
+        state[module_name] = "done"
+        order.append(module_name)
+
+    for module_name in roots:
+        visit(module_name, [])
+
+    return order
+
+def subgraph(graph: dict, roots: list[str]) -> dict:
+    '''
+    Extracts the part of a resolved graph that is reachable from some of its root modules.
+
+    Args:
+        graph (dict): The resolved graph, see resolve_dependencies()
+        roots (list): The names of the root modules to keep
+
+    Returns:
+        dict: The graph of the specified roots and their transitive dependencies, in the same format
+
+    Raises:
+        None
+    '''
+    reachable = set()
+    pending = list(roots)
+    while pending:
+        module_name = pending.pop()
+        if module_name not in reachable:
+            reachable.add(module_name)
+            pending += graph["modules"][module_name]["requires"]
+
+    return {
+        "roots": [module_name for module_name in graph["roots"] if module_name in roots],
+        "modules": {module_name: node for module_name, node in graph["modules"].items() if module_name in reachable},
+        "order": [module_name for module_name in graph["order"] if module_name in reachable],
+    }
+
+def resolve_dependencies(modules: list[tuple[str, str]], registry: str = BASE_URL, jobs: int = DEFAULT_JOBS) -> dict:
+    '''
+    Resolves the specified requirements into a dependency graph with one version per module.
+
+    Args:
+        modules (list): The (module name, version) pairs to resolve. An empty version means the latest version.
+        registry (str): The registry URL to look up the modules that are not cached. Defaults to BASE_URL.
+        jobs (int): The maximum number of registry lookups made at the same time. Defaults to DEFAULT_JOBS.
+
+    Returns:
+        dict: The resolved graph, see DependencyResolver.resolve()
+
+    Raises:
+        ResolutionError: If the requirements cannot be resolved
+    '''
+    return DependencyResolver(registry, jobs).resolve(modules)
@@ -0,0 +1,114 @@
+'''
+This file contains the inter-process file lock used to coordinate the cul processes sharing the same cache (e.g., parallel CI jobs on one machine).
+Locks are advisory: they only exclude the other holders of a lock on the same file, and are released by the OS if the process dies.
+'''
+import os
+import time
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt # Windows
+
+LOCK_POLL_INTERVAL = 0.1 # Seconds between two attempts to take a lock on platforms without blocking locks
+
+# The locks held by the current thread, so that taking a lock the thread already holds does not deadlock on itself
+_held = threading.local()
+
+class FileLock:
+    '''
+    An exclusive (or shared, where supported) lock on a file, usable as a context manager.
+    Nested acquisitions of the same lock file by the same thread reuse the lock already held.
+    '''
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.shared = shared and fcntl is not None # Windows only supports exclusive locks
+        self._fd = None
+        self._nested = False
+
+    def _try_lock(self) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, blocking: bool = True) -> bool:
+        '''
+        Takes the lock.
+
+        Args:
+            blocking (bool): If True, waits until the lock is available. Otherwise gives up immediately if another process holds it.
+
+        Returns:
+            bool: True if the lock was taken, False if it is held by another process and `blocking` is False
+
+        Raises:
+            OSError: If the lock file cannot be created
+        '''
+        held = getattr(_held, "paths", None)
+        if held is None:
+            held = _held.paths = {}
+        key = os.path.abspath(self.path)
+        if key in held:
+            held[key] += 1
+            self._nested = True
+            return True
+
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        self._fd = os.open(key, os.O_RDWR | os.O_CREAT, 0o666)
+        if fcntl is not None and blocking:
+            fcntl.flock(self._fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        else:
+            while not self._try_lock():
+                if not blocking:
+                    os.close(self._fd)
+                    self._fd = None
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+        held[key] = 1
+        self._nested = False
+        return True
+
+    def release(self):
+        '''
+        Releases the lock.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        Raises:
+            None
+        '''
+        key = os.path.abspath(self.path)
+        held = getattr(_held, "paths", {})
+        if key not in held:
+            return
+        held[key] -= 1
+        if self._nested or held[key] > 0:
+            self._nested = False
+            return
+
+        del held[key]
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
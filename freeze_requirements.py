@@ -33,6 +33,8 @@ def freeze_not_initialized(invoked_by_list_modules: bool = False):
     output = []
     
     for module in os.listdir(C_CPP_MODULES_DLD_DIR):
+        if module.startswith('.'):
+            continue # skips the internal folders such as the flat layout's '.store'
         module_path = os.path.join(C_CPP_MODULES_DLD_DIR, module)
         if not os.path.isdir(module_path):
             output.append(f"{module}==not_a_directory")
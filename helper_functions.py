@@ -4,6 +4,7 @@ The purpose of this file is to make it easier to manage the functions that are u
 These functions are the ones which are tiny and are used in multiple files.
 '''
 from colorful_outputs import print_in_red
+from common_variables import C_CPP_MODULES_STORE_DIR
 import os
 import chardet
 
@@ -22,6 +23,41 @@ def parse_module(module_name_str: str):
     '''
     return module_name_str.split("==") if "==" in module_name_str else [module_name_str, ""]
 
+def is_flat_layout() -> bool:
+    '''
+    Checks if the project uses the flat install layout, where every unique module version is stored once in 'c_cpp_modules_dld/.store'.
+
+    Args:
+        None
+
+    Returns:
+        bool: True if the project uses the flat install layout, False otherwise
+
+    Raises:
+        None
+    '''
+    return os.path.isdir(C_CPP_MODULES_STORE_DIR)
+
+def read_req_file(file_path: str) -> list[str]:
+    '''
+    Reads the requirements file, abstracting the encoding detection, and returns its non-empty lines.
+
+    Args:
+        file_path (str): The path to the requirements file
+
+    Returns:
+        list: The stripped, non-empty lines of the requirements file
+
+    Raises:
+        FileNotFoundError: If the file is not found
+    '''
+    raw_data = None
+    with open(file_path,'rb') as f:
+        raw_data = f.read()
+    result = chardet.detect(raw_data)
+    content = raw_data.decode(result['encoding'])
+    return [line.strip() for line in content.split('\n') if line and not line.isspace()]
+
 def handle_req_file_ops(file_path: str, func: callable, registry: str = None):
     '''
     Handles the operations on the requirements file, and executes the specified function on each line of the file, abstracting the encoding detection and file reading.
@@ -38,27 +74,42 @@ def handle_req_file_ops(file_path: str, func: callable, registry: str = None):
         Exception: If any unexpected error occurs
     '''
     try:
-        raw_data = None
-        with open(file_path,'rb') as f:
-            raw_data = f.read()
-        result = chardet.detect(raw_data)
-        content = raw_data.decode(result['encoding'])
+        lines = read_req_file(file_path)
         if registry and (func.__name__ == 'install' or func.__name__ == 'update'):
-            for line in content.split('\n'):
-                if line.isspace() or line == '':
-                    continue
-                func(line.strip(), registry)
+            for line in lines:
+                func(line, registry)
             return
             
-        for line in content.split('\n'):
-                if line.isspace() or line == '':
-                    continue
-                func(line.strip())
+        for line in lines:
+                func(line)
         
     except FileNotFoundError:
         print_in_red(f"Error: {file_path} not found.")
     except Exception as e:
         print_in_red(f"Error: {e}")
+
+def extract_option(args: list[str], option: str) -> tuple[list[str], str]:
+    '''
+    Removes the specified command line option and its value from the arguments.
+
+    Args:
+        args (list): The command line arguments
+        option (str): The option to extract (e.g., "--use-reg")
+
+    Returns:
+        tuple: The remaining arguments and the value of the option, or None if the option is not present
+
+    Raises:
+        ValueError: If the option is present but no value follows it
+    '''
+    if option not in args:
+        return args, None
+
+    index = args.index(option)
+    if index + 1 >= len(args):
+        raise ValueError(f"No value was provided for '{option}'")
+
+    return args[:index] + args[index + 2:], args[index + 1]
     
 def compare_versions(version1: str, version2: str) -> int:
     '''
@@ -88,4 +139,28 @@ def compare_versions(version1: str, version2: str) -> int:
     elif v1_tuple > v2_tuple:
         return 1
     else:
-        return 0
\ No newline at end of file
+        return 0
+
+def parse_size(size: str) -> int:
+    '''
+    Parses a size such as "1024", "500K", "500M" or "10G" (binary units, an optional "B" or "iB" suffix is accepted).
+
+    Args:
+        size (str): The size to parse
+
+    Returns:
+        int: The size in bytes
+
+    Raises:
+        ValueError: If the size is not in a valid format
+    '''
+    units = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    text = size.strip().upper().removesuffix("IB").removesuffix("B")
+    unit = text[-1] if text and text[-1] in units else ""
+    try:
+        value = float(text[:len(text) - len(unit)])
+    except ValueError:
+        raise ValueError(f"Invalid size '{size}'. Expected a number of bytes optionally followed by K, M, G or T (e.g., 500M).")
+    if value < 0:
+        raise ValueError(f"Invalid size '{size}'. The size cannot be negative.")
+    return int(value * units[unit])
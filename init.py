@@ -99,21 +99,42 @@ def add_requirements(module_name: str, version: str):
     Raises:
         Unexpected error if there is an error adding the requirements.
     '''
+    add_multiple_requirements([(module_name, version)])
+
+def add_multiple_requirements(modules: list[tuple[str, str]]):
+    '''
+    Adds the modules and their versions to the requirements in the module_info.json file, reading and writing the file only once.
+
+    Args:
+        modules (list): The (module name, version) pairs to add.
+    
+    Returns:
+        None, but adds the modules and their versions to the requirements in the module_info.json file.
+    
+    Raises:
+        Unexpected error if there is an error adding the requirements.
+    '''
+    if not modules:
+        return
+
     try:
         with open("module_info.json", "r") as f:
             data = json.load(f)
         
-        currently_installed = data.get("requires", [])
-        # print(currently_installed)
-        for req in currently_installed:
-            if module_name == req.split("==")[0]:
-                data["requires"].remove(req)
-                print(f"Removed the existing version of the module {module_name} v{req.split('==')[1]}")
-
-        data["requires"].append(f"{module_name}=={version}")
+        for module_name, version in modules:
+            currently_installed = data.get("requires", [])
+            # print(currently_installed)
+            for req in list(currently_installed):
+                if module_name == req.split("==")[0]:
+                    data["requires"].remove(req)
+                    print(f"Removed the existing version of the module {module_name} v{req.split('==')[1]}")
+
+            data["requires"].append(f"{module_name}=={version}")
+
         with open("module_info.json", "w") as f:
             json.dump(data, f, indent=4)
-        print(f"Added '{module_name}=={version}' to the requirements.")
+        for module_name, version in modules:
+            print(f"Added '{module_name}=={version}' to the requirements.")
     except FileNotFoundError as e:
         # print_in_yellow("Warning: Project not initialized. Please run 'cul init' to initialize the project.")
         pass
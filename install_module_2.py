@@ -1,21 +1,32 @@
-import os, json, io, zipfile, urllib.request
-from cache_and_install import check_cache_and_install, cache_module
+import os, json, time, uuid, zipfile, hashlib, tempfile, urllib.error
+from blob_store import STALE_TEMP_AGE
+from cache_and_install import check_cache_and_install, cache_module, get_cached_versions, get_cached_archive_info, gc_cache, entry_lock, repair_cached_version, STAGING_PREFIX
 from colorful_outputs import print_in_green, print_in_red, print_in_yellow
-from common_variables import C_CPP_MODULES_DLD_DIR, BASE_URL
-from init import add_requirements
-from helper_functions import parse_module
-from checksum import verify_checksum
-from uninstall_module import uninstall
+from common_variables import C_CPP_MODULES_DLD_DIR, C_CPP_MODULES_STORE_DIR, BASE_URL, DOWNLOADS_DIR, DOWNLOAD_CHUNK_SIZE, DELTA_DOWNLOADS, DEFAULT_JOBS
+from init import add_multiple_requirements
+from helper_functions import parse_module, is_flat_layout
+from uninstall_module import prune_module_store
+from link_ops import link_directory, remove_tree, remove_tree_in_background, swap_into_place, TRASH_PREFIX
+from manifest import verify_manifest
+from parallel_ops import run_in_parallel
+from dependency_resolver import resolve_dependencies, subgraph, ResolutionError
+from lockfile import read_lockfile, update_lockfile, graph_from_lockfile, locked_requirements
+from registry_client import get_registry_client
+from checksum import parse_checksum, checksums_match, CHECKSUM_ALGORITHMS, DEFAULT_CHECKSUM_ALGORITHM
+from delta_download import fetch_module_delta
 
-def fetch_module_from_server(module_name: str, version: str = '', registry: str = BASE_URL, save_dir: str = C_CPP_MODULES_DLD_DIR) -> bool:
+def fetch_module_from_server(module_name: str, version: str = '', registry: str = BASE_URL, expected_checksum: str = '') -> bool:
     '''
-    Fetches the specified module from the server and saves it to the specified directory.
+    Fetches the specified module from the server and stores it in the cache, from where it is installed into the project.
+    The lock of the version is held during the download, so when several cul processes need the same module version at the same time,
+    only the first one downloads it and the others wait and then use it from the cache.
+    If an older version of the module is cached, only the delta between the two versions is downloaded when possible, see delta_download.py.
 
     Args:
         module_name (str): The name of the module to fetch
         version (str): The version of the module to fetch. If empty, fetches the latest version.
         registry (str): The registry URL to fetch the module from. Defaults to BASE_URL.
-        save_dir (str): The directory to save the fetched module to. Defaults to C_CPP_MODULES_DLD_DIR.
+        expected_checksum (str): The checksum the downloaded archive must have (e.g., from cul.lock), in the "algorithm:hex" format. Not checked if empty.
 
     Returns:
         bool: True if the module was fetched successfully, False otherwise.
@@ -27,33 +38,66 @@ def fetch_module_from_server(module_name: str, version: str = '', registry: str
         json.JSONDecodeError: If the JSON decoding fails
         Exception: If any unexpected error occurs during fetching or saving the module
     '''
+    archive_path = None
+    lock = entry_lock(module_name, version) if version else None
+    if lock and not lock.acquire(blocking=False):
+        print(f"Waiting for another cul process fetching module '{module_name}' version '{version}'...")
+        lock.acquire()
     try:
+        cached_checksum = get_cached_archive_info(module_name, version).get("checksum") if version else None
+        if cached_checksum is not None and (not expected_checksum or cached_checksum == expected_checksum):
+            print_in_green(f"Module '{module_name}' version '{version}' has been fetched by another cul process, using the cache.")
+            return True
+
+        # A locked checksum is that of the full archive, which is then downloaded to be checked
+        if version and not expected_checksum and DELTA_DOWNLOADS and fetch_module_delta(module_name, version, registry):
+            return True
+
         url = f"{registry}/files/{module_name}/{version}"
-        save_dir = os.path.join(save_dir, module_name)
         
         print(f"Fetching module '{module_name}' from {url}...")
-        with urllib.request.urlopen(url) as response:
+        os.makedirs(DOWNLOADS_DIR, exist_ok=True)
+        with get_registry_client().request(url) as response:
             if response.status != 200:
                 print_in_red(f"Failed to fetch module '{module_name}'. Server responded with status code {response.status}.")
                 return False
             
-            zip_data = response.read()
-            zip_stream = io.BytesIO(zip_data)
-            with zipfile.ZipFile(zip_stream, 'r') as zip_ref:
-                with zip_ref.open(f"module_info.json") as f:
-                    module_info = json.load(f)
-                    version = module_info.get("version")
-                # print(installed_version)
-                
-                zip_ref.extractall(save_dir)
-                cache_module(zip_ref, module_name, version)
+            # The archive is streamed to a temporary file and hashed on the fly, so the memory use does not depend on its size
+            archive_hash = hashlib.sha256()
+            with tempfile.NamedTemporaryFile(dir=DOWNLOADS_DIR, prefix=f"{module_name}-", suffix=".zip.part", delete=False) as archive_file:
+                archive_path = archive_file.name
+                while chunk := response.read(DOWNLOAD_CHUNK_SIZE):
+                    archive_hash.update(chunk)
+                    archive_file.write(chunk)
+
+        archive_checksum = f"sha256:{archive_hash.hexdigest()}"
+        if expected_checksum and archive_checksum != expected_checksum:
+            print_in_red(f"Error: The archive of module '{module_name}' does not match the locked checksum.\nExpected {expected_checksum}, got {archive_checksum}.")
+            return False
+
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            with zip_ref.open(f"module_info.json") as f:
+                module_info = json.load(f)
+                version = module_info.get("version")
+            # print(installed_version)
+            stored_checksum = zip_ref.read("checksum.txt").decode().strip() if "checksum.txt" in zip_ref.namelist() else ""
+            checksum_algorithm = parse_checksum(stored_checksum)[0] if stored_checksum else DEFAULT_CHECKSUM_ALGORITHM
+            checksum_supported = checksum_algorithm in CHECKSUM_ALGORITHMS
+            if not checksum_supported:
+                print_in_yellow(f"Warning: Module '{module_name}' uses the unsupported checksum algorithm '{checksum_algorithm}', its checksum cannot be verified.")
+                checksum_algorithm = DEFAULT_CHECKSUM_ALGORITHM
+            
+            module_checksum = cache_module(zip_ref, module_name, version, archive_checksum, registry, checksum_algorithm)
+            if not module_checksum:
+                return False
                
-        print_in_green(f"Module '{module_name}' fetched and saved to '{save_dir}'.")
+        print_in_green(f"Module '{module_name}' version '{version}' fetched and saved to the cache.")
         
-        if not verify_checksum(save_dir):
+        if not stored_checksum:
+            print(f"Checksum file not found for module '{module_name}'.")
+        if checksum_supported and not checksums_match(stored_checksum, module_checksum):
             print_in_red(f"Checksum verification failed for module '{module_name}'.\nThe module may be corrupted or tampered.")
             # remove_module_from_cache(module_name, version)
-            # shutil.rmtree(save_dir)
             # return False
             '''
             If code execution reaches in this if block, it means that the checksum verification failed for that module.
@@ -63,8 +107,6 @@ def fetch_module_from_server(module_name: str, version: str = '', registry: str
             As soon as we find a better way to handle this, we will uncomment the above code and remove the module from the cache and uninstall it if checksum verification fails.
             '''
         
-        fetch_dependency(module_name, module_name, save_dir, version)
-        
         return True
     
     except urllib.error.HTTPError as e:
@@ -82,9 +124,14 @@ def fetch_module_from_server(module_name: str, version: str = '', registry: str
     except Exception as e:
         print_in_red(f"An error occurred while fetching module '{module_name}': {e}")
         return False
+    finally:
+        if archive_path and os.path.exists(archive_path):
+            os.remove(archive_path)
+        if lock:
+            lock.release()
 
 
-def fetch_module_from_cache(module_name: str, version: str = '', save_dir: str = C_CPP_MODULES_DLD_DIR) -> bool:
+def fetch_module_from_cache(module_name: str, version: str = '', save_dir: str = C_CPP_MODULES_DLD_DIR, module_dir: str = '') -> bool:
     '''
     Fetches the specified module from the local cache and saves it to the specified directory.
 
@@ -92,6 +139,7 @@ def fetch_module_from_cache(module_name: str, version: str = '', save_dir: str =
         module_name (str): The name of the module to fetch
         version (str): The version of the module to fetch. If empty, fetches the latest version.
         save_dir (str): The directory to save the fetched module to. Defaults to C_CPP_MODULES_DLD_DIR.
+        module_dir (str): The folder to save the module into, instead of the folder named after the module in `save_dir` (e.g., a staging folder)
 
     Returns:
         bool: True if the module was fetched successfully, False otherwise.
@@ -100,12 +148,9 @@ def fetch_module_from_cache(module_name: str, version: str = '', save_dir: str =
         Exception: If any unexpected error occurs during fetching or saving the module
     '''
     try:
-        print(f"Fetching module '{module_name}' from cache...")
-        save_dir = os.path.join(save_dir, module_name)
-        cached_path = check_cache_and_install(module_name, version, save_dir)
-        if cached_path:
-            print_in_green(f"Module '{module_name}' fetched from cache and saved to '{cached_path}'.")
-            fetch_dependency(module_name, module_name, save_dir, version)
+        save_dir = module_dir or os.path.join(save_dir, module_name)
+        cached_version = check_cache_and_install(module_name, version, save_dir)
+        if cached_version:
             return True
         else:
             print_in_red(f"Module '{module_name}' not found in cache.")
@@ -115,36 +160,142 @@ def fetch_module_from_cache(module_name: str, version: str = '', save_dir: str =
         print_in_red(f"An error occurred while fetching module '{module_name}' from cache: {e}")
         return False
     
-def fetch_dependency(module_name: str, parent_module_name: str, save_dir: str, version: str = ''):
+def install_resolved_module(module_name: str, graph: dict, save_dir: str = C_CPP_MODULES_DLD_DIR, module_dir: str = '') -> bool:
     '''
-    Fetches the dependencies of a module after it has been installed.
+    Installs a module of a resolved dependency graph from the cache, along with its dependencies in the nested 'c_cpp_modules_dld' folder of the module.
 
     Args:
-        module_name (str): The name of the module whose dependencies are to be fetched
-        parent_module_name (str): The name of the parent module that requires this dependency
-        save_dir (str): The directory where the module is saved
-        version (str): The version of the module. If empty, fetches the latest version.
+        module_name (str): The name of the module to install
+        graph (dict): The resolved dependency graph, see dependency_resolver.resolve_dependencies()
+        save_dir (str): The directory to install the module into. Defaults to C_CPP_MODULES_DLD_DIR.
+        module_dir (str): The folder to install the module into, instead of the folder named after the module in `save_dir` (e.g., a staging folder)
 
     Returns:
+        bool: True if the module and all its dependencies were installed, False otherwise.
+
+    Raises:
         None
+    '''
+    node = graph["modules"][module_name]
+    module_dir = module_dir or os.path.join(save_dir, module_name)
+    if not fetch_module_from_cache(module_name, node["version"], module_dir=module_dir):
+        return False
+
+    installed = True
+    nested_dep_dir = os.path.join(module_dir, "c_cpp_modules_dld")
+    for dep_name in node["requires"]:
+        if not install_resolved_module(dep_name, graph, nested_dep_dir):
+            print_in_red(f"Failed to install dependency '{dep_name}' required by '{module_name}'.")
+            installed = False
+
+    return installed
+
+
+def replace_installed_module(module_name: str, install_staged: callable) -> bool:
+    '''
+    Installs a module next to its installed version and swaps it into place once complete and verified against its manifest,
+    so the project keeps a working copy of the module throughout, and keeps the previous version if the installation fails.
+    The previous version is removed in the background, see link_ops.swap_into_place().
+
+    Args:
+        module_name (str): The name of the module
+        install_staged (callable): Installs the module into the staging path it is given, returning False on failure
+
+    Returns:
+        bool: True if the new version has been swapped into place, False otherwise
 
     Raises:
         None
     '''
-    with open(os.path.join(save_dir, "module_info.json"), 'r') as f:
-        module_info = json.load(f)
-        dependencies = module_info.get("requires", [])
+    module_dir = os.path.join(C_CPP_MODULES_DLD_DIR, module_name)
+    staging_dir = os.path.join(C_CPP_MODULES_DLD_DIR, f"{STAGING_PREFIX}{module_name}-{uuid.uuid4().hex}")
+    try:
+        os.makedirs(C_CPP_MODULES_DLD_DIR, exist_ok=True)
+        if not install_staged(staging_dir):
+            return False
 
-    for dependency in dependencies:
-        dep_name, dep_ver = parse_module(dependency)
-        nested_dep_dir = os.path.join(save_dir, "c_cpp_modules_dld")
-        
-        if fetch_module_from_cache(dep_name, dep_ver, nested_dep_dir):
-            continue
-        elif fetch_module_from_server(dep_name, dep_ver, save_dir=nested_dep_dir):
-            continue
-        else:
-            print_in_red(f"Failed to fetch dependency '{dep_name}' required by '{parent_module_name}'.")
+        result = verify_manifest(staging_dir, update=False)
+        if result is not None and not result["ok"]:
+            print_in_red(f"Module '{module_name}' did not install correctly, keeping the installed version.")
+            return False
+
+        swap_into_place(staging_dir, module_dir)
+        return True
+    except OSError as e:
+        print_in_red(f"Error installing module '{module_name}': {e}")
+        return False
+    finally:
+        remove_tree(staging_dir)
+
+def remove_interrupted_installs():
+    '''
+    Removes the staging folders and the swapped out versions left in 'c_cpp_modules_dld' by installations that were interrupted, in the background.
+    Staging folders are only removed once older than STALE_TEMP_AGE, as another cul process installing into the project may still be filling them.
+    Swapped out versions are no longer used by anyone and are removed right away.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    if not os.path.isdir(C_CPP_MODULES_DLD_DIR):
+        return
+    for entry in os.listdir(C_CPP_MODULES_DLD_DIR):
+        entry_path = os.path.join(C_CPP_MODULES_DLD_DIR, entry)
+        try:
+            if entry.startswith(STAGING_PREFIX) and time.time() - os.lstat(entry_path).st_mtime <= STALE_TEMP_AGE:
+                continue
+        except OSError:
+            continue # removed meanwhile
+        if entry.startswith((STAGING_PREFIX, TRASH_PREFIX)):
+            remove_tree_in_background(entry_path)
+
+def install_into_store(module_name: str, graph: dict) -> str:
+    '''
+    Installs a module of a resolved dependency graph into 'c_cpp_modules_dld/.store' (the flat install layout), where every module version exists only once.
+    The dependencies of the module are referenced through links in its nested 'c_cpp_modules_dld' folder, so they must already be in the store,
+    otherwise the module is not installed.
+
+    Args:
+        module_name (str): The name of the module to install
+        graph (dict): The resolved dependency graph, see dependency_resolver.resolve_dependencies()
+
+    Returns:
+        str: The path of the module in the store, or an empty string if it could not be installed
+
+    Raises:
+        None
+    '''
+    node = graph["modules"][module_name]
+    store_entry = os.path.join(C_CPP_MODULES_STORE_DIR, f"{module_name}@{node['version']}")
+    if os.path.isdir(store_entry):
+        return store_entry
+
+    dep_entries = {dep_name: os.path.join(C_CPP_MODULES_STORE_DIR, f"{dep_name}@{graph['modules'][dep_name]['version']}") for dep_name in node["requires"]}
+    missing = [dep_name for dep_name, dep_entry in dep_entries.items() if not os.path.isdir(dep_entry)]
+    if missing:
+        print_in_red(f"Cannot add module '{module_name}' to the store, its dependencies {', '.join(missing)} are missing from it.")
+        return ""
+
+    staging_dir = f"{store_entry}.tmp"
+    remove_tree(staging_dir)
+    try:
+        if not check_cache_and_install(module_name, node["version"], staging_dir):
+            return ""
+
+        for dep_name, dep_entry in dep_entries.items():
+            link_directory(dep_entry, os.path.join(staging_dir, "c_cpp_modules_dld", dep_name))
+
+        os.replace(staging_dir, store_entry)
+        return store_entry
+    except OSError as e:
+        print_in_red(f"Error adding module '{module_name}' to the store: {e}")
+        remove_tree(staging_dir)
+        return ""
 
 
 def get_installed_version(module_name: str) -> str:
@@ -168,6 +319,28 @@ def get_installed_version(module_name: str) -> str:
         return ""
 
 
+def confirm_reinstall(module_name: str, installed_version: str) -> bool:
+    '''
+    Asks the user whether an already installed module should be reinstalled.
+
+    Args:
+        module_name (str): The name of the installed module
+        installed_version (str): The installed version of the module
+
+    Returns:
+        bool: True if the user chose to reinstall the module, False otherwise
+
+    Raises:
+        None
+    '''
+    print_in_yellow(f"Module '{module_name}' is already installed with version '{installed_version}'.")
+    print("Would you like to reinstall it? (y/n): ", end="")
+    choice = input().strip().lower()
+    if choice == '':
+        return False
+    return choice[0] == 'y'
+
+
 def install(module: str, registry: str = BASE_URL):
     '''
     Installs the specified module by checking if it's already installed, fetching it from cache or server, and handling dependencies.
@@ -182,26 +355,181 @@ def install(module: str, registry: str = BASE_URL):
     Raises:
         None
     '''
-    module_name, module_version = parse_module(module)
-    installed_version = get_installed_version(module_name)
-    registry = BASE_URL if not registry else registry
+    install_modules([module], registry)
+
+
+def install_graph(graph: dict, registry: str = BASE_URL, jobs: int = DEFAULT_JOBS, flat: bool = False) -> list[str]:
+    '''
+    Installs the root modules of a resolved dependency graph along with their dependencies.
+    Cached modules are verified against their manifests first, and the damaged ones are fetched again.
+    Every module of the graph missing from the cache is fetched exactly once, up to `jobs` modules at the same time, and then the modules are installed from the cache.
+    With the flat install layout, every module version is installed once into 'c_cpp_modules_dld/.store' and linked from the modules that use it.
+    The "checksum" and "registry" of every module in the graph are filled in from the cache.
+    Afterwards the cache is trimmed to its size and age limits, keeping the module versions of the graph.
+
+    Args:
+        graph (dict): The dependency graph, see dependency_resolver.resolve_dependencies()
+        registry (str): The registry URL to fetch the modules from, unless a module specifies its own. Defaults to BASE_URL.
+        jobs (int): The maximum number of modules fetched at the same time. Defaults to DEFAULT_JOBS.
+        flat (bool): If True, switches the project to the flat install layout. Projects already using it keep using it.
+
+    Returns:
+        list: The names of the root modules that were installed
+
+    Raises:
+        None
+    '''
+    for module_name in graph["order"]:
+        node = graph["modules"][module_name]
+        if node["source"] == "cache" and not repair_cached_version(module_name, node["version"]):
+            node["source"] = "registry" # the cached copy was damaged and has been removed
+
+    to_fetch = [module_name for module_name in graph["order"] if graph["modules"][module_name]["source"] == "registry"]
+    fetched = run_in_parallel(
+        lambda module_name: fetch_module_from_server(
+            module_name,
+            graph["modules"][module_name]["version"],
+            graph["modules"][module_name].get("registry") or registry,
+            graph["modules"][module_name].get("checksum", ""),
+        ),
+        to_fetch,
+        jobs,
+    )
+    failed = [module_name for module_name, ok in zip(to_fetch, fetched) if not ok]
+    if failed:
+        print_in_red(f"Failed to fetch {', '.join(failed)}, nothing has been installed.")
+        return []
 
-    if installed_version:
-        print_in_yellow(f"Module '{module_name}' is already installed with version '{installed_version}'.")
-        print("Would you like to reinstall it? (y/n): ", end="")
-        choice = input().strip().lower()
-        if choice == '':
-            return
-        choice = choice[0]
-        if choice == 'y':
-            uninstall(module_name)
+    for module_name, node in graph["modules"].items():
+        archive_info = get_cached_archive_info(module_name, node["version"])
+        node["checksum"] = archive_info.get("checksum") or node.get("checksum", "")
+        node["registry"] = archive_info.get("registry") or node.get("registry") or registry
+
+    flat = flat or is_flat_layout()
+    if flat:
+        os.makedirs(C_CPP_MODULES_STORE_DIR, exist_ok=True)
+        stored = {module_name: install_into_store(module_name, graph) for module_name in graph["order"]}
+
+    remove_interrupted_installs()
+    installed_roots = []
+    for module_name in graph["roots"]:
+        # the installed version of the module stays in place until the new one is complete
+        if flat and stored[module_name]:
+            installed = replace_installed_module(module_name, lambda staging_dir: link_directory(stored[module_name], staging_dir))
         else:
-            return
+            installed = not flat and replace_installed_module(module_name, lambda staging_dir: install_resolved_module(module_name, graph, module_dir=staging_dir))
+
+        if installed:
+            installed_roots.append(module_name)
+        else:
+            print_in_red(f"Failed to install module '{module_name}'.")
+
+    if flat:
+        prune_module_store()
+
+    try:
+        gc_cache(keep={(module_name, node["version"]) for module_name, node in graph["modules"].items()}, verbose=False, sweep=False)
+    except Exception as e:
+        print_in_yellow(f"Warning: Unable to trim the cache: {e}")
+
+    return installed_roots
+
+
+def install_modules(modules: list[str], registry: str = BASE_URL, jobs: int = DEFAULT_JOBS, flat: bool = False, confirm: bool = True):
+    '''
+    Installs the specified modules along with their dependencies.
+    The whole dependency graph is resolved first and then installed, see install_graph().
+    The modules are resolved together with the other modules the project depends on, pinned to their locked versions,
+    so a module whose dependencies conflict with theirs is rejected instead of breaking them.
+    The reinstall confirmations are asked up front, the output of every module is printed in the order the modules were fetched,
+    and the requirements in the module_info.json file and the cul.lock file are updated once after all the modules have been processed.
+
+    Args:
+        modules (list): The modules to install, each optionally with version (e.g., "module_name==1.0.0")
+        registry (str): The registry URL to fetch the modules from. Defaults to BASE_URL.
+        jobs (int): The maximum number of modules fetched at the same time. Defaults to DEFAULT_JOBS.
+        flat (bool): If True, switches the project to the flat install layout. Projects already using it keep using it.
+        confirm (bool): If False, installed modules are replaced without asking (e.g., when updating them). Defaults to True.
+
+    Returns:
+        None
+
+    Raises:
+        ResolutionError: If the dependencies cannot be resolved, the error is printed and nothing is installed
+    '''
+    registry = BASE_URL if not registry else registry
+    to_install = []
+
+    for module in modules:
+        module_name, module_version = parse_module(module)
+        if module_name in [name for name, _ in to_install]:
+            print_in_yellow(f"Module '{module_name}' is specified more than once, ignoring '{module}'.")
+            continue
 
-    
-    if fetch_module_from_cache(module_name, module_version) or fetch_module_from_server(module_name, module_version, registry):
         installed_version = get_installed_version(module_name)
-        add_requirements(module_name, installed_version)
+        if installed_version and confirm and not confirm_reinstall(module_name, installed_version):
+            continue
+
+        to_install.append((module_name, module_version))
+
+    if not to_install:
         return
-        
-    print_in_red(f"Failed to install module '{module_name}'.")
+
+    print("Resolving dependencies...")
+    root_names = [module_name for module_name, _ in to_install]
+    try:
+        graph = resolve_dependencies(to_install + locked_requirements(root_names), registry, jobs)
+    except ResolutionError as e:
+        print_in_red(f"Error: {e}")
+        return
+    graph = subgraph(graph, root_names)
+
+    installed_roots = install_graph(graph, registry, jobs, flat)
+    if not installed_roots:
+        return
+
+    add_multiple_requirements([(module_name, graph["modules"][module_name]["version"]) for module_name in installed_roots])
+    update_lockfile(graph, installed_roots)
+
+
+def install_frozen(registry: str = BASE_URL, jobs: int = DEFAULT_JOBS, flat: bool = False):
+    '''
+    Installs exactly the modules recorded in the cul.lock file, without asking the registry for any metadata.
+    Cached module versions whose archive checksum matches the lockfile are installed from the cache, the others are downloaded
+    from the registry recorded in the lockfile and rejected if their archive checksum does not match.
+
+    Args:
+        registry (str): The registry URL to fetch the modules from if the lockfile does not record one. Defaults to BASE_URL.
+        jobs (int): The maximum number of modules fetched at the same time. Defaults to DEFAULT_JOBS.
+        flat (bool): If True, switches the project to the flat install layout. Projects already using it keep using it.
+
+    Returns:
+        None
+
+    Raises:
+        KeyError: If the lockfile is inconsistent, the error is printed and nothing is installed
+        ResolutionError: If the locked dependencies form a cycle, the error is printed and nothing is installed
+    '''
+    registry = BASE_URL if not registry else registry
+    lock_data = read_lockfile()
+    if not lock_data:
+        print_in_red("Error: No valid cul.lock file found. Run 'cul install' without --frozen to create one.")
+        return
+
+    try:
+        graph = graph_from_lockfile(lock_data)
+    except (KeyError, ResolutionError) as e:
+        print_in_red(f"Error: Invalid cul.lock file: {e}")
+        return
+
+    for module_name, node in graph["modules"].items():
+        cached_checksum = get_cached_archive_info(module_name, node["version"]).get("checksum", "")
+        if node["version"] not in get_cached_versions(module_name):
+            continue
+        if node["checksum"] and cached_checksum and cached_checksum != node["checksum"]:
+            print_in_yellow(f"Warning: The cached archive of '{module_name}=={node['version']}' does not match cul.lock, fetching it again.")
+            continue
+        node["source"] = "cache"
+
+    installed_roots = install_graph(graph, registry, jobs, flat)
+    add_multiple_requirements([(module_name, graph["modules"][module_name]["version"]) for module_name in installed_roots])
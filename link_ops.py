@@ -0,0 +1,207 @@
+'''
+This file contains the helpers used to place directory trees into the project without copying them where possible.
+'''
+import os
+import uuid
+import shutil
+import threading
+from colorful_outputs import print_in_yellow
+from common_variables import LINK_MODE
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Not available on Windows, reflinks are then skipped
+
+FICLONE = 0x40049409 # Linux ioctl that makes the destination file share the data blocks of the source file (btrfs, XFS, ...)
+AUTO_LINK_METHODS = ["reflink", "hardlink", "copy"]
+TRASH_PREFIX = ".trash-" # Trees swapped out by swap_into_place(), removed in the background
+
+# The method that last worked for a (source device, destination device) pair, tried first for the next files
+_working_methods = {}
+# The invalid link modes already reported, so the warning is printed once per process
+_reported_modes = set()
+
+def _reflink_file(src_file: str, dst_file: str):
+    if fcntl is None:
+        raise OSError("Reflinks are not supported on this platform")
+    try:
+        with open(src_file, "rb") as src, open(dst_file, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        if os.path.exists(dst_file):
+            os.remove(dst_file)
+        raise
+
+def _symlink_file(src_file: str, dst_file: str):
+    os.symlink(os.path.abspath(src_file), dst_file)
+
+_LINK_FUNCTIONS = {
+    "reflink": _reflink_file,
+    "hardlink": os.link,
+    "symlink": _symlink_file,
+    "copy": shutil.copy2,
+}
+
+def _link_mode(mode: str) -> str:
+    if mode == "auto" or mode in _LINK_FUNCTIONS:
+        return mode
+    if mode not in _reported_modes:
+        _reported_modes.add(mode)
+        print_in_yellow(f"Warning: Invalid CUL_LINK_MODE '{mode}', expected one of: auto, {', '.join(_LINK_FUNCTIONS)}. Using 'auto'.")
+    return "auto"
+
+def materialize_tree(src_dir: str, dst_dir: str, mode: str = LINK_MODE) -> str:
+    '''
+    Places all the files of the source folder (e.g., a cached module version) into the destination folder without copying their contents where possible.
+    In "auto" mode every file is reflinked (copy-on-write clone) where the filesystem supports it, hardlinked otherwise, and copied only as the last resort.
+    Symlinks to the source files are only used when explicitly requested, as they break if the source folder is removed.
+    Files already present in the destination folder are replaced.
+
+    Args:
+        src_dir (str): The folder to materialize
+        dst_dir (str): The folder to place the files into, created if needed
+        mode (str): "auto", "reflink", "hardlink", "symlink" or "copy". An explicit mode falls back to copies if it fails,
+                    an invalid one is reported and replaced with "auto". Defaults to LINK_MODE.
+
+    Returns:
+        str: The method used for most of the files, or "copy" if the folder is empty
+
+    Raises:
+        OSError: If a file cannot be placed at all
+    '''
+    mode = _link_mode(mode)
+    methods = AUTO_LINK_METHODS if mode == "auto" else [mode, "copy"]
+    os.makedirs(dst_dir, exist_ok=True)
+    device_pair = (os.stat(src_dir).st_dev, os.stat(dst_dir).st_dev, mode)
+    used = {}
+
+    for root, dirs, files in os.walk(src_dir):
+        target_root = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+        os.makedirs(target_root, exist_ok=True)
+
+        for filename in files:
+            src_file = os.path.join(root, filename)
+            dst_file = os.path.join(target_root, filename)
+            if os.path.lexists(dst_file):
+                os.remove(dst_file)
+
+            preferred = _working_methods.get(device_pair)
+            for method in ([preferred] if preferred else []) + [m for m in methods if m != preferred]:
+                try:
+                    _LINK_FUNCTIONS[method](src_file, dst_file)
+                except OSError:
+                    if method == "copy":
+                        raise
+                    continue
+                _working_methods[device_pair] = method
+                used[method] = used.get(method, 0) + 1
+                break
+
+    return max(used, key=used.get) if used else "copy"
+
+def link_directory(src_dir: str, dst_dir: str) -> str:
+    '''
+    Makes the specified directory available at the destination path.
+    A relative directory symlink is preferred. If symlinks are not available (e.g., Windows without developer mode),
+    the tree is recreated with hardlinked files, and plain copies are only used as the last resort.
+
+    Args:
+        src_dir (str): The directory to link to
+        dst_dir (str): The path where the directory should be made available, must not exist
+
+    Returns:
+        str: The method used to place the directory, one of "symlink", "hardlink" or "copy"
+
+    Raises:
+        OSError: If the directory cannot be placed at all
+    '''
+    os.makedirs(os.path.dirname(os.path.abspath(dst_dir)), exist_ok=True)
+    target = os.path.relpath(os.path.abspath(src_dir), os.path.dirname(os.path.abspath(dst_dir)))
+
+    try:
+        os.symlink(target, dst_dir, target_is_directory=True)
+        return "symlink"
+    except (OSError, NotImplementedError):
+        pass
+
+    try:
+        shutil.copytree(src_dir, dst_dir, symlinks=True, copy_function=os.link)
+        return "hardlink"
+    except OSError:
+        remove_tree(dst_dir)
+
+    shutil.copytree(src_dir, dst_dir, symlinks=True)
+    return "copy"
+
+def remove_tree(path: str):
+    '''
+    Removes the specified directory tree, or only the link itself if the path is a symlink.
+
+    Args:
+        path (str): The path to remove
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    if os.path.islink(path):
+        os.unlink(path)
+    elif os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def remove_tree_in_background(path: str) -> threading.Thread:
+    '''
+    Removes the specified directory tree in a background thread, so that the caller does not wait for large trees to be deleted.
+    The thread is not a daemon, so the process still finishes removing the tree before it exits.
+
+    Args:
+        path (str): The path to remove
+
+    Returns:
+        threading.Thread: The thread removing the tree
+
+    Raises:
+        None
+    '''
+    thread = threading.Thread(target=remove_tree, args=(path,), name=f"remove {path}")
+    thread.start()
+    return thread
+
+def swap_into_place(src_path: str, dst_path: str):
+    '''
+    Moves a fully prepared directory (or directory link) into place, replacing whatever is at the destination path.
+    The source must be in the same folder as the destination, so that the moves are renames. A link replacing a link is swapped atomically;
+    otherwise the old tree is first renamed aside, which leaves the destination missing only between two renames, and put back if the second rename fails.
+    The old tree is then removed in the background, see remove_tree_in_background().
+
+    Args:
+        src_path (str): The prepared directory or link
+        dst_path (str): The path to place it at
+
+    Returns:
+        None
+
+    Raises:
+        OSError: If the directory cannot be moved into place, in which case the destination is left as it was
+    '''
+    if os.path.islink(src_path) and os.path.islink(dst_path):
+        os.replace(src_path, dst_path)
+        return
+
+    trash_path = None
+    if os.path.lexists(dst_path):
+        trash_path = os.path.join(os.path.dirname(dst_path), f"{TRASH_PREFIX}{os.path.basename(dst_path)}-{uuid.uuid4().hex}")
+        os.replace(dst_path, trash_path)
+    try:
+        os.replace(src_path, dst_path)
+    except OSError:
+        if trash_path:
+            os.replace(trash_path, dst_path)
+        raise
+    if trash_path:
+        remove_tree_in_background(trash_path)
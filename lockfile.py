@@ -0,0 +1,193 @@
+'''
+This file contains the functions used to manage the cul.lock file of a project.
+The lockfile records the fully resolved dependency graph of the project: the version of every module (including the transitive ones),
+the checksum of the archive it was installed from, and the registry it was fetched from.
+`cul install --frozen` installs straight from it, without asking the registry for any metadata.
+'''
+import os
+import json
+from colorful_outputs import print_in_red
+from common_variables import LOCKFILE_PATH
+from dependency_resolver import topological_order
+from helper_functions import parse_module
+
+LOCKFILE_VERSION = 1
+
+def read_lockfile() -> dict:
+    '''
+    Reads the cul.lock file of the project.
+
+    Args:
+        None
+
+    Returns:
+        dict: The contents of the lockfile, or None if the project has no (valid) lockfile
+
+    Raises:
+        JSONDecodeError: If the JSON decoding fails
+    '''
+    try:
+        with open(LOCKFILE_PATH, 'r') as f:
+            lock_data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError:
+        print_in_red(f"Error reading {LOCKFILE_PATH}. It may be corrupted.")
+        return None
+
+    if lock_data.get("lockfile_version") != LOCKFILE_VERSION:
+        print_in_red(f"Error: Unsupported {LOCKFILE_PATH} version '{lock_data.get('lockfile_version')}'.")
+        return None
+    return lock_data
+
+def save_lockfile(roots: list[str], modules: dict):
+    '''
+    Writes the cul.lock file, keeping only the modules reachable from the specified root modules.
+
+    Args:
+        roots (list): The names of the modules installed directly by the user
+        modules (dict): Module name -> {"version", "checksum", "registry", "requires"}
+
+    Returns:
+        None
+
+    Raises:
+        Exception: If any unexpected error occurs while writing the lockfile
+    '''
+    reachable = set()
+    pending = [module_name for module_name in roots if module_name in modules]
+    while pending:
+        module_name = pending.pop()
+        if module_name in reachable:
+            continue
+        reachable.add(module_name)
+        pending += [dep_name for dep_name in modules[module_name]["requires"] if dep_name in modules]
+
+    lock_data = {
+        "lockfile_version": LOCKFILE_VERSION,
+        "roots": sorted(module_name for module_name in roots if module_name in modules),
+        "modules": {
+            module_name: {
+                "version": modules[module_name]["version"],
+                "checksum": modules[module_name].get("checksum", ""),
+                "registry": modules[module_name].get("registry", ""),
+                "requires": sorted(modules[module_name]["requires"]),
+            }
+            for module_name in sorted(reachable)
+        },
+    }
+
+    try:
+        temp_path = f"{LOCKFILE_PATH}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(lock_data, f, indent=4)
+        os.replace(temp_path, LOCKFILE_PATH)
+    except Exception as e:
+        print_in_red(f"Error writing {LOCKFILE_PATH}: {e}")
+
+def update_lockfile(graph: dict, installed_roots: list[str]):
+    '''
+    Merges a freshly resolved and installed dependency graph into the cul.lock file.
+    Modules that are part of the new graph replace their previously locked entries, so the graph must have been resolved together
+    with the other locked roots (see locked_requirements()), otherwise their version requirements could be broken.
+
+    Args:
+        graph (dict): The resolved dependency graph, with the "checksum" and "registry" of every module filled in
+        installed_roots (list): The names of the root modules of the graph that were installed successfully
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    lock_data = read_lockfile() or {"roots": [], "modules": {}}
+    modules = lock_data["modules"]
+    modules.update(graph["modules"])
+
+    roots = list(lock_data["roots"])
+    roots += [module_name for module_name in installed_roots if module_name not in roots]
+    save_lockfile(roots, modules)
+
+def locked_requirements(excluded: list[str]) -> list[tuple[str, str]]:
+    '''
+    Returns the root modules the project already depends on, pinned to their locked versions, so that new modules are resolved together with them.
+    The roots are taken from the cul.lock file, or from the requirements in the module_info.json file if the project has no lockfile.
+
+    Args:
+        excluded (list): The names of the modules being installed or updated, which are left out
+
+    Returns:
+        list: The (module name, version) pairs of the other root modules
+
+    Raises:
+        None
+    '''
+    lock_data = read_lockfile()
+    if lock_data:
+        return [
+            (module_name, lock_data["modules"][module_name]["version"])
+            for module_name in lock_data["roots"]
+            if module_name not in excluded and module_name in lock_data["modules"]
+        ]
+
+    try:
+        with open("module_info.json", "r") as f:
+            requires = json.load(f).get("requires", [])
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+    requirements = []
+    for module_name, version in (parse_module(requirement) for requirement in requires):
+        if module_name not in excluded and module_name not in [name for name, _ in requirements]:
+            requirements.append((module_name, version))
+    return requirements
+
+def remove_from_lockfile(module_name: str):
+    '''
+    Removes a root module from the cul.lock file, along with the dependencies no other locked module needs.
+
+    Args:
+        module_name (str): The name of the module to remove
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    lock_data = read_lockfile()
+    if not lock_data or module_name not in lock_data["roots"]:
+        return
+    save_lockfile([root for root in lock_data["roots"] if root != module_name], lock_data["modules"])
+
+def graph_from_lockfile(lock_data: dict) -> dict:
+    '''
+    Builds a dependency graph, in the format returned by dependency_resolver.resolve_dependencies(), from the contents of a lockfile.
+
+    Args:
+        lock_data (dict): The contents of the lockfile
+
+    Returns:
+        dict: The dependency graph of the locked modules
+
+    Raises:
+        ResolutionError: If the locked dependencies form a cycle
+        KeyError: If the lockfile references a module it does not lock
+    '''
+    modules = {
+        module_name: {
+            "version": entry["version"],
+            "requires": list(entry.get("requires", [])),
+            "checksum": entry.get("checksum", ""),
+            "registry": entry.get("registry", ""),
+            "source": "registry",
+        }
+        for module_name, entry in lock_data["modules"].items()
+    }
+    for module_name, node in modules.items():
+        for dep_name in node["requires"]:
+            if dep_name not in modules:
+                raise KeyError(f"'{dep_name}' required by '{module_name}' is not locked")
+
+    roots = list(lock_data["roots"])
+    return {"roots": roots, "modules": modules, "order": topological_order(roots, modules)}
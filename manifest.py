@@ -0,0 +1,234 @@
+'''
+This file contains the per-file manifest stored in every cached and installed module folder (.cul_manifest.json).
+The manifest lists the hash, size and modification time of every file of the module, along with a root hash of the whole tree.
+Verifying a module whose files were not touched then only takes a stat() per file, and when files do differ only those are hashed again,
+so the output can name exactly the files that changed, went missing or were added.
+'''
+import os
+import json
+import hashlib
+from checksum import MANIFEST_FILENAME, EXTRACT_CHUNK_SIZE
+
+MANIFEST_VERSION = 1
+MANIFEST_ALGORITHM = "sha256"
+NESTED_MODULES_DIR = "c_cpp_modules_dld" # The dependencies installed inside a module are not part of the module itself
+
+def hash_file(file_path: str) -> str:
+    '''
+    Computes the hash of a file as recorded in manifests.
+
+    Args:
+        file_path (str): The path of the file
+
+    Returns:
+        str: The hex digest of the file contents
+
+    Raises:
+        OSError: If the file cannot be read
+    '''
+    sha256_hash = hashlib.new(MANIFEST_ALGORITHM)
+    with open(file_path, "rb") as f:
+        while chunk := f.read(EXTRACT_CHUNK_SIZE):
+            sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+def tree_root(files: dict) -> str:
+    '''
+    Computes the root hash of a module tree from the hashes of its files.
+
+    Args:
+        files (dict): Relative path (with "/" separators) -> {"hash": ..., ...}
+
+    Returns:
+        str: The hex digest over the sorted paths and file hashes
+
+    Raises:
+        None
+    '''
+    root_hash = hashlib.new(MANIFEST_ALGORITHM)
+    for relative_path in sorted(files):
+        root_hash.update(f"{relative_path}\0{files[relative_path]['hash']}\n".encode())
+    return root_hash.hexdigest()
+
+def _list_files(folder_path: str) -> list[str]:
+    relative_paths = []
+    for root, dirs, files in os.walk(folder_path):
+        if root == folder_path and NESTED_MODULES_DIR in dirs:
+            dirs.remove(NESTED_MODULES_DIR)
+        for filename in files:
+            if root == folder_path and filename == MANIFEST_FILENAME:
+                continue
+            relative_paths.append(os.path.relpath(os.path.join(root, filename), folder_path).replace(os.sep, "/"))
+    return relative_paths
+
+def _file_entry(file_path: str, file_hash: str) -> dict:
+    stat = os.stat(file_path)
+    return {"hash": file_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def build_manifest(folder_path: str, file_hashes: dict = None, checksum: str = '') -> dict:
+    '''
+    Builds the manifest of a module folder. The hashes of the files are taken from `file_hashes` when known (e.g., computed while extracting the module),
+    and computed otherwise.
+
+    Args:
+        folder_path (str): The module folder
+        file_hashes (dict): Relative path (with "/" separators) -> hex digest of the files already hashed
+        checksum (str): The checksum of the module (see checksum.generate_module_checksum()), recorded for reference
+
+    Returns:
+        dict: The manifest
+
+    Raises:
+        OSError: If a file cannot be read
+    '''
+    file_hashes = file_hashes or {}
+    files = {}
+    for relative_path in sorted(_list_files(folder_path)):
+        file_path = os.path.join(folder_path, *relative_path.split("/"))
+        files[relative_path] = _file_entry(file_path, file_hashes.get(relative_path) or hash_file(file_path))
+
+    return {
+        "manifest_version": MANIFEST_VERSION,
+        "algorithm": MANIFEST_ALGORITHM,
+        "root": tree_root(files),
+        "checksum": checksum,
+        "files": files,
+    }
+
+def write_manifest(folder_path: str, manifest: dict):
+    '''
+    Writes the manifest into the module folder. The file is replaced rather than modified, as it may be hardlinked to the manifest of the cached version.
+
+    Args:
+        folder_path (str): The module folder
+        manifest (dict): The manifest to write
+
+    Returns:
+        None
+
+    Raises:
+        OSError: If the manifest cannot be written
+    '''
+    manifest_path = os.path.join(folder_path, MANIFEST_FILENAME)
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(temp_path, manifest_path)
+
+def read_manifest(folder_path: str) -> dict:
+    '''
+    Reads the manifest of a module folder.
+
+    Args:
+        folder_path (str): The module folder
+
+    Returns:
+        dict: The manifest, or None if the folder has no valid manifest
+
+    Raises:
+        None
+    '''
+    try:
+        with open(os.path.join(folder_path, MANIFEST_FILENAME), "r") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if manifest.get("manifest_version") != MANIFEST_VERSION or manifest.get("algorithm") != MANIFEST_ALGORITHM:
+        return None
+    if tree_root(manifest.get("files", {})) != manifest.get("root"):
+        return None # edited by hand or truncated
+    return manifest
+
+def refresh_manifest(folder_path: str, manifest: dict):
+    '''
+    Writes the manifest of a folder whose files were just placed from a verified copy (e.g., a cached version materialized into a project),
+    recording the size and modification time of the new files so that they can be verified with stat() calls only.
+
+    Args:
+        folder_path (str): The module folder
+        manifest (dict): The manifest of the verified copy
+
+    Returns:
+        None
+
+    Raises:
+        OSError: If a file is missing or the manifest cannot be written
+    '''
+    files = {
+        relative_path: _file_entry(os.path.join(folder_path, *relative_path.split("/")), entry["hash"])
+        for relative_path, entry in manifest["files"].items()
+    }
+    write_manifest(folder_path, {**manifest, "files": files})
+
+def verify_manifest(folder_path: str, update: bool = True) -> dict:
+    '''
+    Verifies a module folder against its manifest. Files whose size and modification time match the manifest are trusted,
+    the other ones are hashed again.
+
+    Args:
+        folder_path (str): The module folder
+        update (bool): If True, records the new modification time of the files that were hashed again and turned out unchanged,
+                       so the next verification of these files only needs stat() calls again
+
+    Returns:
+        dict: {"ok": bool, "changed": [...], "missing": [...], "added": [...], "rehashed": int}, the lists holding relative paths,
+              or None if the folder has no valid manifest
+
+    Raises:
+        None
+    '''
+    manifest = read_manifest(folder_path)
+    if manifest is None:
+        return None
+
+    result = {"changed": [], "missing": [], "added": [], "rehashed": 0}
+    refreshed = {}
+    for relative_path, entry in manifest["files"].items():
+        file_path = os.path.join(folder_path, *relative_path.split("/"))
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            result["missing"].append(relative_path)
+            continue
+        if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+            continue
+
+        result["rehashed"] += 1
+        try:
+            unchanged = stat.st_size == entry["size"] and hash_file(file_path) == entry["hash"]
+        except OSError:
+            unchanged = False
+        if unchanged:
+            refreshed[relative_path] = {**entry, "mtime_ns": stat.st_mtime_ns}
+        else:
+            result["changed"].append(relative_path)
+
+    result["added"] = sorted(set(_list_files(folder_path)) - set(manifest["files"]))
+    result["ok"] = not (result["changed"] or result["missing"] or result["added"])
+
+    if update and refreshed:
+        try:
+            write_manifest(folder_path, {**manifest, "files": {**manifest["files"], **refreshed}})
+        except OSError:
+            pass # read-only folder, the files are hashed again next time
+    return result
+
+def ensure_manifest(folder_path: str) -> dict:
+    '''
+    Returns the manifest of a module folder, building it from the current files if the folder has none (e.g., cached by an older release).
+
+    Args:
+        folder_path (str): The module folder
+
+    Returns:
+        dict: The manifest
+
+    Raises:
+        OSError: If a file cannot be read or the manifest cannot be written
+    '''
+    manifest = read_manifest(folder_path)
+    if manifest is None:
+        manifest = build_manifest(folder_path)
+        write_manifest(folder_path, manifest)
+    return manifest
@@ -0,0 +1,90 @@
+'''
+This file contains the on-disk cache of the metadata responses of the registries (module lists, versions, ...), stored in the cache directory
+along with their ETag and Last-Modified validators. The registry client sends these validators back (If-None-Match, If-Modified-Since),
+so a registry whose metadata did not change answers 304 Not Modified without a body and the cached response is used instead.
+'''
+import os
+import json
+import time
+import hashlib
+from common_variables import METADATA_CACHE_DIR
+
+def _response_path(url: str) -> str:
+    digest = hashlib.sha256(url.encode()).hexdigest()
+    return os.path.join(METADATA_CACHE_DIR, digest[:2], f"{digest}.json")
+
+def read_cached_response(url: str) -> dict:
+    '''
+    Reads the cached metadata response of the specified URL.
+
+    Args:
+        url (str): The URL of the metadata endpoint
+
+    Returns:
+        dict: {"url", "etag", "last_modified", "fetched_at", "body"}, the body being the decoded JSON response,
+              or None if the response is not cached or has no validator
+
+    Raises:
+        None
+    '''
+    try:
+        with open(_response_path(url), "r") as f:
+            cached = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if cached.get("url") != url or not (cached.get("etag") or cached.get("last_modified")) or "body" not in cached:
+        return None
+    return cached
+
+def store_response(url: str, body, etag: str = None, last_modified: str = None):
+    '''
+    Caches the metadata response of the specified URL, if the registry sent a validator with it. Failures to write are ignored,
+    the response is then simply requested in full next time.
+
+    Args:
+        url (str): The URL of the metadata endpoint
+        body: The decoded JSON response
+        etag (str): The ETag header of the response
+        last_modified (str): The Last-Modified header of the response
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    if not (etag or last_modified):
+        return
+
+    path = _response_path(url)
+    temp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, "w") as f:
+            json.dump({"url": url, "etag": etag, "last_modified": last_modified, "fetched_at": time.time(), "body": body}, f)
+        os.replace(temp_path, path) # concurrent writers of the same URL each replace the file whole
+    except (OSError, TypeError, ValueError):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+def conditional_headers(cached: dict) -> dict:
+    '''
+    Returns the headers making a request conditional on the cached response having changed.
+
+    Args:
+        cached (dict): The cached response, see read_cached_response(), or None
+
+    Returns:
+        dict: The If-None-Match and If-Modified-Since headers, empty if there is no cached response
+
+    Raises:
+        None
+    '''
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
@@ -0,0 +1,89 @@
+'''
+This file contains the helpers used to run independent operations (such as fetching modules) concurrently.
+The output printed by each operation is buffered and replayed in the order the operations were submitted,
+so the console output stays readable and grouped per operation even though the work itself overlaps.
+'''
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class ThreadRoutedStdout:
+    '''
+    A stdout replacement that routes the writes of registered worker threads into per-thread buffers
+    and passes the writes of every other thread straight through to the wrapped stream.
+    '''
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self, buffer: list):
+        self._local.buffer = buffer
+
+    def release(self):
+        self._local.buffer = None
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            return self._stream.write(text)
+        buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self._stream, name)
+
+def run_in_parallel(func: callable, items: list, jobs: int) -> list:
+    '''
+    Runs the specified function on each item using a bounded pool of worker threads.
+    The output printed by each call is buffered and printed in the same order as the items, as soon as the call and all the calls before it have finished.
+
+    Args:
+        func (callable): The function to be executed on each item
+        items (list): The items to execute the function on
+        jobs (int): The maximum number of calls running at the same time
+
+    Returns:
+        list: The return values of the calls, in the same order as the items
+
+    Raises:
+        Exception: Re-raises the first exception raised by any of the calls, after all the output has been printed
+    '''
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    original_stdout = sys.stdout
+    routed_stdout = ThreadRoutedStdout(original_stdout)
+
+    def run_captured(item):
+        buffer = []
+        routed_stdout.capture(buffer)
+        try:
+            return func(item), None, buffer
+        except Exception as e:
+            return None, e, buffer
+        finally:
+            routed_stdout.release()
+
+    results = []
+    first_error = None
+    sys.stdout = routed_stdout
+    try:
+        with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as executor:
+            futures = [executor.submit(run_captured, item) for item in items]
+            for future in futures:
+                result, error, buffer = future.result()
+                original_stdout.write("".join(buffer))
+                original_stdout.flush()
+                if error and not first_error:
+                    first_error = error
+                results.append(result)
+    finally:
+        sys.stdout = original_stdout
+
+    if first_error:
+        raise first_error
+    return results
@@ -0,0 +1,387 @@
+'''
+This file contains the registry client shared by all the commands that talk to a registry.
+The client keeps the connections to every registry host alive and reuses them, so consecutive metadata lookups and archive downloads
+do not pay for a new TCP connection and TLS handshake each time. Metadata lookups can optionally be pipelined (HTTP/1.1), and are made conditional on the responses cached from previous lookups
+(see metadata_cache.py), so unchanged metadata costs a 304 Not Modified without a body.
+Errors are raised as urllib.error.HTTPError and urllib.error.URLError, exactly like urllib.request.urlopen() does.
+'''
+import base64
+import http.client
+import json
+import ssl
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from common_variables import DEFAULT_JOBS, HTTP_TIMEOUT, HTTP_PIPELINING, HTTP_STATS
+from metadata_cache import read_cached_response, store_response, conditional_headers
+
+MAX_IDLE_CONNECTIONS_PER_HOST = 8
+MAX_REDIRECTS = 5
+USER_AGENT = "cul"
+
+class _NonClosingReader:
+    '''
+    Wraps the buffered reader of a pipelined connection so that every response parsed from it can be closed without closing the reader itself.
+    '''
+    def __init__(self, reader):
+        self._reader = reader
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name: str):
+        return getattr(self._reader, name)
+
+class _SharedReaderSocket:
+    '''
+    Hands the same buffered reader to every http.client.HTTPResponse parsed from a pipelined connection,
+    so the bytes read ahead for one response are not lost for the next one.
+    '''
+    def __init__(self, reader):
+        self._reader = reader
+
+    def makefile(self, *args, **kwargs):
+        return _NonClosingReader(self._reader)
+
+class RegistryResponse:
+    '''
+    A response returned by RegistryClient.request(). The connection goes back to the pool once the response is closed,
+    provided that its body has been read completely.
+    '''
+    def __init__(self, client, key: tuple, conn: http.client.HTTPConnection, response: http.client.HTTPResponse, url: str):
+        self._client = client
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def read(self, amt: int = None) -> bytes:
+        return self._response.read(amt)
+
+    def getheaders(self) -> list:
+        return self._response.getheaders()
+
+    def close(self):
+        if self._conn is None:
+            return
+        reusable = self._response.isclosed() and not self._response.will_close
+        self._response.close()
+        self._client._release(self._key, self._conn, reusable)
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class RegistryClient:
+    '''
+    An HTTP client with a keep-alive connection pool per host, used for all the registry traffic.
+    The counters in `stats` record the connections opened and reused, the requests made, the requests sent pipelined
+    and the metadata responses that were not modified since they were cached.
+    '''
+    def __init__(self, timeout: float = HTTP_TIMEOUT, pipelining: bool = HTTP_PIPELINING):
+        self.timeout = timeout
+        self.pipelining = pipelining
+        self.stats = {"connections_opened": 0, "connections_reused": 0, "requests": 0, "pipelined_requests": 0, "not_modified": 0}
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.stats[counter] += amount
+
+    def get_stats(self) -> dict:
+        '''
+        Returns a snapshot of the connection and request counters.
+        '''
+        with self._lock:
+            return dict(self.stats)
+
+    def _route(self, url: str) -> tuple[tuple, str, dict]:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise urllib.error.URLError(f"unknown url type: {url}")
+
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        proxy = urllib.request.getproxies().get(parts.scheme)
+        if proxy and urllib.request.proxy_bypass(parts.hostname):
+            proxy = None
+
+        headers = {}
+        if proxy:
+            proxy_parts = urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+            if proxy_parts.username:
+                credentials = f"{urllib.parse.unquote(proxy_parts.username)}:{urllib.parse.unquote(proxy_parts.password or '')}"
+                headers["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode()
+            proxy = (proxy_parts.hostname, proxy_parts.port or 8080)
+            if parts.scheme == "http":
+                path = url # plain HTTP proxies expect the absolute URL
+
+        return (parts.scheme, parts.hostname, port, proxy), path, headers
+
+    def _new_connection(self, key: tuple, proxy_headers: dict) -> http.client.HTTPConnection:
+        scheme, host, port, proxy = key
+        self._count("connections_opened")
+
+        if not proxy:
+            if scheme == "https":
+                return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self._ssl_context)
+            return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+        proxy_host, proxy_port = proxy
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(proxy_host, proxy_port, timeout=self.timeout, context=self._ssl_context)
+            conn.set_tunnel(host, port, headers=proxy_headers)
+            return conn
+        return http.client.HTTPConnection(proxy_host, proxy_port, timeout=self.timeout)
+
+    def _acquire(self, key: tuple, proxy_headers: dict) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                conn = idle.pop()
+                if conn.sock is not None:
+                    self.stats["connections_reused"] += 1
+                    return conn, True
+        return self._new_connection(key, proxy_headers), False
+
+    def _release(self, key: tuple, conn: http.client.HTTPConnection, reusable: bool):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if reusable and conn.sock is not None and len(idle) < MAX_IDLE_CONNECTIONS_PER_HOST:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _send(self, url: str, headers: dict) -> RegistryResponse:
+        key, path, proxy_headers = self._route(url)
+        request_headers = {"User-Agent": USER_AGENT, **headers}
+        if key[0] == "http":
+            request_headers.update(proxy_headers)
+
+        for attempt in range(2):
+            conn, reused = self._acquire(key, proxy_headers)
+            try:
+                conn.request("GET", path, headers=request_headers)
+                response = conn.getresponse()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue # the server closed the idle connection, retry once on a fresh one
+                raise urllib.error.URLError(e)
+
+            self._count("requests")
+            return RegistryResponse(self, key, conn, response, url)
+
+    def request(self, url: str, headers: dict = None) -> RegistryResponse:
+        '''
+        Sends a GET request on a pooled connection, following redirects.
+
+        Args:
+            url (str): The URL to request
+            headers (dict): Additional request headers
+
+        Returns:
+            RegistryResponse: The response, to be used as a context manager or closed after its body has been read
+
+        Raises:
+            HTTPError: If the server returns a 4xx or 5xx status code
+            URLError: If the URL is invalid or the server cannot be reached
+        '''
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._send(url, headers or {})
+
+            location = response.headers.get("Location")
+            if response.status in (301, 302, 303, 307, 308) and location:
+                response.read()
+                response.close()
+                url = urllib.parse.urljoin(url, location)
+                continue
+
+            if response.status >= 400:
+                response.read()
+                response.close()
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+
+            return response
+
+        raise urllib.error.URLError(f"Too many redirects while requesting {url}")
+
+    def _decode_json(self, url: str, status: int, response_headers, body: bytes, cached: dict):
+        if status == 304 and cached:
+            self._count("not_modified")
+            return cached["body"]
+        data = json.loads(body.decode())
+        store_response(url, data, response_headers.get("ETag"), response_headers.get("Last-Modified"))
+        return data
+
+    def get_json(self, url: str, headers: dict = None, conditional: bool = True):
+        '''
+        Requests the specified URL and decodes the JSON response.
+        If the response was cached with a validator, the request is conditional and a 304 Not Modified returns the cached response.
+
+        Args:
+            url (str): The URL to request
+            headers (dict): Additional request headers
+            conditional (bool): If False, requests the full response whatever is cached. Defaults to True.
+
+        Returns:
+            The decoded JSON response
+
+        Raises:
+            HTTPError: If the server returns a 4xx or 5xx status code
+            URLError: If the URL is invalid or the server cannot be reached
+            JSONDecodeError: If the JSON decoding fails
+        '''
+        cached = read_cached_response(url) if conditional else None
+        request_headers = {"Accept": "application/json", **conditional_headers(cached), **(headers or {})}
+        with self.request(url, request_headers) as response:
+            return self._decode_json(url, response.status, response.headers, response.read(), cached)
+
+    def _get_json_pipelined(self, urls: list[str]) -> dict:
+        key, _, proxy_headers = self._route(urls[0])
+        if key[3]:
+            return {} # pipelining through a proxy is not attempted
+
+        host = urllib.parse.urlsplit(urls[0]).netloc.rsplit("@", 1)[-1]
+        cached = {url: read_cached_response(url) for url in urls}
+        request_bytes = b"".join(
+            f"GET {self._route(url)[1]} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\nAccept: application/json\r\n".encode()
+            + "".join(f"{name}: {value}\r\n" for name, value in conditional_headers(cached[url]).items()).encode()
+            + b"\r\n"
+            for url in urls
+        )
+
+        results = {}
+        conn = self._new_connection(key, proxy_headers)
+        reusable = False
+        try:
+            conn.connect()
+            conn.sock.sendall(request_bytes)
+            reader = conn.sock.makefile("rb")
+            shared_socket = _SharedReaderSocket(reader)
+            try:
+                for url in urls:
+                    response = http.client.HTTPResponse(shared_socket, method="GET", url=url)
+                    response.begin()
+                    body = response.read()
+                    self._count("requests")
+                    self._count("pipelined_requests")
+
+                    if response.status >= 400:
+                        results[url] = urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+                    elif 300 <= response.status < 400 and not (response.status == 304 and cached[url]):
+                        pass # left for the regular requests, which follow redirects
+                    else:
+                        try:
+                            results[url] = self._decode_json(url, response.status, response.headers, body, cached[url])
+                        except json.JSONDecodeError as e:
+                            results[url] = e
+
+                    if response.will_close:
+                        break
+                else:
+                    reusable = True
+            finally:
+                reader.close()
+        except (http.client.HTTPException, OSError):
+            pass # whatever was not answered is requested again without pipelining
+        finally:
+            self._release(key, conn, reusable)
+
+        return results
+
+    def get_json_many(self, urls: list[str], jobs: int = DEFAULT_JOBS, pipeline: bool = None) -> list:
+        '''
+        Requests several URLs and decodes their JSON responses, either concurrently on pooled connections
+        or, if pipelining is enabled, by sending all the requests to the same host at once on a single connection.
+
+        Args:
+            urls (list): The URLs to request
+            jobs (int): The maximum number of requests made at the same time when not pipelining. Defaults to DEFAULT_JOBS.
+            pipeline (bool): Whether to pipeline the requests. Defaults to the client's setting (CUL_HTTP_PIPELINING).
+
+        Returns:
+            list: For every URL, in order, either the decoded JSON response or the exception raised for it (HTTPError, URLError or JSONDecodeError)
+
+        Raises:
+            None
+        '''
+        pipeline = self.pipelining if pipeline is None else pipeline
+        results = {}
+
+        if pipeline:
+            by_host = {}
+            for url in dict.fromkeys(urls):
+                try:
+                    by_host.setdefault(self._route(url)[0], []).append(url)
+                except urllib.error.URLError as e:
+                    results[url] = e
+            for host_urls in by_host.values():
+                if len(host_urls) > 1:
+                    results.update(self._get_json_pipelined(host_urls))
+
+        def fetch(url: str):
+            try:
+                return self.get_json(url)
+            except (urllib.error.URLError, json.JSONDecodeError) as e:
+                return e
+
+        pending = [url for url in dict.fromkeys(urls) if url not in results]
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(pending)))) as executor:
+                results.update(zip(pending, executor.map(fetch, pending)))
+
+        return [results[url] for url in urls]
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_registry_client() -> RegistryClient:
+    '''
+    Returns the registry client shared by the whole process, creating it on first use.
+
+    Args:
+        None
+
+    Returns:
+        RegistryClient: The shared registry client
+
+    Raises:
+        None
+    '''
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = RegistryClient()
+        return _client
+
+def report_registry_stats():
+    '''
+    Prints the connection and request counters of the shared registry client, if requested with CUL_HTTP_STATS=1.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    if not HTTP_STATS or _client is None:
+        return
+    stats = _client.get_stats()
+    print(
+        f"Registry connections: {stats['connections_opened']} opened, {stats['connections_reused']} reused, "
+        f"{stats['requests']} requests ({stats['pipelined_requests']} pipelined, {stats['not_modified']} not modified)"
+    )
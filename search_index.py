@@ -0,0 +1,121 @@
+'''
+This file contains the full-text search over the module catalog (see catalog.py): an inverted index over the name, keywords and description
+of every module, ranked with BM25 where matches in the name count more than matches in the keywords, which count more than matches in the description.
+The index is built in memory from the catalog, once per catalog and process, so ranking is local and instant.
+'''
+import re
+import math
+import bisect
+
+FIELD_WEIGHTS = {"name": 3.0, "keywords": 2.0, "description": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_MATCH_WEIGHT = 0.5 # Query words also match the longer words they start ("pars" matches "parser"), at this fraction of the score
+MIN_PREFIX_LENGTH = 3
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> list[str]:
+    '''
+    Splits a text into lowercase words, on anything that is not a letter or a digit (so "json_parser" gives "json" and "parser"),
+    dropping a plural "s" so that "parsers" matches "parser".
+
+    Args:
+        text (str): The text to split
+
+    Returns:
+        list: The words, in order
+
+    Raises:
+        None
+    '''
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class SearchIndex:
+    '''
+    An inverted index mapping every word to the modules containing it, along with the weighted number of occurrences.
+    '''
+    def __init__(self, catalog: dict):
+        self.postings = {}
+        self.lengths = {}
+        details = catalog.get("details", {})
+        for module_name in catalog["modules"]:
+            module_details = details.get(module_name, {})
+            fields = {
+                "name": [module_name],
+                "keywords": module_details.get("keywords", []),
+                "description": [module_details.get("description", "")],
+            }
+            length = 0.0
+            for field, texts in fields.items():
+                for text in texts:
+                    for token in tokenize(text):
+                        module_postings = self.postings.setdefault(token, {})
+                        module_postings[module_name] = module_postings.get(module_name, 0.0) + FIELD_WEIGHTS[field]
+                        length += FIELD_WEIGHTS[field]
+            self.lengths[module_name] = length
+
+        self.tokens = sorted(self.postings)
+        self.average_length = (sum(self.lengths.values()) / len(self.lengths)) if self.lengths else 0.0
+
+    def _matching_tokens(self, query_token: str) -> list[tuple[str, float]]:
+        matches = [(query_token, 1.0)] if query_token in self.postings else []
+        if len(query_token) >= MIN_PREFIX_LENGTH:
+            index = bisect.bisect_right(self.tokens, query_token)
+            while index < len(self.tokens) and self.tokens[index].startswith(query_token):
+                matches.append((self.tokens[index], PREFIX_MATCH_WEIGHT))
+                index += 1
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[str, float]]:
+        '''
+        Ranks the modules matching the query.
+
+        Args:
+            query (str): The words to search for, e.g., "json parser"
+            limit (int): The maximum number of results
+
+        Returns:
+            list: (module name, score) tuples, best match first
+
+        Raises:
+            None
+        '''
+        scores = {}
+        module_count = len(self.lengths)
+        for query_token in dict.fromkeys(tokenize(query)):
+            for token, weight in self._matching_tokens(query_token):
+                module_postings = self.postings[token]
+                idf = math.log(1 + (module_count - len(module_postings) + 0.5) / (len(module_postings) + 0.5))
+                for module_name, frequency in module_postings.items():
+                    length_norm = 1 - BM25_B + BM25_B * self.lengths[module_name] / (self.average_length or 1)
+                    score = idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+                    scores[module_name] = scores.get(module_name, 0.0) + weight * score
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+# The indexes built, keyed by registry and catalog time, so several searches build the index once
+_indexes = {}
+
+def get_search_index(catalog: dict) -> SearchIndex:
+    '''
+    Returns the search index of a catalog, building it on first use.
+
+    Args:
+        catalog (dict): The catalog, see catalog.get_catalog()
+
+    Returns:
+        SearchIndex: The index
+
+    Raises:
+        None
+    '''
+    key = (catalog["registry"], catalog["fetched_at"], len(catalog.get("details", {})))
+    if key not in _indexes:
+        _indexes[key] = SearchIndex(catalog)
+    return _indexes[key]
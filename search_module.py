@@ -1,17 +1,33 @@
-import urllib.request
+import urllib.error
 import json
 from common_variables import BASE_URL
+from registry_client import get_registry_client
 from colorful_outputs import print_in_red, print_in_yellow
-from rapidfuzz import process
+from rapidfuzz import process, utils
+from catalog import get_catalog
+from search_index import get_search_index
 
-def fuzzy_search_module(query: str, limit: int = 5, threshold: int = 50, called_by_user: bool = False, registry: str = BASE_URL):
+# Preprocessed rapidfuzz choices of the catalogs searched, keyed by registry and catalog time, so several queries preprocess them once
+_fuzzy_choices = {}
+
+def _get_fuzzy_choices(catalog: dict) -> tuple[list[str], list[str]]:
+    key = (catalog["registry"], catalog["fetched_at"])
+    if key not in _fuzzy_choices:
+        module_names = catalog["modules"]
+        _fuzzy_choices[key] = (module_names, [utils.default_process(module_name) for module_name in module_names])
+    return _fuzzy_choices[key]
+
+def fuzzy_search_module(query: str, limit: int = 5, threshold: int = 50, called_by_user: bool = False, registry: str = BASE_URL, refresh: bool = False):
     """
-    Performs fuzzy search on the given list of module names.
+    Performs fuzzy search on the module names of the local catalog of the registry (see catalog.py), so it works offline.
 
     Args:
         query (str): The search string entered by the user.
         limit (int): Maximum number of results to return.
         threshold (int): Minimum match score to consider a result.
+        called_by_user (bool): If True, prints the results.
+        registry (str): The registry whose modules are searched. Defaults to BASE_URL.
+        refresh (bool): If True, refreshes the catalog from the registry first.
 
     Returns:
         list: List of matching module names.
@@ -24,29 +40,23 @@ def fuzzy_search_module(query: str, limit: int = 5, threshold: int = 50, called_
     """
 
     registry = BASE_URL if not registry else registry
-    module_names_url = f"{registry}/get_modules"
-    module_names = None
 
     try:
-        req = urllib.request.Request(module_names_url)
-        with urllib.request.urlopen(req) as response:
-            if response.status != 200:
-                raise Exception(f"HTTP {response.status}: Unable to fetch module names.")
+        module_names, processed_names = _get_fuzzy_choices(get_catalog(registry, refresh))
 
-            module_names_data = response.read().decode()
-            module_names = json.loads(module_names_data)
-
-        results = process.extract(query, module_names, limit=limit, score_cutoff=threshold)
+        # the choices are preprocessed already, so only the query is
+        results = process.extract(utils.default_process(query), processed_names, limit=limit, score_cutoff=threshold, processor=None)
+        matches = [module_names[index] for _, _, index in results]
         if called_by_user:
-            if not results:
+            if not matches:
                 print_in_yellow(f"No results found for '{query}'")
                 return
 
             print(f"Search results for '{query}':")
-            for match in results:
-                print(f"  - {match[0]}")
+            for match in matches:
+                print(f"  - {match}")
             
-        return [match[0] for match in results]  # Extracting matched names
+        return matches  # Extracting matched names
     except urllib.error.HTTPError as e:
         print_in_red(f"HTTP Error: {e.code} {e.reason}")
     except urllib.error.URLError as e:
@@ -76,14 +86,7 @@ def search_module(module_name: str, registry: str = BASE_URL):
     registry = BASE_URL if not registry else registry
     try:
         search_url = f"{registry}/get_versions/{module_name}"
-
-        with urllib.request.urlopen(search_url) as response:
-            if response.status != 200:
-                raise urllib.error.HTTPError(search_url, response.status, f"Unable to fetch versions for {module_name}.", response.getheaders(), None)
-
-            module_data = response.read().decode()
-
-        module_info = json.loads(module_data)
+        module_info = get_registry_client().get_json(search_url)
 
         print(f"\nModule: {module_name}")
         print(f"Author: {module_info.get('author', 'Unknown')}")
@@ -127,3 +130,75 @@ def search_module(module_name: str, registry: str = BASE_URL):
 
     except Exception as e:
         print_in_red(f"Unexpected error: {e}")
+
+def text_search_module(query: str, limit: int = 10, called_by_user: bool = False, registry: str = BASE_URL, refresh: bool = False):
+    '''
+    Searches the name, keywords and description of the modules of the registry's catalog for the words of the query (e.g., "json parser"),
+    and ranks the modules found, see search_index.py. Only the details of the modules not known locally yet are requested from the registry.
+
+    Args:
+        query (str): The words to search for
+        limit (int): Maximum number of results to return
+        called_by_user (bool): If True, prints the results along with the description of the modules
+        registry (str): The registry whose modules are searched. Defaults to BASE_URL.
+        refresh (bool): If True, refreshes the catalog from the registry first
+
+    Returns:
+        list: The names of the matching modules, best match first
+
+    Raises:
+        HTTPError: If the server returns an unsuccessful status code
+        URLError: If the URL is invalid
+        JSONDecodeError: If the JSON decoding fails
+        Exception: If any unexpected error occurs
+    '''
+    registry = BASE_URL if not registry else registry
+
+    try:
+        catalog = get_catalog(registry, refresh, details=True)
+        results = get_search_index(catalog).search(query, limit)
+        if called_by_user:
+            if not results:
+                print_in_yellow(f"No results found for '{query}'")
+                return []
+
+            print(f"Search results for '{query}':")
+            for module_name, _ in results:
+                description = catalog["details"].get(module_name, {}).get("description")
+                print(f"  - {module_name}" + (f": {description}" if description else ""))
+
+        return [module_name for module_name, _ in results]
+    except urllib.error.HTTPError as e:
+        print_in_red(f"HTTP Error: {e.code} {e.reason}")
+    except urllib.error.URLError as e:
+        print_in_red(f"URL Error: {e.reason}")
+    except json.JSONDecodeError:
+        print_in_red("Failed to decode the JSON response. Please check the server response.")
+    except Exception as e:
+        print_in_red(f"Unexpected Error: {e}")
+
+def search(query: str, registry: str = BASE_URL, refresh: bool = False):
+    '''
+    Shows the versions of the module if the query is the exact name of a module of the registry, and searches the modules by purpose otherwise,
+    see text_search_module().
+
+    Args:
+        query (str): The module name or the words to search for
+        registry (str): The registry to search. Defaults to BASE_URL.
+        refresh (bool): If True, refreshes the catalog from the registry first
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    registry = BASE_URL if not registry else registry
+    try:
+        exact_match = query in get_catalog(registry, refresh)["modules"]
+    except (urllib.error.URLError, json.JSONDecodeError, OSError):
+        exact_match = True # without a catalog, fall back to looking the name up on the registry
+    if exact_match:
+        search_module(query, registry)
+    else:
+        text_search_module(query, called_by_user=True, registry=registry)
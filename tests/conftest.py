@@ -0,0 +1,40 @@
+'''
+Shared fixtures of the tests. The cache directory of cul is moved to a temporary folder before any module of the repository is imported,
+so the tests never touch the real cache, and it is emptied before every test.
+'''
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import pytest
+
+_TEST_HOME = tempfile.mkdtemp(prefix="cul-tests-")
+atexit.register(shutil.rmtree, _TEST_HOME, ignore_errors=True)
+os.environ["XDG_CACHE_HOME"] = os.path.join(_TEST_HOME, "cache") # Linux
+os.environ["LOCALAPPDATA"] = os.path.join(_TEST_HOME, "cache") # Windows
+os.environ["HOME"] = _TEST_HOME # macOS (~/Library/Caches)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import cache_index # noqa: E402
+import cache_and_install # noqa: E402
+from common_variables import CACHE_DIR # noqa: E402
+from standin_registry import StandinRegistry # noqa: E402
+
+@pytest.fixture(autouse=True)
+def empty_cache(tmp_path, monkeypatch):
+    assert CACHE_DIR.startswith(_TEST_HOME)
+    cache_index.close_connection()
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    monkeypatch.setattr(cache_and_install, "_use_blob_store", None) # probed again, which recreates the folders of the blob store
+    monkeypatch.chdir(tmp_path)
+    yield
+    cache_index.close_connection()
+
+@pytest.fixture
+def registry(tmp_path):
+    standin = StandinRegistry(str(tmp_path / "registry"))
+    standin.start()
+    yield standin
+    standin.stop()
@@ -0,0 +1,208 @@
+'''
+A stand-in registry for the tests: a local http.server serving modules built in a temporary folder, with the endpoints of the
+CUL backend used by the client (see MDs/user_manual.md):
+
+    GET /get_modules                        the module names, with an ETag (304 Not Modified on If-None-Match)
+    GET /get_modules/changes?since=<t>      {"timestamp", "changed", "removed"}, when `supports_changes` is True
+    GET /get_modules/details                {module: {"description", "keywords"}}, with an ETag
+    GET /get_versions/<module>              the details and versions of a module, with an ETag
+    GET /files/<module>/<version>           the archive of a module version
+    GET /delta/<module>/<from>/<to>         the delta between two versions, when `supports_deltas` is True
+
+Every request is recorded in `requests` as (path, status), so the tests can check what the client asked for.
+'''
+import io
+import os
+import json
+import shutil
+import hashlib
+import zipfile
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from checksum import store_checksum
+
+class StandinRegistry:
+    def __init__(self, root: str):
+        self.root = root
+        self.requests = []
+        self.supports_changes = True
+        self.supports_details = True
+        self.supports_deltas = True
+        self.corrupt_deltas = False
+        self._clock = 0
+        self._events = [] # (timestamp, module name, removed)
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, body, headers = registry._handle(self.path, self.headers)
+                registry.requests.append((self.path, status))
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_module(self, name: str, version: str, files: dict = None, description: str = "", keywords: list = None, requires: list = None):
+        '''
+        Publishes a module version with the specified files (relative path -> bytes), its module_info.json and checksum.txt.
+        '''
+        version_dir = os.path.join(self.root, name, version)
+        shutil.rmtree(version_dir, ignore_errors=True)
+        for relative_path, data in (files or {}).items():
+            path = os.path.join(version_dir, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        os.makedirs(version_dir, exist_ok=True)
+        module_info = {"name": name, "version": version, "description": description, "keywords": keywords or [], "requires": requires or []}
+        with open(os.path.join(version_dir, "module_info.json"), "w") as f:
+            json.dump(module_info, f)
+        store_checksum(version_dir)
+        self._record(name, removed=False)
+
+    def remove_module(self, name: str):
+        shutil.rmtree(os.path.join(self.root, name))
+        self._record(name, removed=True)
+
+    def count(self, prefix: str) -> int:
+        return sum(1 for path, status in self.requests if path.startswith(prefix))
+
+    def _record(self, name: str, removed: bool):
+        self._clock += 1
+        self._events.append((self._clock, name, removed))
+
+    def _modules(self) -> list[str]:
+        return sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []
+
+    def _versions(self, name: str) -> list[str]:
+        module_dir = os.path.join(self.root, name)
+        if not os.path.isdir(module_dir):
+            return []
+        return sorted(os.listdir(module_dir), key=lambda version: [int(part) for part in version.split(".")])
+
+    def _read_files(self, name: str, version: str) -> dict:
+        version_dir = os.path.join(self.root, name, version)
+        files = {}
+        for root, dirs, filenames in os.walk(version_dir):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                with open(path, "rb") as f:
+                    files[os.path.relpath(path, version_dir).replace(os.sep, "/")] = f.read()
+        return files
+
+    def _module_info(self, name: str, version: str) -> dict:
+        with open(os.path.join(self.root, name, version, "module_info.json"), "r") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _zip(files: dict) -> bytes:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for relative_path, data in files.items():
+                archive.writestr(relative_path, data)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _json(data, request_headers, conditional: bool = False) -> tuple[int, bytes, dict]:
+        body = json.dumps(data).encode()
+        if not conditional:
+            return 200, body, {"Content-Type": "application/json"}
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if request_headers.get("If-None-Match") == etag:
+            return 304, b"", {"ETag": etag}
+        return 200, body, {"Content-Type": "application/json", "ETag": etag}
+
+    def _handle(self, raw_path: str, request_headers) -> tuple[int, bytes, dict]:
+        parsed = urllib.parse.urlparse(raw_path)
+        parts = [urllib.parse.unquote(part) for part in parsed.path.strip("/").split("/")]
+        not_found = (404, b'{"detail": "Not Found"}', {"Content-Type": "application/json"})
+
+        if parts == ["get_modules"]:
+            return self._json(self._modules(), request_headers, conditional=True)
+
+        if parts == ["get_modules", "changes"]:
+            if not self.supports_changes:
+                return not_found
+            since = int(float(urllib.parse.parse_qs(parsed.query).get("since", ["0"])[0]))
+            latest = {}
+            for timestamp, name, removed in self._events:
+                if timestamp > since:
+                    latest[name] = removed
+            return self._json({
+                "timestamp": self._clock,
+                "changed": sorted(name for name, removed in latest.items() if not removed),
+                "removed": sorted(name for name, removed in latest.items() if removed and since),
+            }, request_headers)
+
+        if parts == ["get_modules", "details"]:
+            if not self.supports_details:
+                return not_found
+            details = {}
+            for name in self._modules():
+                module_info = self._module_info(name, self._versions(name)[-1])
+                details[name] = {"description": module_info["description"], "keywords": module_info["keywords"]}
+            return self._json(details, request_headers, conditional=True)
+
+        if len(parts) == 2 and parts[0] == "get_versions":
+            versions = self._versions(parts[1])
+            if not versions:
+                return not_found
+            module_info = self._module_info(parts[1], versions[-1])
+            return self._json({
+                "description": module_info["description"],
+                "keywords": module_info["keywords"],
+                "all_versions": {
+                    "versions": [{"version": version} for version in versions],
+                    "latest": versions[-1],
+                    "requires": {version: self._module_info(parts[1], version)["requires"] for version in versions},
+                },
+            }, request_headers, conditional=True)
+
+        if len(parts) == 3 and parts[0] == "files":
+            if parts[2] not in self._versions(parts[1]):
+                return not_found
+            return 200, self._zip(self._read_files(parts[1], parts[2])), {"Content-Type": "application/zip"}
+
+        if len(parts) == 4 and parts[0] == "delta":
+            name, from_version, to_version = parts[1:]
+            if not self.supports_deltas or from_version not in self._versions(name) or to_version not in self._versions(name):
+                return not_found
+            old_files, new_files = self._read_files(name, from_version), self._read_files(name, to_version)
+            delta_files = {}
+            for relative_path, data in new_files.items():
+                if old_files.get(relative_path) != data:
+                    if self.corrupt_deltas and relative_path != "checksum.txt":
+                        data += b"corrupted"
+                    delta_files[relative_path] = data
+            delta_files[".cul_delta.json"] = json.dumps({
+                "format_version": 1,
+                "module": name,
+                "from": from_version,
+                "to": to_version,
+                "removed": sorted(relative_path for relative_path in old_files if relative_path not in new_files),
+            }).encode()
+            return 200, self._zip(delta_files), {"Content-Type": "application/zip"}
+
+        return not_found
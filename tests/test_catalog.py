@@ -0,0 +1,63 @@
+'''
+Tests of the module catalog sync (see catalog.py) against the stand-in registry: the incremental sync through /get_modules/changes
+and the conditional sync of the whole list for registries without it.
+'''
+from catalog import fetch_catalog, get_catalog, read_catalog
+
+def test_delta_sync_merges_changed_and_removed_modules(registry):
+    registry.add_module("logger", "1.0.0")
+    registry.add_module("jsonc", "2.0.0")
+    registry.add_module("mathx", "1.0.0")
+
+    catalog = fetch_catalog(registry.url)
+    assert catalog["delta_sync"]
+    assert catalog["modules"] == ["jsonc", "logger", "mathx"]
+    assert registry.count("/get_modules/changes?since=0") == 1
+
+    registry.add_module("httpc", "0.3.0")
+    registry.add_module("logger", "1.1.0")
+    registry.remove_module("mathx")
+    catalog = fetch_catalog(registry.url, catalog)
+
+    assert catalog["modules"] == ["httpc", "jsonc", "logger"]
+    assert read_catalog(registry.url)["modules"] == catalog["modules"]
+    assert registry.count("/get_modules/changes") == 2
+    assert not any(path == "/get_modules" for path, status in registry.requests)
+
+def test_delta_sync_drops_details_of_changed_modules(registry):
+    registry.add_module("logger", "1.0.0", description="simple logging library")
+    registry.add_module("jsonc", "2.0.0", description="json parser")
+    catalog = get_catalog(registry.url, details=True)
+    assert catalog["details"]["logger"]["description"] == "simple logging library"
+
+    registry.add_module("logger", "1.1.0", description="structured logging library")
+    registry.remove_module("jsonc")
+    catalog = get_catalog(registry.url, refresh=True, details=True)
+
+    assert catalog["modules"] == ["logger"]
+    assert catalog["details"] == {"logger": {"description": "structured logging library", "keywords": []}}
+
+def test_full_sync_reuses_catalog_when_list_not_modified(registry):
+    registry.supports_changes = False
+    registry.add_module("logger", "1.0.0", description="simple logging library", keywords=["log"])
+    registry.add_module("jsonc", "2.0.0", description="json parser")
+
+    catalog = get_catalog(registry.url, details=True)
+    assert not catalog["delta_sync"]
+    assert registry.count("/get_modules/details") == 1
+    assert registry.count("/get_versions/") == 0
+
+    catalog = get_catalog(registry.url, refresh=True, details=True)
+    assert catalog["modules"] == ["jsonc", "logger"]
+    assert catalog["details"]["logger"] == {"description": "simple logging library", "keywords": ["log"]}
+    assert ("/get_modules", 304) in registry.requests
+    assert registry.count("/get_modules/details") == 1 # the details were kept, not requested again
+
+def test_details_fall_back_to_one_request_per_module(registry):
+    registry.supports_details = False
+    registry.add_module("logger", "1.0.0", description="simple logging library")
+    registry.add_module("jsonc", "2.0.0", description="json parser")
+
+    catalog = get_catalog(registry.url, details=True)
+    assert catalog["details"]["jsonc"]["description"] == "json parser"
+    assert registry.count("/get_versions/") == 2
@@ -0,0 +1,85 @@
+'''
+Tests of the delta downloads (see delta_download.py) against the stand-in registry: rebuilding a version from the cached older version
+and the delta, verifying the rebuilt archive against its checksum, and falling back to the full archive.
+'''
+import os
+import io
+import zipfile
+import cache_index
+from cache_and_install import cache_module, get_cached_versions
+from checksum import checksums_match
+from common_variables import CACHE_DIR
+from delta_download import fetch_module_delta
+from install_module_2 import fetch_module_from_server
+from registry_client import get_registry_client
+
+OLD_FILES = {
+    "include/bigmod.h": b"int bigmod(void);\n",
+    "include/removed.h": b"/* removed in 1.1.0 */\n",
+    "bin/libbigmod.a": os.urandom(64 * 1024),
+}
+NEW_FILES = {
+    "include/bigmod.h": b"int bigmod(void);\nint bigmod_v2(void);\n",
+    "include/added.h": b"/* added in 1.1.0 */\n",
+    "bin/libbigmod.a": OLD_FILES["bin/libbigmod.a"],
+}
+
+def publish_and_cache_old_version(registry):
+    registry.add_module("bigmod", "1.0.0", OLD_FILES)
+    registry.add_module("bigmod", "1.1.0", NEW_FILES)
+    with get_registry_client().request(f"{registry.url}/files/bigmod/1.0.0") as response:
+        archive = response.read()
+    with zipfile.ZipFile(io.BytesIO(archive)) as zip_ref:
+        assert cache_module(zip_ref, "bigmod", "1.0.0", "", registry.url)
+    registry.requests.clear()
+
+def read_cached_files(module_name: str, version: str) -> dict:
+    version_dir = os.path.join(CACHE_DIR, module_name, version)
+    files = {}
+    for root, dirs, filenames in os.walk(version_dir):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            with open(path, "rb") as f:
+                files[os.path.relpath(path, version_dir).replace(os.sep, "/")] = f.read()
+    return files
+
+def test_version_is_rebuilt_from_delta(registry):
+    publish_and_cache_old_version(registry)
+
+    assert fetch_module_delta("bigmod", "1.1.0", registry.url)
+
+    assert registry.count("/delta/bigmod/1.0.0/1.1.0") == 1
+    assert registry.count("/files/") == 0
+    cached_files = read_cached_files("bigmod", "1.1.0")
+    for relative_path, data in NEW_FILES.items():
+        assert cached_files[relative_path] == data
+    assert "include/removed.h" not in cached_files
+
+def test_rebuilt_version_is_verified_against_its_checksum(registry):
+    publish_and_cache_old_version(registry)
+    with open(os.path.join(registry.root, "bigmod", "1.1.0", "checksum.txt"), "r") as f:
+        published_checksum = f.read().strip()
+
+    assert fetch_module_delta("bigmod", "1.1.0", registry.url)
+    assert checksums_match(published_checksum, cache_index.get_entry("bigmod", "1.1.0")["checksum"])
+
+def test_checksum_mismatch_falls_back_to_full_download(registry):
+    publish_and_cache_old_version(registry)
+    registry.corrupt_deltas = True
+
+    assert not fetch_module_delta("bigmod", "1.1.0", registry.url)
+    assert "1.1.0" not in get_cached_versions("bigmod") # the rebuilt version was rejected
+
+    assert fetch_module_from_server("bigmod", "1.1.0", registry.url)
+    assert registry.count("/files/bigmod/1.1.0") == 1
+    assert read_cached_files("bigmod", "1.1.0")["include/bigmod.h"] == NEW_FILES["include/bigmod.h"]
+
+def test_registry_without_deltas_falls_back_to_full_download(registry):
+    publish_and_cache_old_version(registry)
+    registry.supports_deltas = False
+
+    assert fetch_module_from_server("bigmod", "1.1.0", registry.url)
+
+    assert ("/delta/bigmod/1.0.0/1.1.0", 404) in registry.requests
+    assert registry.count("/files/bigmod/1.1.0") == 1
+    assert read_cached_files("bigmod", "1.1.0")["include/added.h"] == NEW_FILES["include/added.h"]
@@ -0,0 +1,36 @@
+'''
+Tests of the flat install layout (see install_module_2.install_into_store()) with modules cached from the stand-in registry.
+'''
+import os
+from common_variables import C_CPP_MODULES_STORE_DIR
+from install_module_2 import fetch_module_from_server, install_into_store
+
+GRAPH = {
+    "roots": ["jsonc"],
+    "modules": {
+        "jsonc": {"version": "2.0.0", "requires": ["logger"], "source": "cache"},
+        "logger": {"version": "1.1.0", "requires": [], "source": "cache"},
+    },
+    "order": ["logger", "jsonc"],
+}
+
+def cache_modules(registry):
+    registry.add_module("logger", "1.1.0", {"include/logger.h": b"int logger(void);\n"})
+    registry.add_module("jsonc", "2.0.0", {"include/jsonc.h": b"int jsonc(void);\n"}, requires=["logger==1.1.0"])
+    assert fetch_module_from_server("logger", "1.1.0", registry.url)
+    assert fetch_module_from_server("jsonc", "2.0.0", registry.url)
+
+def test_module_links_its_dependencies_in_the_store(registry):
+    cache_modules(registry)
+
+    assert install_into_store("logger", GRAPH)
+    store_entry = install_into_store("jsonc", GRAPH)
+
+    assert store_entry == os.path.join(C_CPP_MODULES_STORE_DIR, "jsonc@2.0.0")
+    assert os.path.isfile(os.path.join(store_entry, "c_cpp_modules_dld", "logger", "include", "logger.h"))
+
+def test_module_is_not_stored_when_a_dependency_is_missing(registry):
+    cache_modules(registry)
+
+    assert install_into_store("jsonc", GRAPH) == ""
+    assert not os.path.exists(os.path.join(C_CPP_MODULES_STORE_DIR, "jsonc@2.0.0"))
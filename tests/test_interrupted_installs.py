@@ -0,0 +1,31 @@
+'''
+Tests of the cleanup of the leftovers of interrupted installations (see install_module_2.remove_interrupted_installs()).
+'''
+import os
+import time
+from blob_store import STALE_TEMP_AGE
+from cache_and_install import STAGING_PREFIX
+from common_variables import C_CPP_MODULES_DLD_DIR
+from install_module_2 import remove_interrupted_installs
+from link_ops import TRASH_PREFIX
+
+def wait_until_removed(path: str, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not os.path.exists(path)
+
+def test_only_stale_staging_folders_are_removed():
+    fresh = os.path.join(C_CPP_MODULES_DLD_DIR, f"{STAGING_PREFIX}logger-fresh")
+    stale = os.path.join(C_CPP_MODULES_DLD_DIR, f"{STAGING_PREFIX}logger-stale")
+    trash = os.path.join(C_CPP_MODULES_DLD_DIR, f"{TRASH_PREFIX}logger-old")
+    for path in (fresh, stale, trash):
+        os.makedirs(os.path.join(path, "include"))
+    old_time = time.time() - STALE_TEMP_AGE - 60
+    os.utime(stale, (old_time, old_time))
+
+    remove_interrupted_installs()
+
+    assert wait_until_removed(stale)
+    assert wait_until_removed(trash)
+    assert os.path.isdir(os.path.join(fresh, "include")) # another install may still be filling it
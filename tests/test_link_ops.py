@@ -0,0 +1,15 @@
+'''
+Tests of the placement of cached trees into projects (see link_ops.py).
+'''
+from link_ops import materialize_tree
+
+def test_invalid_link_mode_falls_back_to_auto(tmp_path, capsys):
+    src_dir = tmp_path / "src"
+    (src_dir / "include").mkdir(parents=True)
+    (src_dir / "include" / "logger.h").write_text("int logger(void);\n")
+
+    method = materialize_tree(str(src_dir), str(tmp_path / "dst"), mode="hardlinks")
+
+    assert method in ("reflink", "hardlink", "copy")
+    assert (tmp_path / "dst" / "include" / "logger.h").read_text() == "int logger(void);\n"
+    assert "Invalid CUL_LINK_MODE 'hardlinks'" in capsys.readouterr().out
@@ -0,0 +1,40 @@
+'''
+Tests of the conditional metadata requests (see metadata_cache.py and registry_client.RegistryClient.get_json()) against the stand-in registry.
+'''
+from metadata_cache import read_cached_response
+from registry_client import get_registry_client
+
+def test_unchanged_response_is_reused_after_304(registry):
+    registry.add_module("logger", "1.0.0", description="simple logging library")
+    url = f"{registry.url}/get_versions/logger"
+    client = get_registry_client()
+
+    first = client.get_json(url)
+    cached = read_cached_response(url)
+    assert cached is not None and cached["etag"]
+    assert cached["body"] == first
+
+    second = client.get_json(url)
+    assert second == first
+    assert [status for path, status in registry.requests] == [200, 304]
+
+def test_changed_response_replaces_cached_body(registry):
+    registry.add_module("logger", "1.0.0")
+    url = f"{registry.url}/get_versions/logger"
+    client = get_registry_client()
+    client.get_json(url)
+
+    registry.add_module("logger", "1.1.0")
+    response = client.get_json(url)
+    assert response["all_versions"]["latest"] == "1.1.0"
+    assert read_cached_response(url)["body"]["all_versions"]["latest"] == "1.1.0"
+    assert [status for path, status in registry.requests] == [200, 200]
+
+def test_unconditional_request_ignores_cached_response(registry):
+    registry.add_module("logger", "1.0.0")
+    url = f"{registry.url}/get_modules"
+    client = get_registry_client()
+    client.get_json(url)
+
+    assert client.get_json(url, conditional=False) == ["logger"]
+    assert [status for path, status in registry.requests] == [200, 200]
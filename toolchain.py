@@ -0,0 +1,91 @@
+'''
+This file contains the toolchain used by `cul compile`: the C and C++ compilers, which also link the program.
+A compiler is taken from the CC/CXX environment variables, then from the "toolchain" of module_info.json
+({"toolchain": {"cc": "clang", "cxx": "clang++"}}), and is otherwise the first of gcc, clang and cc (g++, clang++ and c++ for C++) found on PATH
+(or in the MSYS2 MinGW folders on Windows). Compilers are run directly with a list of arguments, without a shell,
+so each compilation only starts the compiler itself. A compiler may be given with arguments (e.g., CC="ccache gcc").
+'''
+import os
+import shlex
+import shutil
+
+C_SOURCE_EXTS = ['.c']
+CXX_SOURCE_EXTS = ['.cpp', '.cc', '.cxx', '.c++']
+HEADER_EXTS = ['.h', '.hpp', '.hh', '.hxx']
+
+COMPILER_CANDIDATES = {
+    "cc": ["gcc", "clang", "cc"],
+    "cxx": ["g++", "clang++", "c++"],
+}
+ENVIRONMENT_VARIABLES = {"cc": "CC", "cxx": "CXX"}
+MSYS2_BIN_DIRS = ["C:\\msys64\\mingw64\\bin", "C:\\msys64\\ucrt64\\bin", "C:\\msys64\\clang64\\bin"] # Searched after PATH on Windows
+
+def source_language(source_path: str) -> str:
+    '''
+    Returns the language of a source file from its extension.
+
+    Args:
+        source_path (str): The source file
+
+    Returns:
+        str: "cc" for C, "cxx" for C++, or None if the file is not a source file
+
+    Raises:
+        None
+    '''
+    extension = os.path.splitext(source_path)[1].lower()
+    if extension in C_SOURCE_EXTS:
+        return "cc"
+    if extension in CXX_SOURCE_EXTS:
+        return "cxx"
+    return None
+
+def _which(program: str) -> str:
+    path = shutil.which(program)
+    if path is None and os.name == "nt":
+        path = shutil.which(program, path=os.pathsep.join(MSYS2_BIN_DIRS))
+    return path
+
+def find_compiler(language: str, configured: str = '') -> list[str]:
+    '''
+    Finds the compiler of the specified language.
+
+    Args:
+        language (str): "cc" for the C compiler, "cxx" for the C++ compiler
+        configured (str): The compiler set in module_info.json, if any. The CC/CXX environment variables take precedence over it.
+
+    Returns:
+        list: The compiler (resolved to its full path) followed by the arguments it was given with, or None if no compiler is found
+
+    Raises:
+        ValueError: If the compiler set in the environment or in module_info.json is not found
+    '''
+    configured = os.environ.get(ENVIRONMENT_VARIABLES[language], '').strip() or (configured or '').strip()
+    if configured:
+        argv = shlex.split(configured, posix=os.name != "nt")
+        path = _which(argv[0])
+        if path is None:
+            raise ValueError(f"The compiler '{argv[0]}' set for {'C++' if language == 'cxx' else 'C'} was not found")
+        return [path, *argv[1:]]
+
+    for candidate in COMPILER_CANDIDATES[language]:
+        path = _which(candidate)
+        if path is not None:
+            return [path]
+    return None
+
+def get_toolchain(config: dict = None) -> dict:
+    '''
+    Finds the C and C++ compilers of the project.
+
+    Args:
+        config (dict): The "toolchain" of module_info.json, if any: {"cc": ..., "cxx": ...}
+
+    Returns:
+        dict: {"cc": compiler argv or None, "cxx": compiler argv or None}, see find_compiler()
+
+    Raises:
+        ValueError: If a compiler set in the environment or in module_info.json is not found
+    '''
+    config = config or {}
+    return {language: find_compiler(language, config.get(language, '')) for language in COMPILER_CANDIDATES}
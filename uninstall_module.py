@@ -1,9 +1,11 @@
 import os
-import shutil
+import json
 from colorful_outputs import print_in_green, print_in_red, print_in_yellow
-from helper_functions import parse_module
-from common_variables import C_CPP_MODULES_DLD_DIR
+from helper_functions import parse_module, is_flat_layout
+from common_variables import C_CPP_MODULES_DLD_DIR, C_CPP_MODULES_STORE_DIR
 from init import remove_requirements
+from link_ops import remove_tree
+from lockfile import remove_from_lockfile
 
 def uninstall(module_name: str):
     '''
@@ -29,8 +31,51 @@ def uninstall(module_name: str):
         return
 
     try:
-        shutil.rmtree(module_path)
+        remove_tree(module_path)
+        if is_flat_layout():
+            prune_module_store()
         print_in_green(f"Successfully uninstalled {module_name}.")
         remove_requirements(module_name)
+        remove_from_lockfile(module_name)
     except Exception as e:
-        print_in_red(f"Error uninstalling module: {e}")
\ No newline at end of file
+        print_in_red(f"Error uninstalling module: {e}")
+
+def prune_module_store():
+    '''
+    Removes the module versions in 'c_cpp_modules_dld/.store' that are no longer used by any installed module, directly or as a dependency.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    reachable = set()
+
+    def visit(module_dir: str):
+        try:
+            with open(os.path.join(module_dir, "module_info.json"), 'r') as f:
+                version = json.load(f).get("version", "")
+        except (json.JSONDecodeError, OSError):
+            return
+
+        store_entry = f"{os.path.basename(module_dir)}@{version}"
+        if store_entry in reachable:
+            return
+        reachable.add(store_entry)
+
+        nested_dep_dir = os.path.join(module_dir, "c_cpp_modules_dld")
+        if os.path.isdir(nested_dep_dir):
+            for dep_name in os.listdir(nested_dep_dir):
+                visit(os.path.join(nested_dep_dir, dep_name))
+
+    for module_name in os.listdir(C_CPP_MODULES_DLD_DIR):
+        if not module_name.startswith('.'):
+            visit(os.path.join(C_CPP_MODULES_DLD_DIR, module_name))
+
+    for store_entry in os.listdir(C_CPP_MODULES_STORE_DIR):
+        if store_entry not in reachable:
+            remove_tree(os.path.join(C_CPP_MODULES_STORE_DIR, store_entry))
@@ -1,15 +1,18 @@
-import os, json, urllib.request
+import os, json, sqlite3, urllib.error, urllib.parse
+from tabulate import tabulate
+import cache_index
 from cache_and_install import check_cache_and_install
 from colorful_outputs import print_in_green, print_in_red, print_in_yellow
-from common_variables import BASE_URL, CACHE_DIR
+from common_variables import BASE_URL, C_CPP_MODULES_DLD_DIR, DEFAULT_JOBS
 from init import add_requirements
 from helper_functions import parse_module, compare_versions
-from install_module_2 import install, get_installed_version
-from uninstall_module import uninstall
+from install_module_2 import install_modules, get_installed_version, replace_installed_module
+from registry_client import get_registry_client
 
 def update(module_name: str, registry: str = BASE_URL):
     '''
     Checks if the module is already installed and updates it to the latest version available on the server else gives a warning
+    The new version is installed next to the installed one and swapped in once complete, so a failed update leaves the installed version intact.
 
     Args:
         module_name (str): The name of the module to update
@@ -48,25 +51,23 @@ def update(module_name: str, registry: str = BASE_URL):
             print_in_yellow(f"Module '{module_name}' is already up-to-date with the latest version available on the server.")
             return
         
-    if latest_version_from_cache != "unknown":
+    if server_error and latest_version_from_cache != "unknown":
         res = compare_versions(latest_version_from_cache, current_installed_version)
         if res == -1 or res == 0:
             print_in_yellow(f"Module '{module_name}' is already up-to-date with the latest version available in the cache.")
             return
 
     if server_error:
-        if check_cache_and_install(module_name, latest_version_from_cache):
+        if replace_installed_module(module_name, lambda staging_dir: check_cache_and_install(module_name, latest_version_from_cache, staging_dir)):
             add_requirements(module_name, latest_version_from_cache)
         return
 
     print(f"Updating {module_name}...")
-    uninstall(module_name)
-    
-    if latest_version_from_server != "unknown":
-        module_name = f"{module_name}=={latest_version_from_server}"
-    
-    install(module_name, registry=registry)
-    print_in_green(f"Module '{module_name}' has been successfully updated to the latest version.")
+    install_modules([f"{module_name}=={latest_version_from_server}"], registry, confirm=False)
+    if get_installed_version(module_name) == latest_version_from_server:
+        print_in_green(f"Module '{module_name}=={latest_version_from_server}' has been successfully updated to the latest version.")
+    else:
+        print_in_red(f"Failed to update module '{module_name}', version '{current_installed_version}' is still installed.")
 
 def get_latest_version_str_from_backend(module_name: str, registry: str = BASE_URL):
     '''
@@ -87,13 +88,8 @@ def get_latest_version_str_from_backend(module_name: str, registry: str = BASE_U
     '''
     try:
         registry = BASE_URL if not registry else registry
-        with urllib.request.urlopen(f"{registry}/get_latest_version/{module_name}") as response:
-            if response.status != 200:
-                raise urllib.error.HTTPError(f"{BASE_URL}/latest", response.status, f"Unable to fetch the latest version.", response.getheaders(), None)
-            
-            latest_data = response.read().decode()
-            latest_info = json.loads(latest_data)
-            return latest_info.get("latest", "unknown")
+        latest_info = get_registry_client().get_json(f"{registry}/get_latest_version/{module_name}")
+        return latest_info.get("latest", "unknown")
     except urllib.error.HTTPError as http_err:
         print_in_red(f"HTTP error: {http_err.code} {http_err.reason}")
         return "unknown"
@@ -121,24 +117,146 @@ def get_latest_version_str_from_cache(module_name: str):
         str: The latest version of the module or 'unknown' if the module is not found
 
     Raises:
-        FileNotFoundError: If the module is not found in the cache directory
-        JSONDecodeError: If the JSON decoding fails
+        sqlite3.Error: If the cache index cannot be read
         Exception: If any unexpected error occurs
     '''
     try:
-        versions_json_path = os.path.join(CACHE_DIR, module_name, "versions.json")
-        if not os.path.isfile(versions_json_path):
-            return "unknown"
-        with open(versions_json_path, 'r') as f:
-            versions_data = json.load(f)
-            return versions_data.get("latest_version", "unknown")
-    except FileNotFoundError:
-        # print_in_yellow(f"Warning: Module '{module_name}' not found in cache.")
-        return "unknown"
-    except json.JSONDecodeError:
-        print_in_red("Error reading JSON file. It may be corrupted.")
+        latest_version = cache_index.get_latest_version(module_name)
+        return latest_version if latest_version else "unknown"
+    except sqlite3.Error as e:
+        print_in_red(f"Error reading the cache index: {e}")
         return "unknown"
     except Exception as e:
         print_in_red(f"Unexpected error: {e}")
         return "unknown"
-    
\ No newline at end of file
+
+def get_project_modules() -> list[str]:
+    '''
+    Returns the names of the modules the project requires, from the module_info.json file, or of the installed modules if the project is not initialized.
+
+    Args:
+        None
+
+    Returns:
+        list: The module names
+
+    Raises:
+        None
+    '''
+    try:
+        with open("module_info.json", "r") as f:
+            requires = json.load(f).get("requires", [])
+        return list(dict.fromkeys(parse_module(requirement)[0] for requirement in requires))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    if not os.path.isdir(C_CPP_MODULES_DLD_DIR):
+        return []
+    return sorted(module for module in os.listdir(C_CPP_MODULES_DLD_DIR) if not module.startswith('.'))
+
+def get_latest_versions_from_backend(module_names: list[str], registry: str = BASE_URL, jobs: int = DEFAULT_JOBS) -> dict:
+    '''
+    Fetches the latest version of several modules from the server at once, see registry_client.RegistryClient.get_json_many().
+
+    Args:
+        module_names (list): The names of the modules
+        registry (str): The registry URL. Defaults to BASE_URL.
+        jobs (int): The maximum number of requests made at the same time. Defaults to DEFAULT_JOBS.
+
+    Returns:
+        dict: Module name -> latest version, or 'unknown' for the modules whose latest version could not be fetched
+
+    Raises:
+        None
+    '''
+    registry = BASE_URL if not registry else registry
+    urls = [f"{registry}/get_latest_version/{urllib.parse.quote(module_name)}" for module_name in module_names]
+    latest_versions = {}
+    for module_name, latest_info in zip(module_names, get_registry_client().get_json_many(urls, jobs)):
+        if isinstance(latest_info, urllib.error.HTTPError):
+            print_in_red(f"HTTP error for module '{module_name}': {latest_info.code} {latest_info.reason}")
+        elif isinstance(latest_info, urllib.error.URLError):
+            print_in_red(f"URL error for module '{module_name}': {latest_info.reason}")
+        elif isinstance(latest_info, Exception):
+            print_in_red(f"Failed to decode the JSON response for module '{module_name}'. Please check the server response.")
+        latest_versions[module_name] = latest_info.get("latest", "unknown") if isinstance(latest_info, dict) else "unknown"
+    return latest_versions
+
+def get_outdated_modules(registry: str = BASE_URL, jobs: int = DEFAULT_JOBS) -> list[dict]:
+    '''
+    Checks all the modules of the project for newer versions, asking the server about all of them at once.
+    A module is outdated if the server has a newer version, or, if the server could not be asked, if the cache has one.
+
+    Args:
+        registry (str): The registry URL. Defaults to BASE_URL.
+        jobs (int): The maximum number of requests made at the same time. Defaults to DEFAULT_JOBS.
+
+    Returns:
+        list: For every outdated module, {"name", "current", "cached", "latest", "target"}, the target being the version to update to
+
+    Raises:
+        None
+    '''
+    installed = {}
+    for module_name in get_project_modules():
+        installed_version = get_installed_version(module_name)
+        if installed_version:
+            installed[module_name] = installed_version
+        else:
+            print_in_yellow(f"Warning: Module '{module_name}' not found in 'c_cpp_modules_dld'.")
+
+    latest_versions = get_latest_versions_from_backend(list(installed), registry, jobs)
+    outdated_modules = []
+    for module_name, current_version in installed.items():
+        latest_version = latest_versions[module_name]
+        cached_version = get_latest_version_str_from_cache(module_name)
+        target_version = latest_version if latest_version != "unknown" else cached_version
+        if target_version != "unknown" and compare_versions(target_version, current_version) == 1:
+            outdated_modules.append({
+                "name": module_name, "current": current_version, "cached": cached_version, "latest": latest_version, "target": target_version,
+            })
+    return outdated_modules
+
+def outdated(registry: str = BASE_URL, jobs: int = DEFAULT_JOBS) -> list[dict]:
+    '''
+    Prints the modules of the project that have newer versions, along with their current, latest cached and latest versions.
+
+    Args:
+        registry (str): The registry URL. Defaults to BASE_URL.
+        jobs (int): The maximum number of requests made at the same time. Defaults to DEFAULT_JOBS.
+
+    Returns:
+        list: The outdated modules, see get_outdated_modules()
+
+    Raises:
+        None
+    '''
+    outdated_modules = get_outdated_modules(registry, jobs)
+    if not outdated_modules:
+        print_in_green("All modules are up-to-date.")
+        return outdated_modules
+
+    table_data = [[module["name"], module["current"], module["cached"], module["latest"]] for module in outdated_modules]
+    print(tabulate(table_data, headers=["Package", "Current", "Cached", "Latest"], tablefmt="simple"))
+    return outdated_modules
+
+def update_all(registry: str = BASE_URL, jobs: int = DEFAULT_JOBS):
+    '''
+    Updates all the outdated modules of the project (see get_outdated_modules()) at once: their dependencies are resolved together
+    and the new versions are fetched in parallel, see install_module_2.install_modules().
+
+    Args:
+        registry (str): The registry URL. Defaults to BASE_URL.
+        jobs (int): The maximum number of modules fetched at the same time. Defaults to DEFAULT_JOBS.
+
+    Returns:
+        None
+
+    Raises:
+        None
+    '''
+    outdated_modules = outdated(registry, jobs)
+    if not outdated_modules:
+        return
+
+    print(f"Updating {len(outdated_modules)} module(s)...")
+    install_modules([f"{module['name']}=={module['target']}" for module in outdated_modules], registry, jobs, confirm=False)
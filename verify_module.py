@@ -0,0 +1,116 @@
+import os
+import json
+from colorful_outputs import print_in_green, print_in_red, print_in_yellow
+from common_variables import C_CPP_MODULES_DLD_DIR
+from manifest import verify_manifest, NESTED_MODULES_DIR
+from cache_and_install import verify_cached_version, print_verification_details
+import cache_index
+
+def _module_version(module_dir: str) -> str:
+    try:
+        with open(os.path.join(module_dir, "module_info.json"), 'r') as f:
+            return json.load(f).get("version", "unknown")
+    except (OSError, json.JSONDecodeError):
+        return "unknown"
+
+def _report(label: str, result: dict) -> bool:
+    if result is None:
+        print_in_yellow(f"{label}: no manifest found (installed by an older release), reinstall the module to be able to verify it.")
+        return True
+    if result["ok"]:
+        print(f"{label}: OK")
+        return True
+
+    print_in_red(f"{label}: {len(result['changed'])} changed, {len(result['missing'])} missing and {len(result['added'])} added file(s)")
+    print_verification_details(result)
+    return False
+
+def verify(module_names: list[str] = None) -> bool:
+    '''
+    Verifies the installed modules, along with their dependencies, against their manifests.
+    Unmodified files only take a stat() call to verify, and the files that differ are named in the output.
+
+    Args:
+        module_names (list): The names of the modules to verify. Defaults to all the installed modules.
+
+    Returns:
+        bool: True if all the modules are intact, False otherwise
+
+    Raises:
+        None
+    '''
+    if not os.path.isdir(C_CPP_MODULES_DLD_DIR):
+        print_in_yellow("Warning: 'c_cpp_modules_dld' directory not found.")
+        return True
+
+    if not module_names:
+        module_names = sorted(module for module in os.listdir(C_CPP_MODULES_DLD_DIR) if not module.startswith('.'))
+
+    intact = True
+    verified = set()
+    pending = [(module_name, os.path.join(C_CPP_MODULES_DLD_DIR, module_name)) for module_name in module_names]
+    while pending:
+        label, module_dir = pending.pop(0)
+        if not os.path.isdir(module_dir):
+            print_in_red(f"Module '{label}' is not installed.")
+            intact = False
+            continue
+
+        real_dir = os.path.realpath(module_dir) # the flat layout links the same module version from several places
+        if real_dir in verified:
+            continue
+        verified.add(real_dir)
+
+        intact = _report(f"Module '{label}' v{_module_version(module_dir)}", verify_manifest(module_dir)) and intact
+
+        nested_dir = os.path.join(module_dir, NESTED_MODULES_DIR)
+        if os.path.isdir(nested_dir):
+            pending += [(f"{label} > {dep_name}", os.path.join(nested_dir, dep_name)) for dep_name in sorted(os.listdir(nested_dir))]
+
+    if intact:
+        print_in_green(f"All {len(verified)} installed module(s) verified.")
+    else:
+        print_in_red("Some modules have been modified, reinstall them to restore their original files.")
+    return intact
+
+def verify_cache() -> bool:
+    '''
+    Verifies all the cached module versions against their manifests.
+
+    Args:
+        None
+
+    Returns:
+        bool: True if all the cached versions are intact, False otherwise
+
+    Raises:
+        None
+    '''
+    intact = True
+    count = 0
+    try:
+        entries = cache_index.list_entries()
+    except Exception as e:
+        print_in_red(f"Error reading the cache index: {e}")
+        return False
+
+    for module_name, module_entries in entries.items():
+        for entry in module_entries:
+            count += 1
+            try:
+                result = verify_cached_version(module_name, entry["version"])
+            except OSError as e:
+                print_in_red(f"Error verifying cached module '{module_name}' v{entry['version']}: {e}")
+                intact = False
+                continue
+            if result is None:
+                print_in_red(f"Cached module '{module_name}' v{entry['version']}: missing from the cache directory")
+                intact = False
+                continue
+            intact = _report(f"Cached module '{module_name}' v{entry['version']}", result) and intact
+
+    if intact:
+        print_in_green(f"All {count} cached module version(s) verified.")
+    else:
+        print_in_red("Some cached module versions are damaged, they are fetched again the next time they are installed.")
+    return intact